@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+class MetricsConfig(AppConfig):
+    name = 'apps.metrics'
+
+    def ready(self):
+        from apps.metrics.middleware import install_query_recorder
+
+        connection_created.connect(install_query_recorder)
@@ -0,0 +1,119 @@
+import time
+import random
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+
+from apps.metrics.registry import registry
+
+logger = logging.getLogger('apps.metrics.slow_queries')
+
+
+def get_view_name(request) -> str:
+    """
+    URL name of the view, it is resolved inside the middleware chain, so queries made before have "unresolved" one
+    """
+    match = request.resolver_match
+    return match.view_name if match is not None else 'unresolved'
+
+
+class QueryRecorder:
+    """
+    Counts queries of a request and their time, slow queries are logged with sampling
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.count += 1
+            self.duration += duration
+            if duration * 1000 >= settings.SLOW_QUERY_THRESHOLD_MS:
+                registry.inc('db_slow_queries_total', {'view': get_view_name(self.request)})
+                if random.random() < settings.SLOW_QUERY_SAMPLE_RATE:
+                    logger.warning(
+                        'Slow query %.1f ms in %s on %s: %s',
+                        duration * 1000, get_view_name(self.request), context['connection'].alias, sql,
+                    )
+
+
+# Recorder of the current request. Context variable (not connection wrapper of the request thread)
+# so queries made in threads of async views are recorded as well
+current_recorder: ContextVar[Optional[QueryRecorder]] = ContextVar('current_recorder', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+
+    return recorder(execute, sql, params, many, context)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created receiver, wrappers are kept by connection object between reconnects
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware:
+    """
+    Request count, latency histogram, query count and database time by view name.
+    Must be the first middleware to measure the whole request
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Same as MiddlewareMixin, lets Django call the middleware without a thread under ASGI
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+
+        recorder = QueryRecorder(request)
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, response, recorder, time.perf_counter() - started)
+
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder(request)
+        token = current_recorder.set(recorder)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_recorder.reset(token)
+        self.record(request, response, recorder, time.perf_counter() - started)
+
+        return response
+
+    @staticmethod
+    def record(request, response, recorder: QueryRecorder, duration: float):
+        labels = {'view': get_view_name(request), 'method': request.method}
+        registry.inc('http_requests_total', {**labels, 'status': str(response.status_code)})
+        registry.observe('http_request_duration_seconds', labels, duration)
+        registry.observe('db_duration_seconds', labels, recorder.duration)
+        registry.inc('db_queries_total', labels, recorder.count)
+        registry.flush()
@@ -0,0 +1,192 @@
+"""
+Process-local metrics registry.
+
+Gunicorn runs several worker processes, so every worker periodically dumps its registry to
+`METRICS_DIR/<pid>-<start time>.json` and the worker serving `/metrics` merges all dumps (its own one is taken live).
+Files of exited workers are kept and a worker reusing their pid writes its own file,
+so counters never go backwards, the directory is cleared when gunicorn starts.
+Without METRICS_DIR only metrics of the current process are exposed.
+"""
+import os
+import json
+import time
+import atexit
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, Iterable, List, Tuple
+
+from django.conf import settings
+
+# Upper bounds in seconds, the last +Inf bucket is implicit
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+Sample = Tuple[str, str, dict, float]
+
+
+class Registry:
+    """
+    Counters and histograms keyed by metric name and sorted labels.
+    Collectors are called on dump and return current values of external stats (e.g. connection pools)
+    as (type, name, labels, value) where type is "counter" or "gauge"
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+        # name -> labels -> [bucket counts..., +Inf count, sum]
+        self.histograms: Dict[str, Dict[Labels, List[float]]] = defaultdict(dict)
+        self.collectors: List[Callable[[], Iterable[Sample]]] = []
+        self.flushed_at = time.monotonic()
+        self.pid = None
+        self.started_at = None
+
+    def inc(self, name: str, labels: dict, value: float = 1):
+        with self.lock:
+            self.counters[name][tuple(sorted(labels.items()))] += value
+
+    def observe(self, name: str, labels: dict, value: float):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            histogram = self.histograms[name].get(key)
+            if histogram is None:
+                histogram = self.histograms[name][key] = [0.0] * (len(DURATION_BUCKETS) + 2)
+            histogram[bisect_left(DURATION_BUCKETS, value)] += 1
+            histogram[-1] += value
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]):
+        with self.lock:
+            self.collectors.append(collector)
+
+    def dump(self) -> dict:
+        with self.lock:
+            dump = {
+                'counters': {name: [[list(key), value] for key, value in values.items()]
+                             for name, values in self.counters.items()},
+                'gauges': {},
+                'histograms': {name: [[list(key), list(value)] for key, value in values.items()]
+                               for name, values in self.histograms.items()},
+            }
+            collectors = list(self.collectors)
+
+        for collector in collectors:
+            for kind, name, labels, value in collector():
+                metrics = dump['counters' if kind == 'counter' else 'gauges'].setdefault(name, [])
+                metrics.append([sorted(map(list, labels.items())), value])
+
+        return dump
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def get_path(self) -> str:
+        pid = os.getpid()
+        if pid != self.pid:
+            # Forked worker, pids are recycled by the OS when gunicorn restarts workers
+            self.pid, self.started_at = pid, time.time_ns()
+
+        return os.path.join(settings.METRICS_DIR, f'{pid}-{self.started_at}.json')
+
+    def flush(self, force: bool = False):
+        """
+        Dump registry to METRICS_DIR at most once per METRICS_FLUSH_INTERVAL seconds
+        """
+        if not settings.METRICS_DIR:
+            return
+
+        now = time.monotonic()
+        if not force and now - self.flushed_at < settings.METRICS_FLUSH_INTERVAL:
+            return
+
+        self.flushed_at = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = self.get_path()
+        with open(f'{path}.tmp', 'w') as file:
+            json.dump(self.dump(), file)
+        os.replace(f'{path}.tmp', path)
+
+    def collect(self) -> Iterable[dict]:
+        """
+        Dumps of all workers, the current process is taken live
+        """
+        yield self.dump()
+
+        if not settings.METRICS_DIR:
+            return
+
+        own = os.path.basename(self.get_path())
+        for name in os.listdir(settings.METRICS_DIR):
+            if not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, name)) as file:
+                    yield json.load(file)
+            except (OSError, ValueError):
+                # Worker is replacing its file
+                continue
+
+
+registry = Registry()
+
+atexit.register(lambda: registry.flush(force=True))
+
+
+def format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    if not labels:
+        return ''
+
+    escaped = (
+        (key, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+        for key, value in labels
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def render(dumps: Iterable[dict]) -> str:
+    """
+    Merge dumps and render them in Prometheus text exposition format
+    """
+    counters: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+    # Gauges of workers are summed too, e.g. connections of all pools
+    gauges: Dict[str, Dict[Labels, float]] = defaultdict(lambda: defaultdict(float))
+    histograms: Dict[str, Dict[Labels, List[float]]] = defaultdict(dict)
+    for dump in dumps:
+        for name, values in dump['counters'].items():
+            for key, value in values:
+                counters[name][tuple(map(tuple, key))] += value
+        for name, values in dump.get('gauges', {}).items():
+            for key, value in values:
+                gauges[name][tuple(map(tuple, key))] += value
+        for name, values in dump['histograms'].items():
+            for key, value in values:
+                key = tuple(map(tuple, key))
+                histogram = histograms[name].setdefault(key, [0.0] * len(value))
+                for index, count in enumerate(value):
+                    histogram[index] += count
+
+    lines = []
+    for kind, metrics in (('counter', counters), ('gauge', gauges)):
+        for name in sorted(metrics):
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(metrics[name].items()):
+                lines.append(f'{name}{format_labels(key)} {format_value(value)}')
+
+    for name in sorted(histograms):
+        lines.append(f'# TYPE {name} histogram')
+        for key, value in sorted(histograms[name].items()):
+            cumulative = 0.0
+            for bound, count in zip((*map(str, DURATION_BUCKETS), '+Inf'), value):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels((*key, ("le", bound)))} {format_value(cumulative)}')
+            lines.append(f'{name}_sum{format_labels(key)} {format_value(value[-1])}')
+            lines.append(f'{name}_count{format_labels(key)} {format_value(cumulative)}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,92 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from apps.metrics.registry import Registry, registry, render
+from apps.users.tests.mock_data import USER_INN
+
+User = get_user_model()
+
+
+@override_settings(METRICS_TOKEN='secret')
+class Metrics(APITestCase):
+
+    def setUp(self) -> None:
+
+        registry.clear()
+        self.user = baker.make(User, inn=USER_INN, is_superuser=True)
+        self.client.force_authenticate(user=self.user)
+
+    def test_request_metrics(self):
+        """
+        Requests are counted by view name with latency histogram and number of queries
+        """
+        self.client.get(reverse('user-list'))
+        self.client.get(reverse('user-list'))
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        content = response.content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="user-list"} 2', content)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",view="user-list",le="+Inf"} 2', content)
+        self.assertIn('http_request_duration_seconds_count{method="GET",view="user-list"} 2', content)
+        self.assertIn('# TYPE db_duration_seconds histogram', content)
+        self.assertRegex(content, r'db_queries_total\{method="GET",view="user-list"\} [1-9]')
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0, SLOW_QUERY_SAMPLE_RATE=1)
+    def test_slow_queries(self):
+        with self.assertLogs('apps.metrics.slow_queries', 'WARNING') as logs:
+            self.client.get(reverse('user-detail', args=(self.user.pk, )))
+
+        self.assertIn('in user-detail on default', logs.output[0])
+        self.assertIn('db_slow_queries_total{view="user-detail"}', render(registry.collect()))
+
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Without the token metrics are public only in DEBUG
+        with override_settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_403_FORBIDDEN)
+            with override_settings(DEBUG=True):
+                self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_200_OK)
+
+    def test_workers_merge(self):
+        """
+        Dumps of other workers are summed with live metrics of the current process
+        """
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            worker = Registry()
+            worker.inc('http_requests_total', {'view': 'user-list'}, 3)
+            worker.observe('http_request_duration_seconds', {'view': 'user-list'}, 0.02)
+            (Path(directory) / '1.json').write_text(json.dumps(worker.dump()))
+
+            registry.inc('http_requests_total', {'view': 'user-list'}, 2)
+            registry.observe('http_request_duration_seconds', {'view': 'user-list'}, 20)
+            registry.flush(force=True)
+            self.assertTrue(Path(registry.get_path()).exists())
+
+            # Worker restarted with a recycled pid does not overwrite the file of the exited one
+            restarted = Registry()
+            restarted.pid, restarted.started_at = registry.pid, 0
+            restarted.flush(force=True)
+            self.assertNotEqual(restarted.get_path(), registry.get_path())
+
+            content = render(registry.collect())
+
+        self.assertIn('http_requests_total{view="user-list"} 5', content)
+        self.assertIn('http_request_duration_seconds_bucket{view="user-list",le="0.01"} 0', content)
+        self.assertIn('http_request_duration_seconds_bucket{view="user-list",le="0.025"} 1', content)
+        self.assertIn('http_request_duration_seconds_bucket{view="user-list",le="10.0"} 1', content)
+        self.assertIn('http_request_duration_seconds_bucket{view="user-list",le="+Inf"} 2', content)
+        self.assertIn('http_request_duration_seconds_sum{view="user-list"} 20.02', content)
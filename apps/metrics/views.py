@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+from django.views.decorators.http import require_GET
+
+from apps.metrics.registry import registry, render
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@require_GET
+def metrics(request):
+    """
+    Metrics of all workers in Prometheus text format, protected by METRICS_TOKEN bearer token.
+    Without the token they are served only in DEBUG
+    """
+    if not settings.METRICS_TOKEN and not settings.DEBUG:
+        return HttpResponseForbidden()
+
+    if settings.METRICS_TOKEN:
+        authorization = request.headers.get('Authorization', '')
+        if not constant_time_compare(authorization, f'Bearer {settings.METRICS_TOKEN}'):
+            return HttpResponseForbidden()
+
+    return HttpResponse(render(registry.collect()), content_type=CONTENT_TYPE)
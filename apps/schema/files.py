@@ -0,0 +1,70 @@
+"""
+OpenAPI schema built once (at build or deploy time) instead of on every request.
+
+`build_schema` renders the schema in every format served by `/api/schema/` and gzips it,
+`load_schema` reads the files once per process. With gunicorn preload they are read by the master.
+"""
+import os
+import gzip
+import hashlib
+from functools import lru_cache
+from typing import List, NamedTuple
+
+from django.utils.http import quote_etag
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+SCHEMA_RENDERERS = {
+    OpenApiYamlRenderer.format: OpenApiYamlRenderer,
+    OpenApiJsonRenderer.format: OpenApiJsonRenderer,
+}
+
+
+class SchemaFile(NamedTuple):
+    content: bytes
+    etag: str
+    compressed: bytes
+    compressed_etag: str
+
+
+def get_schema_path(directory: str, schema_format: str) -> str:
+    return os.path.join(directory, f'schema.{schema_format}')
+
+
+def build_schema(directory: str) -> List[str]:
+    """
+    Write schema.{format} and schema.{format}.gz files, returns their paths
+    """
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS(urlconf=spectacular_settings.SERVE_URLCONF)
+    schema = generator.get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for schema_format, renderer_class in SCHEMA_RENDERERS.items():
+        content = renderer_class().render(schema, renderer_context={})
+        path = get_schema_path(directory, schema_format)
+        # mtime is not written, so the same schema is built to the same bytes (and ETag)
+        for file_path, data in ((path, content), (f'{path}.gz', gzip.compress(content, compresslevel=9, mtime=0))):
+            with open(file_path, 'wb') as file:
+                file.write(data)
+            paths.append(file_path)
+
+    return paths
+
+
+@lru_cache(maxsize=None)
+def load_schema(directory: str, schema_format: str) -> SchemaFile:
+    path = get_schema_path(directory, schema_format)
+    with open(path, 'rb') as file:
+        content = file.read()
+    with open(f'{path}.gz', 'rb') as file:
+        compressed = file.read()
+
+    digest = hashlib.md5(content).hexdigest()
+    return SchemaFile(
+        content=content,
+        etag=quote_etag(digest),
+        compressed=compressed,
+        # Representations with different encodings must not share a strong ETag
+        compressed_etag=quote_etag(f'{digest}-gzip'),
+    )
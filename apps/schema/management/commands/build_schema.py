@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.schema.files import build_schema
+
+
+class Command(BaseCommand):
+    help = 'Build OpenAPI schema files served by /api/schema/, run at build or deploy time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Directory to write schema to, OPENAPI_SCHEMA_DIR by default')
+
+    def handle(self, *args, output: str, **options):
+        output = output or settings.OPENAPI_SCHEMA_DIR
+        if not output:
+            raise CommandError('Pass --output or set OPENAPI_SCHEMA_DIR')
+
+        for path in build_schema(output):
+            self.stdout.write(f'Written {path}')
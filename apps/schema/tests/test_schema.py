@@ -0,0 +1,46 @@
+import gzip
+import json
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from apps.schema.files import load_schema
+
+
+class SchemaTestCase(APITestCase):
+
+    def setUp(self) -> None:
+        load_schema.cache_clear()
+
+    def test_prebuilt_schema(self):
+        url = reverse('schema')
+        generated = self.client.get(url, {'format': 'json'})
+        self.assertEqual(generated.status_code, status.HTTP_200_OK)
+
+        with tempfile.TemporaryDirectory() as directory, override_settings(OPENAPI_SCHEMA_DIR=directory):
+            call_command('build_schema', stdout=StringIO())
+
+            response = self.client.get(url, {'format': 'json'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi+json')
+            self.assertDictEqual(json.loads(response.content), json.loads(generated.content))
+
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], 'application/vnd.oai.openapi')
+            self.assertEqual(response['Content-Encoding'], 'gzip')
+            self.assertIn(b'openapi: 3.0.3', gzip.decompress(response.content))
+            self.assertIn('Accept-Encoding', response['Vary'])
+
+            etag = response['ETag']
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etag)
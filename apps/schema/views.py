@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from drf_spectacular.utils import extend_schema
+from drf_spectacular.views import SCHEMA_KWARGS, SpectacularAPIView
+
+from apps.schema.files import load_schema
+
+
+class SchemaView(SpectacularAPIView):
+    """
+    Schema built by `manage.py build_schema` to OPENAPI_SCHEMA_DIR, gzipped if client accepts it.
+    Format is negotiated the same way as by SpectacularAPIView, which generates schema if the setting is empty
+    """
+
+    @extend_schema(**SCHEMA_KWARGS)
+    def get(self, request, *args, **kwargs):
+        if not settings.OPENAPI_SCHEMA_DIR:
+            return super().get(request, *args, **kwargs)
+
+        schema = load_schema(settings.OPENAPI_SCHEMA_DIR, request.accepted_renderer.format)
+        if 'gzip' in request.headers.get('Accept-Encoding', ''):
+            content, etag = schema.compressed, schema.compressed_etag
+        else:
+            content, etag = schema.content, schema.etag
+
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(content, content_type=request.accepted_media_type)
+            if content is schema.compressed:
+                response['Content-Encoding'] = 'gzip'
+
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept', 'Accept-Encoding'))
+        return response
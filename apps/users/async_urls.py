@@ -0,0 +1,15 @@
+"""
+User URLs of the ASGI application: same routes as apps.users.urls, list, retrieve and money_transfer are async
+"""
+from django.urls import URLPattern
+
+from apps.users.async_views import async_view
+from apps.users.urls import urlpatterns as sync_urlpatterns
+
+ASYNC_VIEWS = ('user-list', 'user-detail', 'user-money-transfer')
+
+urlpatterns = [
+    URLPattern(pattern.pattern, async_view(pattern.callback), pattern.default_args, pattern.name)
+    if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in sync_urlpatterns
+]
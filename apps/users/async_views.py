@@ -0,0 +1,47 @@
+"""
+Async entry points of UserViewSet for ASGI workers.
+
+DRF views are synchronous and Django runs sync views under ASGI in one thread shared by all requests,
+so a request waiting for a row lock in transfer_money stalls the whole worker. Views wrapped by `async_view`
+run the same viewset actions in a bounded thread pool instead: the event loop keeps accepting requests
+and at most ASYNC_DB_THREADS requests of a worker hold database connections at once.
+"""
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+
+from django.conf import settings
+from django.db import close_old_connections
+
+executor = ThreadPoolExecutor(settings.ASYNC_DB_THREADS, thread_name_prefix='db')
+
+
+def run_view(view, request, *args, **kwargs):
+    """
+    Run sync view in a pool thread. Connections of pool threads are not handled by request_started/request_finished
+    of the ASGI handler, so they are closed here by the same rules (CONN_MAX_AGE, broken connections)
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and callable(response.render):
+            # Otherwise the handler renders the response in the shared sync thread
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """
+    Wrap sync view into a coroutine view running it in the pool, attributes (csrf_exempt, cls, actions) are kept
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        # Context is copied, so context variables (e.g. metrics of the request) are seen by the view
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(executor, context.run, partial(run_view, view, request, *args, **kwargs))
+
+    return wrapper
@@ -0,0 +1,155 @@
+"""
+Audit of money conservation, see `manage.py audit_balances`.
+
+Users and ledger are checked by ranges of ids, so ranges can be checked by parallel processes.
+On PostgreSQL all ranges are read from one snapshot exported by the transaction of the command.
+Results of ranges are plain JSON values, so they can be saved to a checkpoint and merged later.
+"""
+from contextlib import contextmanager
+from decimal import Decimal
+from typing import Dict, List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import F, Max, Min, Q, Sum
+
+from apps.users.models import User, BillSlot, LedgerEntry
+
+# (subject, reason)
+Violation = Tuple[str, str]
+
+# Money which comes from outside of transfers, all bills must sum to it
+EXTERNAL_KINDS = (LedgerEntry.Kind.OPENING, LedgerEntry.Kind.ADJUSTMENT)
+TRANSFER_KINDS = (LedgerEntry.Kind.DEBIT, LedgerEntry.Kind.CREDIT)
+
+
+def to_amount(value) -> Decimal:
+    """
+    Sums are not rounded to cents by SQLite
+    """
+    return Decimal(value or 0).quantize(Decimal('0.00'))
+
+
+@contextmanager
+def audit_snapshot(snapshot: str = None):
+    """
+    Read-only transaction, on PostgreSQL yields id of its snapshot which other connections can read with.
+    Pass snapshot to read with the snapshot of another transaction instead, inside a transaction its snapshot is used
+    """
+    in_transaction = connection.in_atomic_block
+    with transaction.atomic():
+        if connection.vendor != 'postgresql' or in_transaction:
+            yield snapshot
+            return
+
+        with connection.cursor() as cursor:
+            cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+            if snapshot:
+                cursor.execute('SET TRANSACTION SNAPSHOT %s', [snapshot])
+            else:
+                cursor.execute('SELECT pg_export_snapshot()')
+                snapshot = cursor.fetchone()[0]
+
+        yield snapshot
+
+
+def audit_users(min_id: int, max_id: int, snapshot: str = None) -> dict:
+    """
+    Totals of bills and ledger of users with id in [min_id, max_id] and users which break the rules:
+    bill or slot below zero, bill (with slots) different from the sum of the ledger
+    """
+    with audit_snapshot(snapshot):
+        users = User.objects.filter(pk__range=(min_id, max_id))
+        slots = BillSlot.objects.filter(user__gte=min_id, user__lte=max_id)
+        ledger = LedgerEntry.objects.filter(user__gte=min_id, user__lte=max_id).aggregate(
+            total=Sum('amount'),
+            external=Sum('amount', filter=Q(kind__in=EXTERNAL_KINDS)),
+        )
+        bills = to_amount(users.aggregate(total=Sum('bill'))['total']) + to_amount(
+            slots.aggregate(total=Sum('amount'))['total']
+        )
+
+        violations = []
+        mismatched = users.annotate(
+            total=User.total_bill_expression(),
+            ledger=User.ledger_bill_expression(),
+        ).filter(Q(bill__lt=0) | ~Q(total=F('ledger'))).order_by('pk').values_list('pk', 'bill', 'total', 'ledger')
+        for user_id, bill, total, ledger_bill in mismatched:
+            total, ledger_bill = to_amount(total), to_amount(ledger_bill)
+            if bill < 0:
+                violations.append((f'user {user_id}', f'Bill {bill} is below zero'))
+            if total != ledger_bill:
+                violations.append((f'user {user_id}', f'Bill {total} differs from ledger {ledger_bill}'))
+
+        for user_id, slot, amount in slots.filter(amount__lt=0).order_by('user', 'slot').values_list(
+            'user', 'slot', 'amount'
+        ):
+            violations.append((f'user {user_id}', f'Slot {slot} amount {amount} is below zero'))
+
+    return {
+        'bills': str(bills),
+        'ledger': str(to_amount(ledger['total'])),
+        'external': str(to_amount(ledger['external'])),
+        'violations': violations,
+    }
+
+
+def audit_operations(min_id: int, max_id: int, snapshot: str = None) -> Dict[str, str]:
+    """
+    Sums of transfer operations by ledger entries with id in [min_id, max_id], only the ones which are not zero.
+    Entries of an operation can be split between ranges, so sums must be merged by `merge_operations`
+    """
+    with audit_snapshot(snapshot):
+        operations = LedgerEntry.objects.filter(
+            pk__range=(min_id, max_id),
+            kind__in=TRANSFER_KINDS,
+        ).order_by().values('operation').annotate(total=Sum('amount')).exclude(total=0).values_list(
+            'operation', 'total'
+        )
+        return {str(operation): str(to_amount(total)) for operation, total in operations if to_amount(total)}
+
+
+def merge_operations(results: List[Dict[str, str]]) -> List[Violation]:
+    """
+    Operations which do not net to zero: sender debit differs from the sum of recipients credits
+    """
+    totals = {}
+    for result in results:
+        for operation, total in result.items():
+            totals[operation] = totals.get(operation, 0) + Decimal(total)
+
+    return [
+        (f'operation {operation}', f'Transfer does not net to zero ({total})')
+        for operation, total in sorted(totals.items()) if total
+    ]
+
+
+def merge_users(results: List[dict], compare_totals: bool = True) -> Tuple[Dict[str, Decimal], List[Violation]]:
+    """
+    Totals of all ranges and their violations, totals which differ from the expected one are violations as well.
+    Totals of ranges read from different snapshots do not add up, so they are not compared then
+    """
+    totals = {key: sum((Decimal(result[key]) for result in results), Decimal('0.00'))
+              for key in ('bills', 'ledger', 'external')}
+    violations = [tuple(violation) for result in results for violation in result['violations']]
+
+    for key in ('bills', 'ledger') if compare_totals else ():
+        if totals[key] != totals['external']:
+            violations.append(
+                (f'total {key}', f'{totals[key]} differs from opening balances and adjustments {totals["external"]}')
+            )
+
+    return totals, violations
+
+
+def get_chunks(model, chunk_size: int) -> List[Tuple[int, int]]:
+    """
+    Ranges [min_id, max_id] of chunk_size ids covering the table
+    """
+    bounds = model.objects.aggregate(min_id=Min('id'), max_id=Max('id'))
+    if bounds['min_id'] is None:
+        return []
+
+    return [
+        (start, min(start + chunk_size - 1, bounds['max_id']))
+        for start in range(bounds['min_id'], bounds['max_id'] + 1, chunk_size)
+    ]
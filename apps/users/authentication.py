@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router
+from django.contrib.auth import get_user_model
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+User = get_user_model()
+
+# Fields of user available without query, others are loaded from DB on access.
+# Bump version when fields are changed, so snapshots of the previous release are not used
+USER_SNAPSHOT_FIELDS = ('id', 'username', 'inn', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+USER_SNAPSHOT_VERSION = 1
+
+
+def get_user_snapshot_cache_key(user_id) -> str:
+    return f'users:snapshot:{user_id}'
+
+
+def invalidate_user_snapshot(user_id: int):
+    cache.delete(get_user_snapshot_cache_key(user_id), version=USER_SNAPSHOT_VERSION)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication with user built from cached snapshot instead of a query per request.
+    Snapshot is deleted by signals on user save, changes made bypassing signals (queryset update)
+    are picked up within AUTH_USER_CACHE_TIMEOUT seconds
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        key = get_user_snapshot_cache_key(user_id)
+        snapshot = cache.get(key, version=USER_SNAPSHOT_VERSION)
+        if snapshot is None:
+            user = super().get_user(validated_token)
+            cache.set(
+                key,
+                {field: getattr(user, field) for field in USER_SNAPSHOT_FIELDS},
+                settings.AUTH_USER_CACHE_TIMEOUT,
+                version=USER_SNAPSHOT_VERSION,
+            )
+            return user
+
+        # Only active users are cached, deactivation deletes the snapshot.
+        # from_db expects values in order of model fields
+        field_names = [field.attname for field in User._meta.concrete_fields if field.attname in snapshot]
+        return User.from_db(router.db_for_read(User), field_names, [snapshot[name] for name in field_names])
@@ -0,0 +1,73 @@
+import json
+from json.encoder import encode_basestring
+from typing import Iterable
+
+from django.db.models import QuerySet
+from django.template.response import SimpleTemplateResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from apps.users.models import User
+
+# Values fetched instead of User instances, total_bill is annotated by User.total_bill_expression
+USER_VALUES = ('id', 'inn', 'username', 'total_bill', 'first_name', 'last_name')
+
+# Row of UserSerializer as JSONRenderer renders it (compact separators, non-ASCII as is), fields in the same order
+USER_ROW_TEMPLATE = '{"id":%d,"inn":%s,"username":%s,"bill":"%s","full_name":%s}'
+
+
+def get_user_values(queryset: QuerySet) -> QuerySet:
+    return queryset.annotate(total_bill=User.total_bill_expression()).values(*USER_VALUES)
+
+
+def encode_user(row: dict) -> str:
+    return USER_ROW_TEMPLATE % (
+        row['id'],
+        encode_basestring(row['inn']),
+        encode_basestring(row['username']),
+        f'{row["total_bill"]:.2f}',
+        encode_basestring(f'{row["first_name"]} {row["last_name"]}'.strip()),
+    )
+
+
+def encode_users(rows: Iterable[dict]) -> str:
+    return '[' + ','.join(map(encode_user, rows)) + ']'
+
+
+def escape_line_separators(content: str) -> bytes:
+    # JSONRenderer escapes them to keep output a strict JavaScript subset
+    return content.replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+def can_encode_fast(renderer, accepted_media_type: str, renderer_context: dict) -> bool:
+    """
+    Rows are encoded the way JSONRenderer does only with its default settings and no indent
+    """
+    return (
+        type(renderer) is JSONRenderer and
+        renderer.compact and
+        not renderer.ensure_ascii and
+        renderer.get_indent(accepted_media_type, renderer_context) is None
+    )
+
+
+class EncodedJSONResponse(Response):
+    """
+    Response with JSON content encoded beforehand, data is decoded from content only if accessed (e.g. in tests)
+    """
+
+    def __init__(self, content: bytes, status=None):
+        SimpleTemplateResponse.__init__(self, None, status=status)
+        self.encoded_content = content
+        self.template_name = None
+        self.exception = False
+        self.content_type = JSONRenderer.media_type
+
+    @property
+    def data(self):
+        return json.loads(self.encoded_content)
+
+    @property
+    def rendered_content(self):
+        self['Content-Type'] = self.content_type
+        return self.encoded_content
@@ -0,0 +1,36 @@
+from typing import Iterable
+
+
+class TransferError(Exception):
+    """
+    Base error of money transfer, raised inside transaction so all changes are rolled back
+    """
+    message = 'Money transfer failed'
+
+    def __init__(self, message: str = None):
+        self.message = message or self.message
+        super().__init__(self.message)
+
+
+class NotEnoughMoneyError(TransferError):
+    message = 'Users bill does not have enough money'
+
+
+class RecipientsNotFoundError(TransferError):
+    message = 'All INN must be owned by the users'
+
+    def __init__(self, message: str = None, missing: Iterable[str] = ()):
+        self.missing = list(missing)
+        super().__init__(message)
+
+
+class DuplicateRecipientsError(TransferError):
+    message = 'INN in list must be uniq'
+
+    def __init__(self, message: str = None, duplicates: Iterable[str] = ()):
+        self.duplicates = list(duplicates)
+        super().__init__(message)
+
+
+class AmountTooSmallError(TransferError):
+    message = 'Amount too small to be split'
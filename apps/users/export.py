@@ -0,0 +1,61 @@
+import io
+import csv
+import json
+from decimal import Decimal
+from typing import Iterable, Iterator
+
+from django.db.models import QuerySet
+
+from apps.users.models import User
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+EXPORT_CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+# Same fields as UserSerializer
+EXPORT_FIELDS = ('id', 'inn', 'username', 'bill', 'full_name')
+
+
+def get_export_rows(queryset: QuerySet, chunk_size: int = 2000) -> Iterator[tuple]:
+    """
+    Iterate (id, inn, username, bill, first_name, last_name) tuples by a server-side cursor (on PostgreSQL)
+    """
+    return queryset.annotate(total_bill=User.total_bill_expression()).values_list(
+        'id', 'inn', 'username', 'total_bill', 'first_name', 'last_name'
+    ).iterator(chunk_size=chunk_size)
+
+
+def iter_export(rows: Iterable[tuple], export_format: str, chunk_size: int = 2000) -> Iterator[str]:
+    """
+    Encode rows to NDJSON or CSV, chunk_size rows per yielded string
+    """
+    encode_rows = encode_ndjson if export_format == 'ndjson' else encode_csv
+    if export_format == 'csv':
+        yield encode_csv([EXPORT_FIELDS])
+
+    chunk = []
+    for pk, inn, username, bill, first_name, last_name in rows:
+        chunk.append((pk, inn, username, format_bill(bill), f'{first_name} {last_name}'.strip()))
+        if len(chunk) == chunk_size:
+            yield encode_rows(chunk)
+            chunk = []
+
+    if chunk:
+        yield encode_rows(chunk)
+
+
+def format_bill(bill: Decimal) -> str:
+    return f'{bill:.2f}'
+
+
+def encode_ndjson(rows: Iterable[tuple]) -> str:
+    return ''.join(
+        json.dumps(dict(zip(EXPORT_FIELDS, row)), ensure_ascii=False, separators=(',', ':')) + '\n' for row in rows
+    )
+
+
+def encode_csv(rows: Iterable[tuple]) -> str:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
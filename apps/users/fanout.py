@@ -0,0 +1,156 @@
+"""
+Fan-out transfers to thousands of recipients (payroll-style payouts).
+
+INNs are streamed to a temporary table instead of being passed as `IN (...)` lists: COPY on PostgreSQL,
+batched INSERT elsewhere. Missing and duplicate INNs are found by one join, recipients are credited
+by one UPDATE and ledger entries are written by one INSERT ... SELECT, all reading the temporary table.
+"""
+import io
+import csv
+from decimal import Decimal
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+
+from apps.users.exceptions import (
+    AmountTooSmallError,
+    DuplicateRecipientsError,
+    NotEnoughMoneyError,
+    RecipientsNotFoundError,
+)
+from apps.users.models import User, BillSlot, LedgerEntry
+from apps.users.stamps import invalidate_users
+from utils.decimal import round_decimal
+
+FANOUT_TABLE = 'transfer_recipients'
+FANOUT_CONTENT_TYPES = ('text/plain', 'text/csv')
+
+# (line, inn as sent, inn as stored in users table or None if it can't be stored)
+RecipientRow = Tuple[int, str, Optional[object]]
+
+
+def iter_fanout_inns(lines: Iterable[bytes]) -> Iterator[str]:
+    """
+    Iterate INNs of request body, one per line, blank lines are skipped
+    """
+    for line in lines:
+        inn = line.decode('utf-8', 'replace').strip().strip('"')
+        if inn:
+            yield inn
+
+
+def get_recipient_rows(inns: Iterator[str], batch_size: int) -> Iterator[List[RecipientRow]]:
+    """
+    Batches of numbered INNs with their DB value, which is None unless INN is exactly 12 digits.
+    So a valid INN has the only spelling in both storages of INNField and duplicates are found by the value
+    """
+    field = User._meta.get_field('inn')
+    line = 0
+    while True:
+        batch = []
+        for inn in islice(inns, batch_size):
+            line += 1
+            is_digits = len(inn) == field.max_length and inn.isascii() and inn.isdigit()
+            key = field.get_db_prep_value(inn, connection) if is_digits else None
+            batch.append((line, inn, key))
+
+        if not batch:
+            return
+
+        yield batch
+
+
+def load_recipients(cursor, batches: Iterator[List[RecipientRow]]) -> int:
+    """
+    Create the temporary table of recipients and fill it, returns number of loaded INNs
+    """
+    inn_type = User._meta.get_field('inn').db_type(connection)
+    cursor.execute(f'CREATE TEMPORARY TABLE {FANOUT_TABLE} (line bigint NOT NULL, inn text NOT NULL, key {inn_type})')
+
+    count = 0
+    for batch in batches:
+        if connection.vendor == 'postgresql':
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(f'COPY {FANOUT_TABLE} (line, inn, key) FROM STDIN WITH (FORMAT csv)', buffer)
+        else:
+            cursor.executemany(f'INSERT INTO {FANOUT_TABLE} (line, inn, key) VALUES (%s, %s, %s)', batch)
+        count += len(batch)
+
+    if connection.vendor == 'postgresql':
+        # Temporary tables are not analyzed by autovacuum, without statistics the join is planned for 1000 rows
+        cursor.execute(f'ANALYZE {FANOUT_TABLE}')
+
+    return count
+
+
+def find_invalid_recipients(cursor) -> Tuple[List[str], List[str]]:
+    """
+    Missing and duplicate INNs of the loaded recipients by one join, in order of the first occurrence.
+    INNs are grouped by their DB value, lines which can't be stored are missing
+    """
+    cursor.execute(
+        f'SELECT min(recipients.line), min(recipients.inn), count(users.id) FROM {FANOUT_TABLE} recipients '
+        f'LEFT JOIN {User._meta.db_table} users ON users.inn = recipients.key '
+        f'WHERE recipients.key IS NOT NULL '
+        f'GROUP BY recipients.key HAVING count(*) > 1 OR count(users.id) = 0 '
+        f'UNION ALL '
+        f'SELECT line, inn, 0 FROM {FANOUT_TABLE} WHERE key IS NULL '
+        f'ORDER BY 1'
+    )
+    missing, duplicates = [], []
+    for _, inn, found in cursor.fetchall():
+        (missing if not found else duplicates).append(inn)
+
+    return missing, duplicates
+
+
+@transaction.atomic()
+def transfer_money_fanout(sender: User, inns: Iterable[str], amount: Decimal, batch_size: int = 50000) -> int:
+    """
+    Debit sender and credit each recipient by INN in equal parts, returns number of recipients.
+    Unlike `User.transfer_money` INNs are not held in memory and every missing or duplicate INN is reported
+    """
+    recipients = RawSQL(f'SELECT key FROM {FANOUT_TABLE}', ())
+
+    with connection.cursor() as cursor:
+        count = load_recipients(cursor, get_recipient_rows(iter(inns), batch_size))
+        if not count:
+            raise RecipientsNotFoundError('List of INN must not be empty')
+
+        missing, duplicates = find_invalid_recipients(cursor)
+        if missing:
+            raise RecipientsNotFoundError(missing=missing)
+        if duplicates:
+            raise DuplicateRecipientsError(duplicates=duplicates)
+
+        amount_per_user = round_decimal(amount / count)
+        if amount_per_user < Decimal('0.01'):
+            raise AmountTooSmallError()
+
+        total_amount = amount_per_user * count
+        # Not retried on deadlock as User.transfer_money is, INNs of the request body are read once
+        User.lock_users([sender.pk], recipients)
+        if not User.debit_bill(sender.pk, total_amount):
+            raise NotEnoughMoneyError()
+
+        # Every INN is found and uniq, so hot accounts are left only if fewer rows are credited
+        credited = User.objects.filter(inn__in=recipients, bill_slots=0).update(bill=F('bill') + amount_per_user)
+        if credited != count:
+            credited += BillSlot.credit(recipients, amount_per_user)
+        if credited != count:
+            # Recipient deleted or changed meanwhile, the debit is rolled back
+            raise RecipientsNotFoundError()
+
+        LedgerEntry.record_transfer(sender.pk, recipients, amount_per_user, total_amount)
+        # Stamp per recipient would be a cache write per INN, so retrieve responses are invalidated at once
+        invalidate_users(ids=[sender.pk], bulk=True)
+
+        # Rolled back with the transaction on error, dropped here otherwise
+        cursor.execute(f'DROP TABLE {FANOUT_TABLE}')
+
+    return count
@@ -0,0 +1,189 @@
+import json
+import hashlib
+from datetime import timedelta
+from functools import wraps
+from typing import Callable, Tuple
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.db.models import QuerySet
+from django.http import HttpResponse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.utils.encoders import JSONEncoder
+
+from apps.users.models import IdempotencyKey, LedgerEntry
+from utils.db.retry import retry_on_conflict
+
+IDEMPOTENCY_KEY_HEADER = 'Idempotency-Key'
+IDEMPOTENT_REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+class IdempotencyKeyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Request with this Idempotency-Key is in progress'
+    default_code = 'idempotency_key_conflict'
+
+
+class IdempotencyKeyMismatch(APIException):
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Idempotency-Key was used for another request'
+    default_code = 'idempotency_key_mismatch'
+
+
+def idempotent(view_method: Callable) -> Callable:
+    """
+    Decorator of a view action: the first response to a request with `Idempotency-Key` header is stored
+    and replayed byte-for-byte for retries within IDEMPOTENCY_KEY_TTL seconds, so the action runs once.
+    Key is committed before the action runs, so a concurrent retry gets 409 instead of waiting on a lock.
+    The action and its stored response are committed together, `request.idempotency_operation` is the operation id
+    of its ledger entries. Key in progress longer than IDEMPOTENCY_KEY_LEASE (its worker was killed) is taken over
+    by a retry unless its operation is committed. Server errors are not stored and release the key
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_KEY_HEADER)
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+
+        if not key or len(key) > IdempotencyKey._meta.get_field('key').max_length:
+            raise ParseError(f'{IDEMPOTENCY_KEY_HEADER} must be from 1 to 255 characters')
+
+        request_hash = get_request_hash(request, kwargs)
+        record, created = acquire_key(request.user, key, request_hash)
+        if record.request_hash != request_hash:
+            raise IdempotencyKeyMismatch()
+
+        if not created:
+            if record.status_code is None:
+                raise IdempotencyKeyConflict()
+
+            return replay_response(record)
+
+        request.idempotency_operation = record.operation
+        try:
+            response = run_action(self, view_method, record, request, *args, **kwargs)
+        except BaseException:
+            get_lease(record).delete()
+            raise
+
+        if response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+            get_lease(record).delete()
+
+        return response
+
+    return wrapper
+
+
+@retry_on_conflict()
+@transaction.atomic()
+def run_action(view, view_method: Callable, record: IdempotencyKey, request, *args, **kwargs) -> HttpResponse:
+    """
+    Run the action and store its response in one transaction holding the key row lock, so a retry can not take
+    the key over while the action runs and a worker killed after the commit leaves no key in progress.
+    Transfers inside are not retried on deadlock by themselves, the whole transaction is repeated here
+    """
+    if not list(get_lease(record).select_for_update().values_list('pk', flat=True)):
+        # Key taken over by a retry meanwhile is left to the retry
+        raise IdempotencyKeyConflict()
+
+    try:
+        response = view_method(view, request, *args, **kwargs)
+    except Exception as exc:
+        # Only API errors are handled, anything else is raised again
+        response = view.handle_exception(exc)
+
+    response = view.finalize_response(request, response, *args, **kwargs)
+    response.render()
+
+    if response.status_code >= status.HTTP_500_INTERNAL_SERVER_ERROR:
+        transaction.set_rollback(True)
+        return response
+
+    get_lease(record).update(
+        status_code=response.status_code,
+        headers=dict(response.items()),
+        content=response.content,
+    )
+    return response
+
+
+def get_request_hash(request, kwargs: dict) -> str:
+    payload = json.dumps([request.path, kwargs, request.data], cls=JSONEncoder, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_lease(record: IdempotencyKey) -> QuerySet:
+    """
+    Key while it is held by the request which created or took it over, created_at is the lease token
+    """
+    return IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at)
+
+
+def take_over_key(record: IdempotencyKey) -> bool:
+    """
+    Renew the lease of a key in progress, False if its request is still running (the key row is locked),
+    its operation is committed or another retry has taken it over first
+    """
+    created_at = timezone.now()
+    try:
+        with transaction.atomic():
+            lease = get_lease(record).filter(status_code__isnull=True).select_for_update(nowait=True)
+            if not list(lease.values_list('pk', flat=True)) or is_operation_committed(record):
+                return False
+
+            lease.update(created_at=created_at)
+    except DatabaseError:
+        # Locked by the request in progress
+        return False
+
+    record.created_at = created_at
+    return True
+
+
+def is_operation_committed(record: IdempotencyKey) -> bool:
+    """
+    Ledger entries of the key operation are committed, entries older than the key TTL are not looked through
+    """
+    return LedgerEntry.objects.filter(
+        operation=record.operation,
+        created_at__gte=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+    ).exists()
+
+
+def acquire_key(user, key: str, request_hash: str) -> Tuple[IdempotencyKey, bool]:
+    """
+    Get stored key or create a new one, returns (key, created).
+    If the key is created by a concurrent request meanwhile, it is returned unsaved and in progress.
+    Key of the same request in progress longer than IDEMPOTENCY_KEY_LEASE is taken over and returned as created
+    """
+    # Key may be stored by the previous request just now, so it is read from the primary
+    record = IdempotencyKey.objects.using(router.db_for_write(IdempotencyKey)).filter(user=user, key=key).first()
+    if record is not None:
+        now = timezone.now()
+        if record.created_at > now - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL):
+            is_expired_lease = (
+                record.status_code is None and
+                record.request_hash == request_hash and
+                record.created_at <= now - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE)
+            )
+            return record, is_expired_lease and take_over_key(record)
+
+        # Expired key waiting for the sweep can be reused right away
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(user=user, key=key, request_hash=request_hash), True
+    except IntegrityError:
+        return IdempotencyKey(user=user, key=key, request_hash=request_hash), False
+
+
+def replay_response(record: IdempotencyKey) -> HttpResponse:
+    response = HttpResponse(bytes(record.content), status=record.status_code)
+    for header, value in record.headers.items():
+        response[header] = value
+
+    response[IDEMPOTENT_REPLAYED_HEADER] = 'true'
+    return response
@@ -0,0 +1,242 @@
+import io
+import re
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import IO, Iterable, Iterator, List, Tuple
+from uuid import uuid4
+
+from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.users.models import User, LedgerEntry
+from apps.users.stamps import invalidate_users
+from utils.validators import INNValidator
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_FIELDS = ('inn', 'username', 'first_name', 'last_name', 'bill')
+
+# (line, inn, username, first_name, last_name, bill)
+ImportRow = Tuple[int, str, str, str, str, Decimal]
+# (line, inn, reason)
+Rejected = Tuple[int, str, str]
+
+username_regex = re.compile(UnicodeUsernameValidator.regex)
+max_bill = Decimal(10) ** (User._meta.get_field('bill').max_digits - User._meta.get_field('bill').decimal_places)
+
+
+def iter_import_rows(file: IO[str], import_format: str) -> Iterator[Tuple[int, dict]]:
+    """
+    Iterate (line number, row) of CSV with header or NDJSON, rows are not validated
+    """
+    if import_format == 'csv':
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, row
+        return
+
+    for line, text in enumerate(file, start=1):
+        if not text.strip():
+            continue
+
+        try:
+            row = json.loads(text)
+        except ValueError:
+            row = None
+
+        yield line, row if isinstance(row, dict) else {}
+
+
+def clean_rows(rows: List[Tuple[int, dict]]) -> Tuple[List[ImportRow], List[Rejected]]:
+    """
+    Validate a batch of rows, INNs are checked by one INNValidator.validate_many call
+    """
+    inns = [str(row.get('inn') or '') for _, row in rows]
+    inns_valid = INNValidator().validate_many(inns)
+
+    cleaned, rejected = [], []
+    for (line, row), inn, inn_valid in zip(rows, inns, inns_valid):
+        username = str(row.get('username') or '')
+        first_name = str(row.get('first_name') or '')
+        last_name = str(row.get('last_name') or '')
+
+        if not inn_valid:
+            rejected.append((line, inn, 'Incorrect INN'))
+            continue
+
+        if not username_regex.match(username) or len(username) > 150:
+            rejected.append((line, inn, 'Incorrect username'))
+            continue
+
+        if len(first_name) > 150 or len(last_name) > 150:
+            rejected.append((line, inn, 'Name is too long'))
+            continue
+
+        try:
+            bill = Decimal(str(row.get('bill') or 0)).quantize(Decimal('0.00'))
+        except InvalidOperation:
+            bill = None
+
+        if bill is None or not 0 <= bill < max_bill:
+            rejected.append((line, inn, 'Incorrect bill'))
+            continue
+
+        cleaned.append((line, inn, username, first_name, last_name, bill))
+
+    return cleaned, rejected
+
+
+def import_users(rows: Iterable[Tuple[int, dict]], batch_size: int = 50000) -> Tuple[int, List[Rejected]]:
+    """
+    Create users with opening ledger entries in one transaction, returns (number of created users, rejected rows).
+    Rows with INN or username which already exist (in DB or earlier in the file) are rejected, not updated
+    """
+    import_rows = import_users_by_copy if connection.vendor == 'postgresql' else import_users_by_bulk_create
+
+    rows = iter(rows)
+    rejected = []
+    with transaction.atomic():
+        created, duplicates = import_rows(iter_cleaned(rows, batch_size, rejected))
+        if created:
+            # New users appear in list pages
+            invalidate_users()
+
+    return created, sorted(rejected + duplicates)
+
+
+def iter_cleaned(rows: Iterator[Tuple[int, dict]], batch_size: int,
+                 rejected: List[Rejected]) -> Iterator[List[ImportRow]]:
+    """
+    Validate rows by batches, rejected rows are collected to rejected
+    """
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+
+        cleaned, batch_rejected = clean_rows(batch)
+        rejected.extend(batch_rejected)
+        yield cleaned
+
+
+def import_users_by_copy(batches: Iterable[List[ImportRow]]) -> Tuple[int, List[Rejected]]:
+    """
+    COPY rows to a temporary staging table, then create users and ledger entries by one INSERT ... SELECT.
+    Conflicts on unique INN and username are skipped by ON CONFLICT DO NOTHING and reported back
+    """
+    users_table = User._meta.db_table
+    ledger_table = LedgerEntry._meta.db_table
+    inn_type = User._meta.get_field('inn').db_type(connection)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'CREATE TEMPORARY TABLE users_import ('
+            '    line bigint NOT NULL,'
+            '    inn varchar(12) NOT NULL,'
+            '    username varchar(150) NOT NULL,'
+            '    first_name varchar(150) NOT NULL,'
+            '    last_name varchar(150) NOT NULL,'
+            '    bill numeric(12, 2) NOT NULL'
+            ') ON COMMIT DROP'
+        )
+
+        for batch in batches:
+            buffer = io.StringIO()
+            csv.writer(buffer, quoting=csv.QUOTE_ALL).writerows(batch)
+            buffer.seek(0)
+            cursor.copy_expert(
+                'COPY users_import (line, inn, username, first_name, last_name, bill) FROM STDIN WITH (FORMAT csv)',
+                buffer,
+            )
+
+        cursor.execute('ANALYZE users_import')
+        # Only the first row of INN or username in the file is created, the rest are reported
+        duplicates = []
+        for column in ('inn', 'username'):
+            cursor.execute(
+                f'DELETE FROM users_import WHERE line IN ('
+                f'    SELECT line FROM ('
+                f'        SELECT line, row_number() OVER (PARTITION BY {column} ORDER BY line) AS number '
+                f'        FROM users_import'
+                f'    ) numbered WHERE number > 1'
+                f') RETURNING line, inn'
+            )
+            duplicates.extend((line, inn, f'Duplicate {column} in file') for line, inn in cursor.fetchall())
+
+        now = timezone.now()
+        cursor.execute(
+            f'WITH created AS ('
+            f'    INSERT INTO {users_table} (password, is_superuser, username, first_name, last_name, email, '
+            f'                              is_staff, is_active, date_joined, inn, bill, bill_slots) '
+            f'    SELECT \'!\', false, username, first_name, last_name, \'\', false, true, %s, '
+            f'           CAST(inn AS {inn_type}), bill, 0 '
+            f'    FROM users_import ORDER BY line '
+            f'    ON CONFLICT DO NOTHING '
+            f'    RETURNING id, inn, username, bill'
+            f'), ledger AS ('
+            f'    INSERT INTO {ledger_table} (user_id, operation, kind, amount, created_at) '
+            f'    SELECT id, %s, %s, bill, %s FROM created WHERE bill <> 0'
+            f') '
+            f'SELECT users_import.line, users_import.inn FROM users_import '
+            f'LEFT JOIN created ON created.inn = CAST(users_import.inn AS {inn_type}) '
+            f'WHERE created.id IS NULL',
+            [now, uuid4(), LedgerEntry.Kind.OPENING, now],
+        )
+        existing = [(line, inn, 'INN or username already exists') for line, inn in cursor.fetchall()]
+
+        cursor.execute('SELECT count(*) FROM users_import')
+        created = cursor.fetchone()[0] - len(existing)
+
+    return created, duplicates + existing
+
+
+def import_users_by_bulk_create(batches: Iterable[List[ImportRow]]) -> Tuple[int, List[Rejected]]:
+    """
+    Fallback for databases without COPY: existing INNs and usernames are checked by a query per batch
+    """
+    seen_inns, seen_usernames = set(), set()
+    operation = uuid4()
+    created = 0
+    duplicates = []
+
+    for batch in batches:
+        existing = User.objects.filter(
+            Q(inn__in=[row[1] for row in batch]) | Q(username__in=[row[2] for row in batch])
+        ).values_list('inn', 'username')
+        existing_inns = {inn for inn, _ in existing}
+        existing_usernames = {username for _, username in existing}
+
+        users = []
+        for line, inn, username, first_name, last_name, bill in batch:
+            if inn in seen_inns or username in seen_usernames:
+                duplicates.append((line, inn, f'Duplicate {"inn" if inn in seen_inns else "username"} in file'))
+                continue
+
+            seen_inns.add(inn)
+            seen_usernames.add(username)
+            if inn in existing_inns or username in existing_usernames:
+                duplicates.append((line, inn, 'INN or username already exists'))
+                continue
+
+            users.append(User(
+                inn=inn, username=username, first_name=first_name, last_name=last_name, bill=bill, password='!'
+            ))
+
+        User.objects.bulk_create(users)
+        created += len(users)
+
+        # Ids are not returned by bulk_create on these databases
+        users_ids = dict(
+            User.objects.filter(inn__in=[user.inn for user in users if user.bill]).values_list('inn', 'id')
+        )
+        LedgerEntry.objects.bulk_create(
+            LedgerEntry(
+                user_id=users_ids[user.inn], operation=operation, kind=LedgerEntry.Kind.OPENING, amount=user.bill
+            )
+            for user in users if user.bill
+        )
+
+    return created, duplicates
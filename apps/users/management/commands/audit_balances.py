@@ -0,0 +1,121 @@
+import os
+import json
+import time
+from multiprocessing import Pool, cpu_count
+from typing import Callable, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from apps.users.audit import (
+    audit_snapshot,
+    audit_users,
+    audit_operations,
+    merge_users,
+    merge_operations,
+    get_chunks,
+)
+from apps.users.models import User, LedgerEntry
+
+
+def audit_chunk(chunk: Tuple[str, int, int, Optional[str]]) -> Tuple[str, int, object]:
+    table, min_id, max_id, snapshot = chunk
+    audit = audit_users if table == 'users' else audit_operations
+    return table, min_id, audit(min_id, max_id, snapshot)
+
+
+class Command(BaseCommand):
+    help = (
+        'Check that money is conserved: bills are not below zero and match the ledger, transfers net to zero '
+        'and all bills sum to opening balances and adjustments. Exits with error if violations are found'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=cpu_count(),
+                            help='Number of processes, ranges are checked by one process except on PostgreSQL')
+        parser.add_argument('--chunk-size', type=int, default=100000, help='Ids of users or ledger entries per range')
+        parser.add_argument('--checkpoint',
+                            help='File to save results of checked ranges to and resume from, removed when done. '
+                                 'Resumed ranges are read from a new snapshot, so only users violations are reported')
+
+    def handle(self, *args, workers: int, chunk_size: int, checkpoint: str, **options):
+        state = self.load_checkpoint(checkpoint)
+        resumed = state is not None
+        if resumed:
+            self.stdout.write(f'Resuming from {checkpoint}')
+
+        started = time.perf_counter()
+        # Ranges share the snapshot of the command transaction only on PostgreSQL
+        if workers > 1 and connection.vendor == 'postgresql':
+            # Processes are forked before the snapshot transaction is opened, so they do not share its connection
+            connections.close_all()
+            with Pool(workers) as pool:
+                state = self.audit(pool.imap_unordered, state, chunk_size, checkpoint)
+        else:
+            state = self.audit(map, state, chunk_size, checkpoint)
+        elapsed = time.perf_counter() - started
+
+        # Money moved between ranges read from different snapshots is counted twice or missed,
+        # so totals and transfers split between ranges are checked only by a run from one snapshot
+        totals, violations = merge_users(list(state['results']['users'].values()), compare_totals=not resumed)
+        if not resumed:
+            violations += merge_operations(list(state['results']['ledger'].values()))
+
+        for subject, reason in violations:
+            self.stderr.write(f'{subject}: {reason}')
+
+        self.stdout.write(
+            f'Checked {len(state["chunks"]["users"])} users ranges and {len(state["chunks"]["ledger"])} ledger ranges '
+            f'in {elapsed:.1f}s. Bills: {totals["bills"]}, ledger: {totals["ledger"]}, '
+            f'opening balances and adjustments: {totals["external"]}'
+        )
+        if resumed:
+            self.stdout.write(
+                f'Ranges were read from different snapshots, totals and transfers are not compared. '
+                f'Users with id above {state["max_ids"]["users"]} and ledger entries with id above '
+                f'{state["max_ids"]["ledger"]} were created after the first run and are not checked'
+            )
+
+        if checkpoint and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+        if violations:
+            raise CommandError(f'{len(violations)} violations found')
+
+    def audit(self, map_chunks: Callable, state: Optional[dict], chunk_size: int, checkpoint: str) -> dict:
+        with audit_snapshot() as snapshot:
+            if state is None:
+                chunks = {'users': get_chunks(User, chunk_size), 'ledger': get_chunks(LedgerEntry, chunk_size)}
+                state = {
+                    'chunks': chunks,
+                    # Ids of the first snapshot, a resumed run checks only them
+                    'max_ids': {table: ranges[-1][1] if ranges else 0 for table, ranges in chunks.items()},
+                    'results': {'users': {}, 'ledger': {}},
+                }
+
+            pending = [
+                (table, min_id, max_id, snapshot)
+                for table, chunks in state['chunks'].items()
+                for min_id, max_id in chunks if str(min_id) not in state['results'][table]
+            ]
+            for table, min_id, result in map_chunks(audit_chunk, pending):
+                state['results'][table][str(min_id)] = result
+                if checkpoint:
+                    self.save_checkpoint(checkpoint, state)
+
+        return state
+
+    @staticmethod
+    def load_checkpoint(checkpoint: str) -> Optional[dict]:
+        if not checkpoint or not os.path.exists(checkpoint):
+            return None
+
+        with open(checkpoint, encoding='utf-8') as file:
+            return json.load(file)
+
+    @staticmethod
+    def save_checkpoint(checkpoint: str, state: dict):
+        # Written to a temporary file and renamed, so an interrupted write does not break the checkpoint
+        with open(f'{checkpoint}.tmp', 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(f'{checkpoint}.tmp', checkpoint)
@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from apps.users.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys older than IDEMPOTENCY_KEY_TTL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=10000, help='Keys deleted in one query')
+
+    def handle(self, *args, batch_size: int, **options):
+        expired = IdempotencyKey.objects.filter(
+            created_at__lte=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        )
+
+        deleted = 0
+        while True:
+            # Short deletes by created_at index instead of one long transaction
+            batch_deleted, _ = IdempotencyKey.objects.filter(
+                pk__in=list(expired.order_by('created_at').values_list('pk', flat=True)[:batch_size])
+            ).delete()
+            deleted += batch_deleted
+            if batch_deleted < batch_size:
+                break
+
+        self.stdout.write(f'Deleted {deleted} idempotency keys')
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.contrib.auth import get_user_model
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Fold bill slots of hot accounts into their bills'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds between compactions')
+        parser.add_argument('--once', action='store_true', help='Compact once and exit')
+
+    def handle(self, *args, interval: float, once: bool, **options):
+        while True:
+            for user_id in User.objects.filter(bill_slots__gt=0).values_list('pk', flat=True):
+                # Transaction per user keeps slots of other hot accounts unlocked
+                with transaction.atomic():
+                    if User.compact_bill_slots([user_id]):
+                        self.stdout.write(f'Compacted bill slots of user {user_id}')
+
+            if once:
+                return
+
+            time.sleep(interval)
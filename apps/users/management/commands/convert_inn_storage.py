@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from apps.users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Convert users INN column to the storage set by USER_INN_COMPACT setting (PostgreSQL only)'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('INN storage can be converted only on PostgreSQL')
+
+        table = User._meta.db_table
+        column = User._meta.get_field('inn').column
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = %s',
+                [table, column],
+            )
+            is_compact = cursor.fetchone()[0] == 'bigint'
+
+        if is_compact == settings.USER_INN_COMPACT:
+            self.stdout.write('INN storage is already converted')
+            return
+
+        with connection.schema_editor() as schema_editor:
+            # varchar_pattern_ops index created by Django for prefix search can't be converted to bigint
+            like_index = schema_editor._create_index_name(table, [column], suffix='_like')
+            if settings.USER_INN_COMPACT:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(like_index)}')
+                schema_editor.execute(f'ALTER TABLE {table} ALTER COLUMN {column} TYPE bigint USING {column}::bigint')
+            else:
+                schema_editor.execute(
+                    f'ALTER TABLE {table} ALTER COLUMN {column} TYPE varchar(12) USING lpad({column}::text, 12, \'0\')'
+                )
+                schema_editor.execute(
+                    f'CREATE INDEX {schema_editor.quote_name(like_index)} ON {table} ({column} varchar_pattern_ops)'
+                )
+
+        self.stdout.write(f'INN is stored as {"bigint" if settings.USER_INN_COMPACT else "varchar(12)"}')
@@ -0,0 +1,69 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from apps.users.models import LedgerEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Create monthly partitions of the ledger ahead of time (PostgreSQL only), run it from cron. '
+        'Entries of the month already written to the DEFAULT partition are moved to the new one, '
+        'the ledger is locked for writes meanwhile'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months', type=int, default=3, help='Number of months starting from the current one')
+
+    def handle(self, *args, months: int, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write('Ledger is partitioned only on PostgreSQL')
+            return
+
+        table = LedgerEntry._meta.db_table
+        month = timezone.now().date().replace(day=1)
+        with connection.cursor() as cursor:
+            for _ in range(months):
+                next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+                partition = f'{table}_p{month:%Y%m}'
+                cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [partition])
+                if not cursor.fetchone()[0]:
+                    moved = self.create_partition(cursor, table, partition, month, next_month)
+                    if moved:
+                        self.stdout.write(f'{moved} entries are moved from {table}_default to {partition}')
+
+                self.stdout.write(f'Partition {partition} is ready')
+                month = next_month
+
+    @staticmethod
+    @transaction.atomic()
+    def create_partition(cursor, table: str, partition: str, month: date, next_month: date) -> int:
+        """
+        PostgreSQL refuses to create a partition while DEFAULT has rows for its range, so DEFAULT is detached
+        for the time the partition is created and the rows are moved, returns number of moved rows
+        """
+        cursor.execute(
+            f'SELECT EXISTS (SELECT 1 FROM {table}_default WHERE created_at >= %s AND created_at < %s)',
+            [month, next_month],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(
+                f'CREATE TABLE {partition} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)', [month, next_month],
+            )
+            return 0
+
+        cursor.execute(f'ALTER TABLE {table} DETACH PARTITION {table}_default')
+        cursor.execute(
+            f'CREATE TABLE {partition} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)', [month, next_month],
+        )
+        cursor.execute(
+            f'WITH moved AS ('
+            f'DELETE FROM {table}_default WHERE created_at >= %s AND created_at < %s RETURNING *'
+            f') INSERT INTO {table} SELECT * FROM moved',
+            [month, next_month],
+        )
+        moved = cursor.rowcount
+        cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {table}_default DEFAULT')
+        return moved
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.contrib.auth import get_user_model
+
+from apps.users.export import EXPORT_FORMATS, get_export_rows, iter_export
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Export all users as NDJSON or CSV with constant memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default=EXPORT_FORMATS[0], dest='export_format')
+        parser.add_argument('--output', help='File to write, stdout by default')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched from cursor at once')
+
+    def handle(self, *args, export_format: str, output: str, chunk_size: int, **options):
+        rows = get_export_rows(User.objects.order_by('-id'), chunk_size)
+        chunks = iter_export(rows, export_format, chunk_size)
+
+        if output is None:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+
+        with open(output, 'w', encoding='utf-8', newline='') as file:
+            file.writelines(chunks)
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth import get_user_model
+
+from apps.users.models import BillSlot
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Enable hot account mode: split bill of the user into N slots, 0 disables it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('inn', help='INN of the user')
+        parser.add_argument('slots', type=int, help=f'Number of bill slots, up to {BillSlot.MAX_SLOTS}')
+
+    def handle(self, *args, inn: str, slots: int, **options):
+        if not 0 <= slots <= BillSlot.MAX_SLOTS:
+            raise CommandError(f'Number of slots must be from 0 to {BillSlot.MAX_SLOTS}')
+
+        try:
+            user = User.objects.get(inn=inn)
+        except User.DoesNotExist:
+            raise CommandError(f'User with INN {inn} does not exist')
+
+        user.set_bill_slots(slots)
+        self.stdout.write(f'User {inn} has {slots} bill slots')
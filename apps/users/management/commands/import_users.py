@@ -0,0 +1,41 @@
+import csv
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.users.imports import IMPORT_FORMATS, import_users, iter_import_rows
+
+
+class Command(BaseCommand):
+    help = 'Create users from CSV (with header) or NDJSON with fields: inn, username, first_name, last_name, bill'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='File to import')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, dest='import_format',
+                            help='Format of the file, by extension by default')
+        parser.add_argument('--report', help='CSV file to write rejected rows to, stderr by default')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Rows validated and copied at once')
+
+    def handle(self, *args, file: str, import_format: str, report: str, batch_size: int, **options):
+        import_format = import_format or file.rsplit('.', 1)[-1].lower()
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError(f'Format must be one of: {", ".join(IMPORT_FORMATS)}')
+
+        started = time.perf_counter()
+        with open(file, encoding='utf-8', newline='') as import_file:
+            created, rejected = import_users(iter_import_rows(import_file, import_format), batch_size)
+        elapsed = time.perf_counter() - started
+
+        if report:
+            with open(report, 'w', encoding='utf-8', newline='') as report_file:
+                writer = csv.writer(report_file)
+                writer.writerow(('line', 'inn', 'reason'))
+                writer.writerows(rejected)
+        else:
+            for line, inn, reason in rejected:
+                self.stderr.write(f'Line {line} ({inn}): {reason}')
+
+        self.stdout.write(
+            f'Created {created} users, rejected {len(rejected)} rows in {elapsed:.1f}s '
+            f'({(created + len(rejected)) / max(elapsed, 1e-9):.0f} rows/s)'
+        )
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError
+
+from apps.users.exceptions import TransferError
+from apps.users.models import MoneyTransfer
+
+
+class Command(BaseCommand):
+    help = 'Apply money transfers queued by money_transfer in async mode'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Transfers applied in one transaction')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait when queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue and exit')
+
+    def handle(self, *args, batch_size: int, interval: float, once: bool, **options):
+        while True:
+            try:
+                processed = MoneyTransfer.process_pending(batch_size)
+            except (TransferError, DatabaseError) as e:
+                if once:
+                    raise
+
+                # Batch is rolled back and will be picked up again
+                self.stderr.write(f'Batch failed: {e}')
+                processed = 0
+
+            if processed:
+                self.stdout.write(f'Processed {processed} money transfers')
+                continue
+
+            if once:
+                return
+
+            time.sleep(interval)
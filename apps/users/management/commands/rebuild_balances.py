@@ -0,0 +1,43 @@
+from multiprocessing import Pool, cpu_count
+from typing import Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.models import Max, Min
+
+from apps.users.models import User
+
+
+def rebuild_chunk(chunk: Tuple[int, int, bool]) -> int:
+    min_id, max_id, dry_run = chunk
+    return User.rebuild_bills(min_id, max_id, dry_run=dry_run)
+
+
+class Command(BaseCommand):
+    help = 'Rebuild users bills from the ledger in parallel chunks of users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=cpu_count(), help='Number of processes')
+        parser.add_argument('--chunk-size', type=int, default=100000, help='Users ids per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only count bills which differ from the ledger')
+
+    def handle(self, *args, workers: int, chunk_size: int, dry_run: bool, **options):
+        bounds = User.objects.aggregate(min_id=Min('id'), max_id=Max('id'))
+        if bounds['min_id'] is None:
+            return
+
+        chunks = [
+            (start, min(start + chunk_size - 1, bounds['max_id']), dry_run)
+            for start in range(bounds['min_id'], bounds['max_id'] + 1, chunk_size)
+        ]
+
+        if workers > 1:
+            # Forked processes must not share connections of the parent
+            connections.close_all()
+            with Pool(workers) as pool:
+                mismatched = sum(pool.imap_unordered(rebuild_chunk, chunks))
+        else:
+            mismatched = sum(map(rebuild_chunk, chunks))
+
+        action = 'differ from' if dry_run else 'rebuilt from'
+        self.stdout.write(f'{mismatched} bills {action} the ledger')
@@ -0,0 +1,36 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoneyTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('list_of_inn', models.JSONField(verbose_name='List of INN')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12, verbose_name='Amount')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=7, verbose_name='Status')),
+                ('error', models.CharField(blank=True, max_length=255, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created at')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Processed at')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='money_transfers', to=settings.AUTH_USER_MODEL, verbose_name='Sender')),
+            ],
+            options={
+                'verbose_name': 'Money transfer',
+                'verbose_name_plural': 'Money transfers',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='moneytransfer',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['id'], name='money_transfer_pending_index'),
+        ),
+    ]
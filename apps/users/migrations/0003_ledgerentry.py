@@ -0,0 +1,113 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:40
+
+from datetime import date
+import uuid
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.utils import timezone
+import django.utils.timezone
+
+# Months to create partitions for, later partitions are created by `manage.py create_ledger_partitions`
+PARTITION_MONTHS = 3
+
+
+def create_ledger_table(apps, schema_editor):
+    """
+    On PostgreSQL ledger is partitioned by created_at (primary key has to include partition key),
+    other databases get a plain table
+    """
+    LedgerEntry = apps.get_model('users', 'LedgerEntry')
+
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.create_model(LedgerEntry)
+        return
+
+    schema_editor.execute(
+        'CREATE TABLE users_ledgerentry ('
+        '    id bigserial NOT NULL,'
+        '    user_id bigint NOT NULL REFERENCES users_user (id) DEFERRABLE INITIALLY DEFERRED,'
+        '    operation uuid NOT NULL,'
+        '    kind varchar(7) NOT NULL,'
+        '    amount numeric(14, 2) NOT NULL,'
+        '    created_at timestamp with time zone NOT NULL,'
+        '    PRIMARY KEY (id, created_at)'
+        ') PARTITION BY RANGE (created_at)'
+    )
+    schema_editor.execute('CREATE TABLE users_ledgerentry_default PARTITION OF users_ledgerentry DEFAULT')
+    schema_editor.execute('CREATE INDEX ledger_entry_user_index ON users_ledgerentry (user_id, id DESC)')
+
+    month = timezone.now().date().replace(day=1)
+    for _ in range(PARTITION_MONTHS):
+        next_month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        schema_editor.execute(
+            f'CREATE TABLE users_ledgerentry_p{month:%Y%m} PARTITION OF users_ledgerentry '
+            f'FOR VALUES FROM (\'{month.isoformat()}\') TO (\'{next_month.isoformat()}\')'
+        )
+        month = next_month
+
+
+def drop_ledger_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        schema_editor.delete_model(apps.get_model('users', 'LedgerEntry'))
+        return
+
+    schema_editor.execute('DROP TABLE users_ledgerentry CASCADE')
+
+
+def record_opening_balances(apps, schema_editor):
+    """
+    Bills existing before the ledger become opening entries
+    """
+    User = apps.get_model('users', 'User')
+    LedgerEntry = apps.get_model('users', 'LedgerEntry')
+
+    operation = uuid.uuid4()
+    created_at = timezone.now()
+
+    batch = []
+    for user_id, bill in User.objects.exclude(bill=0).values_list('id', 'bill').iterator(chunk_size=10000):
+        batch.append(LedgerEntry(
+            user_id=user_id, operation=operation, kind='opening', amount=bill, created_at=created_at
+        ))
+        if len(batch) == 10000:
+            LedgerEntry.objects.bulk_create(batch)
+            batch = []
+
+    LedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_moneytransfer'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='LedgerEntry',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('operation', models.UUIDField(default=uuid.uuid4, verbose_name='Operation')),
+                        ('kind', models.CharField(choices=[('opening', 'Opening balance'), ('adjust', 'Adjustment'), ('debit', 'Debit'), ('credit', 'Credit')], max_length=7, verbose_name='Kind')),
+                        ('amount', models.DecimalField(decimal_places=2, max_digits=14, verbose_name='Amount')),
+                        ('created_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created at')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='ledger_entries', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+                    ],
+                    options={
+                        'verbose_name': 'Ledger entry',
+                        'verbose_name_plural': 'Ledger entries',
+                    },
+                ),
+                migrations.AddIndex(
+                    model_name='ledgerentry',
+                    index=models.Index(fields=['user', '-id'], name='ledger_entry_user_index'),
+                ),
+            ],
+        ),
+        migrations.RunPython(create_ledger_table, drop_ledger_table),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:43
+
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_ledgerentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='bill_slots',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Hot account mode: credits go to one of N bill slots instead of the user row (0 - disabled)', verbose_name='Bill slots'),
+        ),
+        migrations.CreateModel(
+            name='BillSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('slot', models.PositiveSmallIntegerField(verbose_name='Slot')),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), max_digits=12, verbose_name='Amount')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to=settings.AUTH_USER_MODEL, verbose_name='User')),
+            ],
+            options={
+                'verbose_name': 'Bill slot',
+                'verbose_name_plural': 'Bill slots',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='billslot',
+            constraint=models.UniqueConstraint(fields=('user', 'slot'), name='bill_slot_unique'),
+        ),
+    ]
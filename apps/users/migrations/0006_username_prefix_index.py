@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+def create_username_prefix_index(apps, schema_editor):
+    """
+    Index for case-insensitive prefix search (`username__istartswith`) on PostgreSQL.
+    Prefix search by INN uses users_user_inn_..._like index created by Django for unique CharField
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(
+        'CREATE INDEX user_username_prefix_index ON users_user (UPPER(username::text) text_pattern_ops)'
+    )
+
+
+def drop_username_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX user_username_prefix_index')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_username_prefix_index, drop_username_prefix_index),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:54
+
+from django.db import migrations
+import utils.fields
+import utils.validators
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_username_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='inn',
+            field=utils.fields.INNField(max_length=12, unique=True, validators=[utils.validators.INNValidator()], verbose_name='INN'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_inn_field'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitBucket',
+            fields=[
+                ('key', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Key')),
+                ('tokens', models.FloatField(verbose_name='Tokens')),
+                ('updated_at', models.FloatField(help_text='Unix time of the last refill', verbose_name='Updated at')),
+            ],
+            options={
+                'verbose_name': 'Rate limit bucket',
+                'verbose_name_plural': 'Rate limit buckets',
+            },
+        ),
+    ]
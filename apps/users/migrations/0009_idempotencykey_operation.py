@@ -0,0 +1,19 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:52
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_ratelimitbucket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='operation',
+            field=models.UUIDField(default=uuid.uuid4, help_text='Operation of ledger entries written by the request', verbose_name='Operation'),
+        ),
+    ]
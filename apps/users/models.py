@@ -1,17 +1,28 @@
+from collections import defaultdict
 from decimal import Decimal
-from typing import List
+from random import randrange
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from uuid import UUID, uuid4
 
-from django.db import models, transaction
+from django.db import connection, models, transaction
+from django.db.models import Case, DecimalField, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Mod, NullIf
+from django.utils import timezone
 from django.core.validators import MinValueValidator
 from django.contrib.auth.models import AbstractUser
 
+from apps.users.exceptions import TransferError, NotEnoughMoneyError, RecipientsNotFoundError
+from apps.users.stamps import invalidate_users
+from utils.db.retry import retry_on_conflict
 from utils.decimal import round_decimal
+from utils.fields import INNField
 from utils.validators import INNValidator
 
 
 class User(AbstractUser):
 
-    inn = models.CharField(
+    inn = INNField(
         'INN',
         unique=True,
         max_length=12,
@@ -26,18 +37,327 @@ class User(AbstractUser):
         validators=[MinValueValidator(Decimal('0.00'))]
     )
 
+    bill_slots = models.PositiveSmallIntegerField(
+        'Bill slots',
+        default=0,
+        help_text='Hot account mode: credits go to one of N bill slots instead of the user row (0 - disabled)',
+    )
+
+    @property
+    def total_bill(self) -> Decimal:
+        """
+        Bill including hot account slots, use `load_slots_bills` to get it for many users by one query
+        """
+        slots_bill = self.__dict__.get('slots_bill')
+        if slots_bill is None:
+            slots_bill = self.slots.aggregate(total=Sum('amount'))['total'] if self.bill_slots else None
+
+        return self.bill + (slots_bill or 0)
+
+    @staticmethod
+    def total_bill_expression() -> Case:
+        """
+        Expression of total_bill for annotations, slots are summed only for hot accounts
+        """
+        return Case(
+            When(
+                bill_slots__gt=0,
+                then=F('bill') + Coalesce(
+                    Subquery(
+                        BillSlot.objects.filter(
+                            user=OuterRef('pk')
+                        ).order_by().values('user').annotate(total=Sum('amount')).values('total')
+                    ),
+                    Value(Decimal('0.00')),
+                ),
+            ),
+            default=F('bill'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+
+    @staticmethod
+    def ledger_bill_expression() -> Coalesce:
+        """
+        Expression of bill by the sum of user ledger entries for annotations
+        """
+        return Coalesce(
+            Subquery(
+                LedgerEntry.objects.filter(
+                    user=OuterRef('pk')
+                ).order_by().values('user').annotate(total=Sum('amount')).values('total')
+            ),
+            Value(Decimal('0.00')),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+
+    @classmethod
+    def load_slots_bills(cls, users: Iterable['User']):
+        """
+        Set slots_bill of users, query is made only if there are hot accounts among them
+        """
+        hot_users_ids = [user.pk for user in users if user.bill_slots]
+        slots_bills = dict(
+            BillSlot.objects.filter(
+                user_id__in=hot_users_ids
+            ).order_by().values('user').annotate(total=Sum('amount')).values_list('user', 'total')
+        ) if hot_users_ids else {}
+
+        for user in users:
+            user.slots_bill = slots_bills.get(user.pk, Decimal('0.00'))
+
     @transaction.atomic()
-    def transfer_money(self, list_of_inn: List[str], amount: Decimal):
+    def set_bill_slots(self, bill_slots: int):
+        """
+        Enable hot account mode with bill_slots slots or disable it with 0
+        """
+        User.compact_bill_slots([self.pk])
+        self.slots.all().delete()
+        BillSlot.objects.bulk_create(BillSlot(user_id=self.pk, slot=slot) for slot in range(bill_slots))
+
+        self.bill_slots = bill_slots
+        User.objects.filter(pk=self.pk).update(bill_slots=bill_slots)
+
+    @classmethod
+    def compact_bill_slots(cls, users_ids: Iterable[int]) -> int:
+        """
+        Fold slots of hot accounts into their bills, returns number of users with folded slots.
+        All slots of the users are locked until the end of transaction, so credits made meanwhile wait
+        instead of being lost. Must be called inside transaction
+        """
+        slots = list(BillSlot.objects.select_for_update().filter(user_id__in=users_ids).order_by('pk').values_list(
+            'pk', 'user_id', 'amount'
+        ))
+
+        slots_bills = defaultdict(Decimal)
+        for _, user_id, amount in slots:
+            if amount:
+                slots_bills[user_id] += amount
+
+        for user_id, amount in slots_bills.items():
+            cls.objects.filter(pk=user_id).update(bill=F('bill') + amount)
+
+        if slots_bills:
+            BillSlot.objects.filter(pk__in=[pk for pk, _, amount in slots if amount]).update(amount=0)
+
+        return len(slots_bills)
+
+    @classmethod
+    def lock_users(cls, users_ids: Iterable[int], list_of_inn: Union[Iterable[str], RawSQL]) -> int:
+        """
+        Lock rows of senders and recipients in the order of id, returns number of locked rows.
+        Transfers touching the same users take their locks in the same order, so they wait for each other
+        instead of deadlocking. Hot accounts are credited to slots and are locked only as senders.
+        Must be called inside transaction before the first update
+        """
+        users = cls.objects.filter(Q(pk__in=users_ids) | Q(inn__in=list_of_inn, bill_slots=0))
+        return len(users.select_for_update().order_by('pk').values_list('pk', flat=True))
+
+    @classmethod
+    def debit_bill(cls, user_id: int, amount: Decimal) -> bool:
+        """
+        Conditional debit, returns False if there is not enough money.
+        Slots of a hot account are folded into bill only if bill alone is not enough
+        """
+        debited = cls.objects.filter(pk=user_id, bill__gte=amount).update(bill=F('bill') - amount)
+        if not debited and cls.compact_bill_slots([user_id]):
+            debited = cls.objects.filter(pk=user_id, bill__gte=amount).update(bill=F('bill') - amount)
+
+        if debited:
+            invalidate_users(ids=[user_id])
+
+        return bool(debited)
+
+    @classmethod
+    def credit_bills(cls, list_of_inn: List[str], amount: Decimal) -> int:
+        """
+        Credit each user by INN, returns number of credited users.
+        Hot accounts are skipped by the first UPDATE and credited to a random slot by the second one,
+        which is made only if some INNs are left
+        """
+        credited = cls.objects.filter(inn__in=list_of_inn, bill_slots=0).update(bill=F('bill') + amount)
+        if credited != len(list_of_inn):
+            credited += BillSlot.credit(list_of_inn, amount)
+
+        if credited:
+            invalidate_users(inns=list_of_inn)
+
+        return credited
+
+    @retry_on_conflict()
+    @transaction.atomic()
+    def transfer_money(self, list_of_inn: List[str], amount: Decimal, operation: UUID = None):
+        """
+        Debit sender and credit recipients in equal parts with two set-based UPDATE queries.
+        Balance and recipients checks are made by affected rows count, all changes are rolled back on error.
+        Rows are locked in the order of id beforehand, deadlocks left (e.g. on slots) are retried.
+        Ledger entries are written with the given operation id, e.g. of the idempotency key of the request
+        """
+        User.lock_users([self.pk], list_of_inn)
+        self._transfer_money(list_of_inn, amount, operation)
+
+    def _transfer_money(self, list_of_inn: List[str], amount: Decimal, operation: UUID = None):
         amount_per_user = round_decimal(amount / len(list_of_inn))
+        total_amount = amount_per_user * len(list_of_inn)
+
+        # Nothing is written if debit fails, so NotEnoughMoneyError does not need a rollback
+        if not User.debit_bill(self.pk, total_amount):
+            raise NotEnoughMoneyError()
+
+        if User.credit_bills(list_of_inn, amount_per_user) != len(list_of_inn):
+            raise RecipientsNotFoundError()
+
+        LedgerEntry.record_transfer(self.pk, list_of_inn, amount_per_user, total_amount, operation)
+
+    @transaction.atomic()
+    def adjust_bill(self, amount: Decimal, kind: str = None):
+        """
+        Change bill outside of transfers (deposit, withdrawal, correction) keeping the ledger in sync
+        """
+        if amount < 0:
+            if not User.debit_bill(self.pk, -amount):
+                raise NotEnoughMoneyError()
+        else:
+            User.objects.filter(pk=self.pk).update(bill=F('bill') + amount)
+            invalidate_users(ids=[self.pk])
+
+        LedgerEntry.objects.create(user_id=self.pk, kind=kind or LedgerEntry.Kind.ADJUSTMENT, amount=amount)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        user = super().from_db(db, field_names, values)
+        user.loaded_bill = user.__dict__.get('bill')
+        return user
+
+    def refresh_from_db(self, using: str = None, fields: Iterable[str] = None):
+        super().refresh_from_db(using, fields)
+        if fields is None or 'bill' in fields:
+            self.loaded_bill = self.bill
+
+    def save(self, *args, update_fields: Iterable[str] = None, **kwargs):
+        """
+        Bill of an existing user is never written as is: its change since the user was loaded is applied
+        by `adjust_bill`, so it is recorded to the ledger and transfers committed meanwhile are kept.
+        Queryset `update(bill=...)` bypasses the ledger, `rebuild_bills` reverts such changes
+        """
+        if self._state.adding:
+            super().save(*args, update_fields=update_fields, **kwargs)
+            self.loaded_bill = self.bill
+            return
+
+        if update_fields is None:
+            deferred_fields = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in deferred_fields
+            ]
+
+        loaded_bill = getattr(self, 'loaded_bill', None)
+        delta = Decimal('0.00')
+        if 'bill' in update_fields and loaded_bill is not None:
+            delta = self._meta.get_field('bill').to_python(self.bill) - loaded_bill
+
+        with transaction.atomic():
+            super().save(*args, update_fields=[name for name in update_fields if name != 'bill'], **kwargs)
+            if delta:
+                self.adjust_bill(delta)
+
+        if delta:
+            self.loaded_bill = loaded_bill + delta
+
+    @classmethod
+    @transaction.atomic()
+    def rebuild_bills(cls, min_id: int, max_id: int, dry_run: bool = False) -> int:
+        """
+        Set bills of users with id in [min_id, max_id] to the sum of their ledger entries,
+        returns number of bills that differed from the ledger
+        """
+        users = cls.objects.filter(pk__range=(min_id, max_id))
+        # Transfers touching the range wait until rebuild is committed
+        list(users.select_for_update().order_by('pk').values_list('pk', flat=True))
+        cls.compact_bill_slots(users.filter(bill_slots__gt=0).values('pk'))
+
+        ledger_bill = cls.ledger_bill_expression()
+        mismatched = users.exclude(bill=ledger_bill)
+
+        if dry_run:
+            return mismatched.count()
+
+        invalidate_users(bulk=True)
+        return mismatched.update(bill=ledger_bill)
+
+    @classmethod
+    def transfer_money_batch(cls, transfers: List[Tuple['User', List[str], Decimal]],
+                             chunk_size: int = 100) -> List[Optional[TransferError]]:
+        """
+        Apply (sender, list_of_inn, amount) transfers in one transaction per chunk_size transfers.
+        A failed transfer does not affect others: its error is returned in place of None
+        """
+        errors = []
+        for start in range(0, len(transfers), chunk_size):
+            chunk = transfers[start:start + chunk_size]
+            try:
+                errors.extend(cls._transfer_money_chunk(chunk))
+            except RecipientsNotFoundError:
+                # Recipient was deleted after the check, fall back to savepoint per transfer
+                errors.extend(cls._transfer_money_chunk_with_savepoints(chunk))
 
-        self.bill = round_decimal(self.bill - amount_per_user * len(list_of_inn))
-        self.save()
+        return errors
 
-        users_to_replenish = User.objects.only('id', 'bill').filter(inn__in=list_of_inn)
-        for user_to_replenish in users_to_replenish:
-            user_to_replenish.bill = round_decimal(user_to_replenish.bill + amount_per_user)
+    @classmethod
+    def lock_transfers_users(cls, transfers: List[Tuple['User', List[str], Decimal]]) -> int:
+        return cls.lock_users(
+            {sender.pk for sender, _, _ in transfers},
+            {inn for _, list_of_inn, _ in transfers for inn in list_of_inn},
+        )
 
-        self.__class__.objects.bulk_update(users_to_replenish, ['bill'], batch_size=100)
+    @classmethod
+    @retry_on_conflict()
+    @transaction.atomic()
+    def _transfer_money_chunk(cls, transfers: List[Tuple['User', List[str], Decimal]]
+                              ) -> List[Optional[TransferError]]:
+        """
+        Recipients of the whole chunk are checked by one query beforehand, then each transfer
+        can only fail on debit, which writes nothing. So no savepoint per transfer is needed.
+        Users of the whole chunk are locked at once, locks taken transfer by transfer would be out of order
+        """
+        cls.lock_transfers_users(transfers)
+        existing_inns = set(
+            cls.objects.filter(
+                inn__in={inn for _, list_of_inn, _ in transfers for inn in list_of_inn}
+            ).values_list('inn', flat=True)
+        )
+
+        errors = []
+        for sender, list_of_inn, amount in transfers:
+            if not existing_inns.issuperset(list_of_inn):
+                errors.append(RecipientsNotFoundError())
+                continue
+
+            try:
+                sender._transfer_money(list_of_inn, amount)
+            except NotEnoughMoneyError as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+
+        return errors
+
+    @classmethod
+    @retry_on_conflict()
+    @transaction.atomic()
+    def _transfer_money_chunk_with_savepoints(cls, transfers: List[Tuple['User', List[str], Decimal]]
+                                              ) -> List[Optional[TransferError]]:
+        cls.lock_transfers_users(transfers)
+        errors = []
+        for sender, list_of_inn, amount in transfers:
+            try:
+                sender.transfer_money(list_of_inn, amount)
+            except TransferError as e:
+                errors.append(e)
+            else:
+                errors.append(None)
+
+        return errors
 
     class Meta:
         # Т.к. пользователь может быть много, то вешаем индексы
@@ -52,3 +372,383 @@ class User(AbstractUser):
 
     def __str__(self):
         return self.username
+
+
+class MoneyTransfer(models.Model):
+    """
+    Money transfer queued by money_transfer in async mode and applied by `manage.py process_money_transfers`
+    """
+
+    class Status(models.TextChoices):
+        PENDING = 'pending', 'Pending'
+        DONE = 'done', 'Done'
+        FAILED = 'failed', 'Failed'
+
+    sender = models.ForeignKey(
+        User,
+        verbose_name='Sender',
+        on_delete=models.CASCADE,
+        related_name='money_transfers',
+    )
+
+    list_of_inn = models.JSONField(
+        'List of INN',
+    )
+
+    amount = models.DecimalField(
+        'Amount',
+        max_digits=12,
+        decimal_places=2,
+    )
+
+    status = models.CharField(
+        'Status',
+        max_length=7,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+
+    error = models.CharField(
+        'Error',
+        max_length=255,
+        blank=True,
+    )
+
+    created_at = models.DateTimeField(
+        'Created at',
+        auto_now_add=True,
+    )
+
+    processed_at = models.DateTimeField(
+        'Processed at',
+        null=True,
+        blank=True,
+    )
+
+    @classmethod
+    @retry_on_conflict()
+    @transaction.atomic()
+    def process_pending(cls, batch_size: int = 500) -> int:
+        """
+        Apply up to batch_size pending transfers in one transaction, returns number of processed transfers.
+        Debits are conditional updates per transfer, credits to the same INN are coalesced and applied
+        by one UPDATE per distinct amount at the end of the batch.
+        Locked rows are skipped, so several workers can drain the queue at once.
+        Senders and recipients of the batch are locked in the order of id before the first debit
+        """
+        transfers = list(
+            cls.objects.select_for_update(skip_locked=True).filter(
+                status=cls.Status.PENDING,
+            ).order_by('id')[:batch_size]
+        )
+        if not transfers:
+            return 0
+
+        User.lock_users(
+            {transfer.sender_id for transfer in transfers},
+            {inn for transfer in transfers for inn in transfer.list_of_inn},
+        )
+        existing_inns = set(
+            User.objects.filter(
+                inn__in={inn for transfer in transfers for inn in transfer.list_of_inn}
+            ).values_list('inn', flat=True)
+        )
+
+        credits = defaultdict(Decimal)
+        failed = defaultdict(list)
+        for transfer in transfers:
+            if not existing_inns.issuperset(transfer.list_of_inn):
+                failed[RecipientsNotFoundError.message].append(transfer.pk)
+                continue
+
+            amount_per_user = round_decimal(transfer.amount / len(transfer.list_of_inn))
+            total_amount = amount_per_user * len(transfer.list_of_inn)
+
+            debited = User.debit_bill(transfer.sender_id, total_amount)
+            if not debited and credits:
+                # Sender may be waiting for a credit from this batch
+                cls._apply_credits(credits)
+                debited = User.debit_bill(transfer.sender_id, total_amount)
+
+            if not debited:
+                failed[NotEnoughMoneyError.message].append(transfer.pk)
+                continue
+
+            for inn in transfer.list_of_inn:
+                credits[inn] += amount_per_user
+
+            LedgerEntry.record_transfer(transfer.sender_id, transfer.list_of_inn, amount_per_user, total_amount)
+
+        cls._apply_credits(credits)
+
+        now = timezone.now()
+        for error, transfers_ids in failed.items():
+            cls.objects.filter(pk__in=transfers_ids).update(status=cls.Status.FAILED, error=error, processed_at=now)
+
+        failed_ids = {pk for transfers_ids in failed.values() for pk in transfers_ids}
+        cls.objects.filter(
+            pk__in=[transfer.pk for transfer in transfers if transfer.pk not in failed_ids]
+        ).update(status=cls.Status.DONE, processed_at=now)
+
+        return len(transfers)
+
+    @staticmethod
+    def _apply_credits(credits: Dict[str, Decimal]):
+        """
+        Credit INN -> amount with one UPDATE per distinct amount and clear credits.
+        Raises RecipientsNotFoundError (rolling back the batch) if a recipient was deleted after the check
+        """
+        inns_by_amount = defaultdict(list)
+        for inn, amount in credits.items():
+            inns_by_amount[amount].append(inn)
+
+        for amount, list_of_inn in inns_by_amount.items():
+            if User.credit_bills(list_of_inn, amount) != len(list_of_inn):
+                raise RecipientsNotFoundError()
+
+        credits.clear()
+
+    class Meta:
+        indexes = [
+            models.Index(name='money_transfer_pending_index', fields=['id', ], condition=Q(status='pending')),
+        ]
+        verbose_name = 'Money transfer'
+        verbose_name_plural = 'Money transfers'
+
+    def __str__(self):
+        return f'{self.sender_id}: {self.amount} ({self.status})'
+
+
+class BillSlot(models.Model):
+    """
+    Part of a hot account bill. Credits to the account update a random slot row, so concurrent transfers
+    to the same INN do not wait for each other on the user row lock. `User.compact_bill_slots` folds slots back
+    """
+
+    # Upper bound of slot numbers, random slot of a user is taken modulo user.bill_slots
+    MAX_SLOTS = 1024
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='User',
+        on_delete=models.CASCADE,
+        related_name='slots',
+    )
+
+    slot = models.PositiveSmallIntegerField(
+        'Slot',
+    )
+
+    amount = models.DecimalField(
+        'Amount',
+        max_digits=12,
+        decimal_places=2,
+        default=Decimal('0.00'),
+    )
+
+    @classmethod
+    def credit(cls, list_of_inn: Union[List[str], RawSQL], amount: Decimal) -> int:
+        """
+        Credit a random slot of each hot account by INN (list or subquery), returns number of credited users
+        """
+        return cls.objects.filter(
+            user__inn__in=list_of_inn,
+            slot=Mod(Value(randrange(cls.MAX_SLOTS)), NullIf(F('user__bill_slots'), Value(0))),
+        ).update(amount=F('amount') + amount)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(name='bill_slot_unique', fields=['user', 'slot']),
+        ]
+        verbose_name = 'Bill slot'
+        verbose_name_plural = 'Bill slots'
+
+    def __str__(self):
+        return f'{self.user_id}[{self.slot}]: {self.amount}'
+
+
+class LedgerEntry(models.Model):
+    """
+    Append-only history of bill changes, `User.bill` is the sum of user ledger entries.
+    On PostgreSQL the table is partitioned by created_at, see `manage.py create_ledger_partitions`
+    """
+
+    class Kind(models.TextChoices):
+        OPENING = 'opening', 'Opening balance'
+        ADJUSTMENT = 'adjust', 'Adjustment'
+        DEBIT = 'debit', 'Debit'
+        CREDIT = 'credit', 'Credit'
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='User',
+        on_delete=models.PROTECT,
+        related_name='ledger_entries',
+    )
+
+    operation = models.UUIDField(
+        'Operation',
+        default=uuid4,
+    )
+
+    kind = models.CharField(
+        'Kind',
+        max_length=7,
+        choices=Kind.choices,
+    )
+
+    amount = models.DecimalField(
+        'Amount',
+        max_digits=14,
+        decimal_places=2,
+    )
+
+    created_at = models.DateTimeField(
+        'Created at',
+        default=timezone.now,
+    )
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise TypeError('Ledger entries are immutable')
+
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise TypeError('Ledger entries are immutable')
+
+    @classmethod
+    def record_transfer(cls, sender_id: int, list_of_inn: Union[List[str], RawSQL], amount_per_user: Decimal,
+                        total_amount: Decimal, operation: UUID = None) -> int:
+        """
+        Write debit entry of the sender and credit entries of the recipients (INN list or subquery)
+        by one INSERT ... SELECT, returns number of written entries
+        """
+        field = cls._meta.get_field
+        operation = operation or uuid4()
+        created_at = timezone.now()
+        recipients_sql, recipients_params = User.objects.filter(
+            inn__in=list_of_inn
+        ).values('id').query.sql_with_params()
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {cls._meta.db_table} (user_id, operation, kind, amount, created_at) '
+                f'SELECT %s, %s, %s, %s, %s '
+                f'UNION ALL SELECT recipients.id, %s, %s, %s, %s FROM ({recipients_sql}) recipients',
+                [
+                    sender_id,
+                    field('operation').get_db_prep_value(operation, connection),
+                    cls.Kind.DEBIT,
+                    field('amount').get_db_prep_save(-total_amount, connection),
+                    field('created_at').get_db_prep_value(created_at, connection),
+                    field('operation').get_db_prep_value(operation, connection),
+                    cls.Kind.CREDIT,
+                    field('amount').get_db_prep_save(amount_per_user, connection),
+                    field('created_at').get_db_prep_value(created_at, connection),
+                    *recipients_params,
+                ],
+            )
+            return cursor.rowcount
+
+    class Meta:
+        indexes = [
+            models.Index(name='ledger_entry_user_index', fields=['user', '-id']),
+        ]
+        verbose_name = 'Ledger entry'
+        verbose_name_plural = 'Ledger entries'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.amount} ({self.kind})'
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response of a request made with `Idempotency-Key` header, replayed for retries of the request.
+    Row without status_code is a request in progress, expired rows are deleted by `manage.py clear_idempotency_keys`
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name='User',
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+    )
+
+    key = models.CharField(
+        'Key',
+        max_length=255,
+    )
+
+    request_hash = models.CharField(
+        'Request hash',
+        max_length=64,
+    )
+
+    status_code = models.PositiveSmallIntegerField(
+        'Status code',
+        null=True,
+        blank=True,
+    )
+
+    headers = models.JSONField(
+        'Headers',
+        default=dict,
+    )
+
+    content = models.BinaryField(
+        'Content',
+        default=b'',
+    )
+
+    operation = models.UUIDField(
+        'Operation',
+        default=uuid4,
+        help_text='Operation of ledger entries written by the request',
+    )
+
+    created_at = models.DateTimeField(
+        'Created at',
+        default=timezone.now,
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(name='idempotency_key_unique', fields=['user', 'key']),
+        ]
+        indexes = [
+            models.Index(name='idempotency_key_created_index', fields=['created_at', ]),
+        ]
+        verbose_name = 'Idempotency key'
+        verbose_name_plural = 'Idempotency keys'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.key}'
+
+
+class RateLimitBucket(models.Model):
+    """
+    Token bucket shared by all workers and hosts, tokens are taken by one upsert, see `apps.users.throttling`
+    """
+
+    key = models.CharField(
+        'Key',
+        max_length=255,
+        primary_key=True,
+    )
+
+    tokens = models.FloatField(
+        'Tokens',
+    )
+
+    updated_at = models.FloatField(
+        'Updated at',
+        help_text='Unix time of the last refill',
+    )
+
+    class Meta:
+        verbose_name = 'Rate limit bucket'
+        verbose_name_plural = 'Rate limit buckets'
+
+    def __str__(self):
+        return f'{self.key}: {self.tokens}'
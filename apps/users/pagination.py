@@ -0,0 +1,67 @@
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+
+class UserCursorPagination(CursorPagination):
+    """
+    Keyset pagination by -id: no COUNT(*) and no OFFSET scan
+    """
+    ordering = '-id'
+
+
+class LedgerCursorPagination(CursorPagination):
+    """
+    Keyset pagination of ledger entries, backed by (user, -id) index
+    """
+    ordering = '-id'
+
+
+class UserPagination(PageNumberPagination):
+    """
+    Page number pagination with opt-in cursor mode.
+    Cursor mode is enabled by `?pagination=cursor` or by passing `cursor` from next/previous links
+    """
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    cursor_pagination_class = UserCursorPagination
+
+    cursor_paginator = None
+
+    def is_cursor_mode(self, request) -> bool:
+        return (
+            request.query_params.get(self.mode_query_param) == self.cursor_mode or
+            self.cursor_pagination_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.is_cursor_mode(request):
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.to_html()
+
+        return super().to_html()
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                'name': self.mode_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to "cursor" to use keyset pagination without total count',
+                'schema': {
+                    'type': 'string',
+                    'enum': [self.cursor_mode],
+                },
+            },
+            *self.cursor_pagination_class().get_schema_operation_parameters(view),
+        ]
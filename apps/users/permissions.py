@@ -1,12 +1,76 @@
+import time
+from typing import Set
+
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework.permissions import BasePermission
 
+PERMISSIONS_VERSION_CACHE_KEY = 'users:permissions:version'
+
+
+def get_permissions_cache_key(user_id: int, name: str = 'permissions') -> str:
+    """
+    Key of user permissions (or groups) includes global version, so changes of groups or permissions invalidate
+    all users at once. Version starts from current time, so if it is evicted old entries are not picked up again
+    """
+    version = cache.get_or_set(PERMISSIONS_VERSION_CACHE_KEY, time.time_ns, timeout=None)
+    return f'users:{name}:{version}:{user_id}'
+
+
+def get_cached_permissions(user) -> Set[str]:
+    key = get_permissions_cache_key(user.pk)
+    permissions = cache.get(key)
+    if permissions is None:
+        permissions = user.get_all_permissions()
+        cache.set(key, permissions, settings.PERMISSIONS_CACHE_TIMEOUT)
+
+    return permissions
+
+
+def get_cached_groups(user) -> Set[str]:
+    """
+    Names of user groups, cached and invalidated the same way as permissions
+    """
+    key = get_permissions_cache_key(user.pk, 'groups')
+    groups = cache.get(key)
+    if groups is None:
+        groups = set(user.groups.values_list('name', flat=True))
+        cache.set(key, groups, settings.PERMISSIONS_CACHE_TIMEOUT)
+
+    return groups
+
+
+def has_cached_perm(user, perm: str) -> bool:
+    """
+    Same as user.has_perm for ModelBackend, but permissions are taken from cache shared by workers
+    """
+    if not user.is_active:
+        return False
+
+    if user.is_superuser:
+        return True
+
+    return perm in get_cached_permissions(user)
+
+
+def invalidate_user_permissions(user_id: int):
+    cache.delete_many([get_permissions_cache_key(user_id), get_permissions_cache_key(user_id, 'groups')])
+
+
+def invalidate_permissions():
+    try:
+        cache.incr(PERMISSIONS_VERSION_CACHE_KEY)
+    except ValueError:
+        # Version is evicted, get_permissions_cache_key starts a new one
+        pass
+
 
 class UserViewSetPermission(BasePermission):
 
     def has_permission(self, request, view):
 
-        if view.action == 'money_transfer':
-            return request.user.has_perm('users.can_money_transfer')
+        if view.action in ('money_transfer', 'money_transfer_fanout', 'money_transfer_batch', 'money_transfer_status'):
+            return has_cached_perm(request.user, 'users.can_money_transfer')
 
-        if view.action in ('list', 'retrieve', 'metadata'):
-            return request.user.has_perm('users.view_user')
+        if view.action in ('list', 'retrieve', 'metadata', 'ledger', 'export', 'lookup'):
+            return has_cached_perm(request.user, 'users.view_user')
@@ -0,0 +1,55 @@
+"""
+Cache of user list and retrieve responses, validated by version stamps of users (apps.users.stamps)
+"""
+import hashlib
+from typing import Callable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+from apps.users.encoders import EncodedJSONResponse
+from apps.users.stamps import RESPONSE_CACHE_ALIAS, get_stamps, get_user_version_keys
+from utils.db.routers import use_primary
+
+
+def get_cache_key(request, name: str) -> str:
+    """
+    Response depends on the path with query params, host (absolute links of pagination) and media type
+    """
+    url = f'{request.get_host()}{request.get_full_path()};{request.accepted_media_type}'
+    return f'users:response:{name}:{hashlib.md5(url.encode()).hexdigest()}'
+
+
+def cached_response(request, name: str, version_keys: Tuple[str, ...],
+                    encode: Callable[[], Tuple[bytes, Optional[str]]]) -> EncodedJSONResponse:
+    """
+    Cached response or response of `encode` stored in cache, 304 if If-None-Match has its ETag.
+    `encode` returns content and INN of the user to add its stamp (retrieve), stamps known beforehand
+    are read before `encode`, so changes committed meanwhile are not hidden by them.
+    Response is encoded from the primary: a lagging replica would store old data under the new stamps
+    """
+    cache = caches[RESPONSE_CACHE_ALIAS]
+    key = get_cache_key(request, name)
+
+    entry = cache.get(key)
+    stamps = get_stamps(version_keys + entry['inn_keys'] if entry else version_keys)
+    if entry is None or any(stamps[stamp_key] != value for stamp_key, value in entry['stamps'].items()):
+        with use_primary():
+            content, inn = encode()
+        inn_keys = get_user_version_keys(inn=inn)[1:] if inn is not None else ()
+        if inn_keys and not (entry and entry['inn_keys'] == inn_keys):
+            stamps.update(get_stamps(inn_keys))
+
+        entry = {
+            'stamps': {stamp_key: stamps[stamp_key] for stamp_key in version_keys + inn_keys},
+            'inn_keys': inn_keys,
+            'etag': quote_etag(hashlib.md5(content).hexdigest()),
+            'content': content,
+        }
+        cache.set(key, entry, settings.RESPONSE_CACHE_TIMEOUT)
+
+    response = get_conditional_response(request, etag=entry['etag']) or EncodedJSONResponse(entry['content'])
+    response['ETag'] = entry['etag']
+    return response
@@ -1,12 +1,21 @@
 from decimal import Decimal, ROUND_HALF_DOWN
 
+from django.db import models
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError, ParseError
 
-from apps.users.models import User
+from apps.users.models import User, MoneyTransfer, LedgerEntry
 from utils.decimal import round_decimal
 
 
+class UserListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, (models.Manager, models.QuerySet)) else data)
+        User.load_slots_bills(users)
+        return super().to_representation(users)
+
+
 class UserSerializer(serializers.ModelSerializer):
 
     full_name = serializers.CharField(
@@ -14,8 +23,16 @@ class UserSerializer(serializers.ModelSerializer):
         source='get_full_name',
     )
 
+    bill = serializers.DecimalField(
+        label='Bill',
+        source='total_bill',
+        max_digits=12,
+        decimal_places=2,
+    )
+
     class Meta:
         model = User
+        list_serializer_class = UserListSerializer
         fields = (
             'id',
             'inn',
@@ -26,6 +43,18 @@ class UserSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class UserLookupSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = User
+        fields = (
+            'id',
+            'username',
+            'inn',
+        )
+        read_only_fields = fields
+
+
 class MoneyTransferSerializer(serializers.Serializer):
 
     list_of_inn = serializers.ListSerializer(
@@ -43,9 +72,6 @@ class MoneyTransferSerializer(serializers.Serializer):
     )
 
     def validate(self, attrs):
-        if self.context['user'].bill < attrs['amount']:
-            raise ParseError('Users bill does not have enough money')
-
         amount_per_user = round_decimal(attrs['amount'] / len(attrs['list_of_inn']))
 
         if amount_per_user < Decimal('0.01'):
@@ -57,7 +83,102 @@ class MoneyTransferSerializer(serializers.Serializer):
         if len(list_of_inn) != len(set(list_of_inn)):
             raise ValidationError('INN in list must be uniq')
 
-        if User.objects.filter(inn__in=list_of_inn).count() != len(list_of_inn):
-            raise ValidationError('All INN must be owned by the users')
-
         return list_of_inn
+
+
+class MoneyTransferFanoutSerializer(serializers.Serializer):
+
+    amount = serializers.DecimalField(
+        label='Amount',
+        max_digits=12,
+        decimal_places=2,
+        min_value=Decimal('0.01'),
+        rounding=ROUND_HALF_DOWN,
+    )
+
+
+class MoneyTransferStatusSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = MoneyTransfer
+        fields = (
+            'id',
+            'sender',
+            'list_of_inn',
+            'amount',
+            'status',
+            'error',
+            'created_at',
+            'processed_at',
+        )
+        read_only_fields = fields
+
+
+class LedgerEntrySerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = LedgerEntry
+        fields = (
+            'id',
+            'operation',
+            'kind',
+            'amount',
+            'created_at',
+        )
+        read_only_fields = fields
+
+
+class MoneyTransferBatchItemSerializer(MoneyTransferSerializer):
+
+    user = serializers.IntegerField(
+        label='Sender ID',
+    )
+
+    def validate_user(self, user_id):
+        sender = self.context['senders'].get(user_id)
+
+        if sender is None:
+            raise ValidationError('User not found')
+
+        return sender
+
+
+class MoneyTransferBatchSerializer(serializers.Serializer):
+
+    max_transfers = 1000
+
+    transfers = serializers.ListField(
+        label='Transfers',
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=max_transfers,
+    )
+
+    def get_senders(self, transfers) -> dict:
+        """
+        Help function to load all senders of the batch by one query
+        """
+        senders_ids = set()
+        for transfer in transfers:
+            try:
+                senders_ids.add(int(transfer.get('user')))
+            except (TypeError, ValueError):
+                pass
+
+        return User.objects.only('id').in_bulk(senders_ids)
+
+    def get_items(self):
+        """
+        Validate each transfer on its own, so an invalid one does not reject the whole batch.
+        Returns list of item serializers, `is_valid()` is already called
+        """
+        transfers = self.validated_data['transfers']
+        context = {'senders': self.get_senders(transfers)}
+
+        items = []
+        for transfer in transfers:
+            item = MoneyTransferBatchItemSerializer(data=transfer, context=context)
+            item.is_valid()
+            items.append(item)
+
+        return items
@@ -0,0 +1,47 @@
+from django.contrib.auth.models import Group, Permission
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from apps.users.models import User, LedgerEntry
+from apps.users.authentication import invalidate_user_snapshot
+from apps.users.permissions import invalidate_user_permissions, invalidate_permissions
+from apps.users.stamps import invalidate_users
+
+
+@receiver(post_save, sender=User)
+def record_opening_balance(sender, instance: User, created: bool, raw: bool, **kwargs):
+    if created and not raw and instance.bill:
+        LedgerEntry.objects.create(user=instance, kind=LedgerEntry.Kind.OPENING, amount=instance.bill)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache_on_change(sender, instance: User, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+
+    invalidate_user_snapshot(instance.pk)
+    # is_active and is_superuser affect permissions too
+    invalidate_user_permissions(instance.pk)
+    invalidate_users(ids=[instance.pk], inns=[instance.inn])
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(m2m_changed, sender=Group.permissions.through)
+def invalidate_permissions_on_m2m_change(sender, instance, action: str, reverse: bool, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if isinstance(instance, User):
+        invalidate_user_permissions(instance.pk)
+    else:
+        # Permissions of a group or users of a permission changed, may affect any user
+        invalidate_permissions()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_delete, sender=Permission)
+def invalidate_permissions_on_change(sender, **kwargs):
+    invalidate_permissions()
@@ -0,0 +1,59 @@
+"""
+Version stamps of users for the response cache (apps.users.response_cache).
+
+Stamps are tokens (time of change in ns) in the response cache: `users:version` of the whole table (list pages),
+`users:version:id:{pk}` and `users:version:inn:{inn}` of a user and `users:epoch` of bulk changes (retrieve).
+Changes of users replace the stamps they affect after commit (`invalidate_users`), a cached response is served
+only while all stamps it was built with are unchanged. Stamps replaced by one process are seen by the others only
+in a shared cache (memcached), so responses are cached only with a shared RESPONSE_CACHE_URL (see settings).
+Cache is LRU, evicted stamps just invalidate their responses.
+"""
+import time
+from typing import Dict, Iterable, Tuple
+
+from django.core.cache import caches
+from django.db import transaction
+
+RESPONSE_CACHE_ALIAS = 'responses'
+USERS_VERSION_KEY = 'users:version'
+USERS_EPOCH_KEY = 'users:epoch'
+
+
+def get_user_version_keys(user_id: int = None, inn: str = None) -> Tuple[str, ...]:
+    keys = [USERS_EPOCH_KEY]
+    if user_id is not None:
+        keys.append(f'users:version:id:{user_id}')
+    if inn is not None:
+        keys.append(f'users:version:inn:{inn}')
+
+    return tuple(keys)
+
+
+def invalidate_users(ids: Iterable[int] = (), inns: Iterable[str] = (), bulk: bool = False):
+    """
+    Replace stamps of users changed by the current transaction when it is committed.
+    List pages are invalidated by any change, bulk changes (e.g. rebuild of bills) invalidate all users
+    """
+    keys = [USERS_VERSION_KEY]
+    keys.extend(f'users:version:id:{user_id}' for user_id in ids)
+    keys.extend(f'users:version:inn:{inn}' for inn in inns)
+    if bulk:
+        keys.append(USERS_EPOCH_KEY)
+
+    def replace_stamps():
+        stamp = time.time_ns()
+        caches[RESPONSE_CACHE_ALIAS].set_many(dict.fromkeys(keys, stamp), timeout=None)
+
+    transaction.on_commit(replace_stamps)
+
+
+def get_stamps(keys: Iterable[str]) -> Dict[str, int]:
+    cache = caches[RESPONSE_CACHE_ALIAS]
+    stamps = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in stamps}
+    if missing:
+        # Responses built with an evicted stamp never match the new one
+        cache.set_many(missing, timeout=None)
+        stamps.update(missing)
+
+    return stamps
@@ -1,8 +1,11 @@
+from random import randrange
 from typing import List
 
 from django.contrib.auth import get_user_model
 from model_bakery import baker
 
+from utils.validators import INNValidator
+
 User = get_user_model()
 
 USER_INN = '031473063921'
@@ -32,3 +35,15 @@ def generate_users(list_of_inn: List[str] = LIST_OF_INN) -> None:
     """
     for inn in list_of_inn:
         baker.make(User, inn=inn)
+
+
+def gen_inn() -> str:
+    """
+    Help function to generate valid INN for baker
+    """
+    inn = f'{randrange(10 ** 10):010d}'
+    inn += INNValidator().check_control_sum(inn)
+    return inn + INNValidator().check_control_sum(inn)
+
+
+baker.generators.add('utils.fields.INNField', gen_inn)
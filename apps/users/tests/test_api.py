@@ -1,16 +1,34 @@
+import csv
+import json
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-from django.contrib.auth.models import Permission
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from model_bakery import baker
 from parameterized import parameterized
 from rest_framework import status
+from rest_framework.response import Response
 from rest_framework.reverse import reverse
 from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import get_user_model
 
+from apps.users.models import MoneyTransfer, LedgerEntry, IdempotencyKey, BillSlot
+from apps.users.encoders import EncodedJSONResponse
+from apps.users.stamps import RESPONSE_CACHE_ALIAS
+from apps.users.pagination import UserPagination, UserCursorPagination
+from apps.users.views import UserViewSet as UserViewSetView
 from apps.users.serializers import UserSerializer
 from apps.users.tests.mock_data import USER_INN, LIST_OF_INN, USER_BILL, generate_users
+from utils.db.routers import use_primary
 
 User = get_user_model()
 
@@ -31,6 +49,8 @@ class UserViewSet(APITestCase):
 
     def setUp(self) -> None:
 
+        cache.clear()
+        caches[RESPONSE_CACHE_ALIAS].clear()
         self.user = baker.make(User, inn=USER_INN)
         self.url = reverse('user-list')
         self.data_to_transfer = {
@@ -81,6 +101,243 @@ class UserViewSet(APITestCase):
 
         self.assertListEqual(UserSerializer(instance=all_users, many=True).data, response.data.get('results'))
 
+    @parameterized.expand([
+        ({}, ),
+        ({'pagination': 'cursor', 'page_size': 5}, ),
+        ({'page': 2}, ),
+        (None, ),
+    ])
+    def test_list_method_fast_serialization(self, params: dict):
+
+        generate_users()
+        User.objects.filter(inn=LIST_OF_INN[0]).update(first_name='Иван "Ё"', last_name='\u2028\\/\t😀')
+        User.objects.filter(inn=LIST_OF_INN[1]).update(username='<script>', bill=Decimal('1234567890.10'))
+        User.objects.get(inn=LIST_OF_INN[2]).set_bill_slots(2)
+        User.credit_bills(LIST_OF_INN[:3], Decimal('0.05'))
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+        url = f'{self.url}{User.objects.get(inn=LIST_OF_INN[0]).pk}/' if params is None else self.url
+
+        with mock.patch.object(UserCursorPagination, 'page_size', 5), \
+                mock.patch('rest_framework.pagination.PageNumberPagination.page_size', 10):
+            response = self.client.get(url, params)
+            with mock.patch.object(UserViewSetView, 'fast_serialization', False):
+                expected = self.client.get(url, params)
+
+        # Golden test: fast path output is byte-identical to UserSerializer rendered by JSONRenderer
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response, EncodedJSONResponse)
+        self.assertNotIsInstance(expected, EncodedJSONResponse)
+        self.assertEqual(response.content, expected.content)
+        self.assertEqual(response['Content-Type'], expected['Content-Type'])
+
+    def test_list_method_fast_serialization_envelope(self):
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+
+        # Page can not be spliced into an envelope which does not end with results
+        def get_paginated_response(pagination, data):
+            return Response({'results': data, 'count': pagination.page.paginator.count})
+
+        with mock.patch.object(UserPagination, 'get_paginated_response', get_paginated_response), \
+                self.assertRaises(ImproperlyConfigured):
+            self.client.get(self.url)
+
+    @parameterized.expand([
+        ('ndjson', ),
+        ('csv', ),
+    ])
+    def test_export(self, export_format: str):
+
+        generate_users()
+        User.objects.filter(inn=LIST_OF_INN[0]).update(first_name='Иван', last_name='Петров', bill=Decimal('1.50'))
+        User.objects.get(inn=LIST_OF_INN[1]).set_bill_slots(2)
+        User.credit_bills(LIST_OF_INN[:2], Decimal('0.25'))
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+        # 1: get user, 2: get perm, 3: get users data by one query
+        with self.assertNumQueries(3):
+            response = self.client.get(f'{self.url}export/', {'export_format': export_format})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            content = b''.join(response.streaming_content).decode()
+
+        if export_format == 'ndjson':
+            rows = [json.loads(line) for line in content.splitlines()]
+        else:
+            rows = list(csv.DictReader(content.splitlines()))
+            for row in rows:
+                row['id'] = int(row['id'])
+
+        all_users = User.objects.order_by('-id')
+        self.assertListEqual(UserSerializer(instance=all_users, many=True).data, rows)
+        self.assertEqual(rows[-3]['bill'], '0.25')
+        self.assertEqual(rows[-2]['bill'], '1.75')
+
+        response = self.client.get(f'{self.url}export/', {'export_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        output = StringIO()
+        call_command('export_users', export_format=export_format, stdout=output)
+        self.assertEqual(output.getvalue(), content)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_response_cache(self):
+
+        generate_users(LIST_OF_INN[:2])
+        self.user.is_superuser = True
+        self.user.bill = USER_BILL
+        self.user.save()
+        self.client.force_authenticate(user=self.user)
+        recipient = User.objects.get(inn=LIST_OF_INN[0])
+        detail_url = f'{self.url}{recipient.pk}/'
+
+        # Cache is filled from the primary, a lagging replica would be cached under the new stamps
+        with mock.patch('apps.users.response_cache.use_primary', wraps=use_primary) as primary:
+            response = self.client.get(self.url)
+        primary.assert_called_once_with()
+        self.client.get(detail_url)
+        self.client.get(f'{self.url}{self.user.pk}/')
+
+        # List and users are served from cache, 304 for the same ETag
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).content, response.content)
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(self.client.get(detail_url).status_code, status.HTTP_200_OK)
+
+        # Stamps of the sender and recipients are replaced on commit
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.transfer_money(LIST_OF_INN[:2], Decimal(str(USER_BILL)))
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(detail_url).data['bill'], '0.07')
+        self.assertEqual(self.client.get(f'{self.url}{self.user.pk}/').data['bill'], '0.01')
+
+    def test_lookup(self):
+
+        generate_users()
+        User.objects.filter(inn=LIST_OF_INN[0]).update(username='Ivanov')
+        User.objects.filter(inn=LIST_OF_INN[1]).update(username='ivanova')
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+        url = f'{self.url}lookup/'
+
+        response = self.client.get(url, {'q': 'IVAN'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+        self.assertListEqual(
+            [{'id': user.pk, 'username': user.username, 'inn': user.inn}
+             for user in User.objects.filter(inn__in=LIST_OF_INN[:2]).order_by('username')],
+            response.data
+        )
+
+        response = self.client.get(url, {'q': '5', 'limit': 2})
+        self.assertListEqual(['508845617168', '538047207826'], [user['inn'] for user in response.data])
+
+        # 1: get users
+        with self.assertNumQueries(1):
+            not_modified = self.client.get(url, {'q': '5', 'limit': 2}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified.content, b'')
+
+        User.objects.filter(inn='508845617168').update(username='changed')
+        response = self.client.get(url, {'q': '5', 'limit': 2}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_permissions_cache(self):
+
+        def get_list():
+            # Fresh user per request as authentication does, permissions are cached by user id
+            self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+            return self.client.get(self.url)
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+        get_list()
+
+        self.client.force_authenticate(user=User.objects.get(pk=self.user.pk))
+        # Permissions and the response are cached
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        self.user.user_permissions.clear()
+        self.assertEqual(get_list().status_code, status.HTTP_403_FORBIDDEN)
+
+        group = Group.objects.create(name='viewers')
+        group.user_set.add(self.user)
+        self.assertEqual(get_list().status_code, status.HTTP_403_FORBIDDEN)
+        group.permissions.add(Permission.objects.get(codename=f'view_{User._meta.model_name}'))
+        self.assertEqual(get_list().status_code, status.HTTP_200_OK)
+
+        group.delete()
+        self.assertEqual(get_list().status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=300)
+    def test_cached_jwt_authentication(self):
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        url = f'{self.url}{self.user.pk}/'
+
+        # 1: get user, 2-3: get perms, 4: get user data
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        # User, perms and the response are cached
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_list_method_cursor_pagination(self):
+
+        generate_users()
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+        # 1: get user, 2: get perm, 3: get user data (no count)
+        with self.assertNumQueries(3):
+            response = self.client.get(self.url, {'pagination': 'cursor'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        self.assertNotIn('count', response.data)
+        self.assertIsNone(response.data.get('next'))
+        self.assertIsNone(response.data.get('previous'))
+
+        all_users = User.objects.only('id', 'inn', 'first_name', 'last_name', 'username', 'bill').order_by('-id')
+        self.assertListEqual(UserSerializer(instance=all_users, many=True).data, response.data.get('results'))
+
+    def test_list_method_cursor_pagination_pages(self):
+
+        generate_users()
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+
+        ids = []
+        url = f'{self.url}?pagination=cursor'
+        with mock.patch.object(UserCursorPagination, 'page_size', 5):
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+                self.assertLessEqual(len(response.data.get('results')), 5)
+                ids.extend(user['id'] for user in response.data.get('results'))
+                url = response.data.get('next')
+
+            response = self.client.get(response.data.get('previous'))
+            self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+            self.assertListEqual(ids[-6:-1], [user['id'] for user in response.data.get('results')])
+
+        self.assertListEqual(list(User.objects.order_by('-id').values_list('id', flat=True)), ids)
+
     @parameterized.expand([
         ({'user': 0}, ),
         ({'amount': -1}, ),
@@ -103,6 +360,253 @@ class UserViewSet(APITestCase):
         response = self.client.post(f'{self.url}{self.user.id}/money_transfer/', self.data_to_transfer, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
 
+    def test_money_transfer_rollback(self):
+
+        generate_users(LIST_OF_INN[:-1])
+
+        self.user.bill = USER_BILL
+        self.user.save()
+
+        self.auth_user_with_perm('can_money_transfer')
+
+        response = self.client.post(f'{self.url}{self.user.id}/money_transfer/', self.data_to_transfer, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertIn('list_of_inn', response.data)
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal(str(USER_BILL)))
+        self.assertFalse(User.objects.filter(inn__in=LIST_OF_INN).exclude(bill=0).exists())
+
+    def test_money_transfer_batch(self):
+
+        generate_users()
+
+        self.user.bill = 10
+        self.user.save()
+
+        transfers = [
+            {'user': self.user.pk, 'amount': 6, 'list_of_inn': LIST_OF_INN[:3]},
+            {'user': 0, 'amount': 1, 'list_of_inn': LIST_OF_INN[:3]},
+            {'user': self.user.pk, 'amount': 6, 'list_of_inn': LIST_OF_INN[:3]},
+            {'user': self.user.pk, 'amount': 1, 'list_of_inn': ['1']},
+            {'user': self.user.pk, 'amount': 1, 'list_of_inn': ['000000000001']},
+            {'user': self.user.pk, 'amount': 3, 'list_of_inn': LIST_OF_INN[:3]},
+        ]
+
+        response = self.client.post(f'{self.url}money_transfer_batch/', {'transfers': transfers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED, msg=response.data)
+
+        self.auth_user_with_perm('can_money_transfer')
+
+        response = self.client.post(f'{self.url}money_transfer_batch/', {'transfers': transfers}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        results = response.data.get('results')
+        self.assertListEqual(['ok', 'error', 'error', 'error', 'error', 'ok'], [result['status'] for result in results])
+        self.assertIn('user', results[1]['errors'])
+        self.assertIn('detail', results[2]['errors'])
+        self.assertIn('list_of_inn', results[3]['errors'])
+        self.assertIn('list_of_inn', results[4]['errors'])
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('1.00'))
+        self.assertListEqual(
+            [Decimal('3.00')] * 3,
+            list(User.objects.filter(inn__in=LIST_OF_INN[:3]).values_list('bill', flat=True))
+        )
+        self.assertFalse(User.objects.filter(inn__in=LIST_OF_INN[3:]).exclude(bill=0).exists())
+
+    def test_money_transfer_async(self):
+
+        generate_users()
+
+        self.user.bill = 16
+        self.user.save()
+
+        self.auth_user_with_perm('can_money_transfer')
+
+        response = self.client.post(f'{self.url}{self.user.id}/money_transfer/', self.data_to_transfer,
+                                    format='json', HTTP_PREFER='respond-async')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED, msg=response.data)
+        self.assertEqual(response.data.get('status'), MoneyTransfer.Status.PENDING)
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('16.00'))
+
+        status_url = response['Location']
+        self.assertEqual(status_url, f'http://testserver{self.url}money_transfer/{response.data.get("id")}/')
+
+        call_command('process_money_transfers', once=True, stdout=StringIO())
+
+        response = self.client.get(status_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+        self.assertEqual(response.data.get('status'), MoneyTransfer.Status.DONE)
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('15.85'))
+        self.assertFalse(User.objects.filter(inn__in=LIST_OF_INN).exclude(bill=Decimal('0.01')).exists())
+
+        response = self.client.get(f'{self.url}money_transfer/0/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, msg=response.data)
+
+    def test_money_transfer_idempotency_key(self):
+
+        generate_users()
+
+        self.user.bill = 16
+        self.user.save()
+
+        self.auth_user_with_perm('can_money_transfer')
+
+        url = f'{self.url}{self.user.id}/money_transfer/'
+        response = self.client.post(url, self.data_to_transfer, format='json', HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        # 1: get stored response, users table is not touched
+        with self.assertNumQueries(1):
+            replayed = self.client.post(url, self.data_to_transfer, format='json', HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(replayed.status_code, status.HTTP_200_OK)
+        self.assertEqual(replayed.content, response.content)
+        self.assertEqual(replayed['Content-Type'], response['Content-Type'])
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('15.85'))
+
+        response = self.client.post(url, dict(self.data_to_transfer, amount=1), format='json',
+                                    HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY, msg=response.data)
+
+        # Errors are replayed too
+        data_to_transfer = dict(self.data_to_transfer, amount=100)
+        response = self.client.post(url, data_to_transfer, format='json', HTTP_IDEMPOTENCY_KEY='error')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        replayed = self.client.post(url, data_to_transfer, format='json', HTTP_IDEMPOTENCY_KEY='error')
+        self.assertEqual((replayed.status_code, replayed.content), (response.status_code, response.content))
+
+        # Key of a request in progress
+        IdempotencyKey.objects.filter(key='error').update(status_code=None)
+        response = self.client.post(url, data_to_transfer, format='json', HTTP_IDEMPOTENCY_KEY='error')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT, msg=response.data)
+
+        # Key left in progress by a killed worker is taken over by a retry after the lease
+        IdempotencyKey.objects.filter(key='error').update(created_at=timezone.now() - timedelta(minutes=2))
+        response = self.client.post(url, dict(data_to_transfer, amount=1), format='json',
+                                    HTTP_IDEMPOTENCY_KEY='error')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY, msg=response.data)
+        response = self.client.post(url, data_to_transfer, format='json', HTTP_IDEMPOTENCY_KEY='error')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(IdempotencyKey.objects.get(key='error').status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Key of a committed transfer left in progress is not taken over, the transfer is not made again
+        IdempotencyKey.objects.filter(key='key').update(
+            status_code=None, created_at=timezone.now() - timedelta(minutes=2),
+        )
+        response = self.client.post(url, self.data_to_transfer, format='json', HTTP_IDEMPOTENCY_KEY='key')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT, msg=response.data)
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('15.85'))
+        self.assertEqual(LedgerEntry.objects.filter(user=self.user, kind=LedgerEntry.Kind.DEBIT).count(), 1)
+
+        with self.settings(IDEMPOTENCY_KEY_TTL=0):
+            call_command('clear_idempotency_keys', stdout=StringIO())
+            self.assertFalse(IdempotencyKey.objects.exists())
+
+    @parameterized.expand([
+        ({'transfers': []}, ),
+        ({'transfers': [1, 2]}, ),
+        ({}, ),
+    ])
+    def test_money_transfer_batch_bad_request(self, data: dict):
+
+        self.auth_user_with_perm('can_money_transfer')
+
+        response = self.client.post(f'{self.url}money_transfer_batch/', data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+
+    def test_money_transfer_fanout(self):
+
+        generate_users(LIST_OF_INN[:3])
+        self.user.adjust_bill(Decimal('10.00'))
+        url = f'{self.url}{self.user.id}/money_transfer_fanout/?amount=6'
+
+        def post(inns: list, url: str = url):
+            return self.client.post(url, '\n'.join(inns) + '\n', content_type='text/plain')
+
+        response = post(LIST_OF_INN[:3])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED, msg=response.data)
+
+        self.auth_user_with_perm('can_money_transfer')
+
+        response = post([LIST_OF_INN[0], '000000000001', LIST_OF_INN[1], 'abc', LIST_OF_INN[1]])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertListEqual(response.data['missing'], ['000000000001', 'abc'])
+
+        # Only exactly 12 digits are an INN
+        response = post([LIST_OF_INN[0], LIST_OF_INN[0][1:], LIST_OF_INN[1], '1'])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertListEqual(response.data['missing'], [LIST_OF_INN[0][1:], '1'])
+
+        response = post([LIST_OF_INN[1], LIST_OF_INN[0], '', LIST_OF_INN[1]])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertListEqual(response.data['duplicates'], [LIST_OF_INN[1]])
+
+        response = post([])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+
+        response = post(LIST_OF_INN[:3], url=f'{self.url}{self.user.id}/money_transfer_fanout/?amount=0.02')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+
+        User.objects.filter(inn=LIST_OF_INN[2]).get().set_bill_slots(4)
+        # Debit is rolled back unless every recipient is credited
+        with mock.patch.object(BillSlot, 'credit', return_value=0):
+            response = post(LIST_OF_INN[:3])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('10.00'))
+
+        response = post(LIST_OF_INN[:3])
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+        self.assertEqual(response.data['recipients'], 3)
+
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('4.00'))
+        self.assertListEqual(
+            [Decimal('2.00')] * 3,
+            [user.total_bill for user in User.objects.filter(inn__in=LIST_OF_INN[:3]).order_by('inn')]
+        )
+        self.assertEqual(LedgerEntry.objects.filter(kind=LedgerEntry.Kind.CREDIT).count(), 3)
+
+        response = post(LIST_OF_INN[:3])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, msg=response.data)
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('4.00'))
+
+    def test_ledger(self):
+
+        generate_users(LIST_OF_INN[:3])
+        self.user.adjust_bill(Decimal('3.00'))
+
+        self.auth_user_with_perm('can_money_transfer')
+        self.data_to_transfer.update({'amount': 3, 'list_of_inn': LIST_OF_INN[:3]})
+        response = self.client.post(f'{self.url}{self.user.id}/money_transfer/', self.data_to_transfer, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        response = self.client.get(f'{self.url}{self.user.id}/ledger/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN, msg=response.data)
+
+        self.auth_user_with_perm(f'view_{User._meta.model_name}')
+        # 1: get user, 2: get perm, 3: get user for action, 4: get ledger entries
+        with self.assertNumQueries(4):
+            response = self.client.get(f'{self.url}{self.user.id}/ledger/')
+            self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+
+        self.assertListEqual(
+            [(LedgerEntry.Kind.DEBIT, '-3.00'), (LedgerEntry.Kind.ADJUSTMENT, '3.00')],
+            [(entry['kind'], entry['amount']) for entry in response.data.get('results')]
+        )
+
+        recipient = User.objects.get(inn=LIST_OF_INN[0])
+        response = self.client.get(f'{self.url}{recipient.id}/ledger/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, msg=response.data)
+        self.assertListEqual(
+            [(LedgerEntry.Kind.CREDIT, '1.00')],
+            [(entry['kind'], entry['amount']) for entry in response.data.get('results')]
+        )
+
+        response = self.client.get(f'{self.url}0/ledger/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, msg=response.data)
+
     @parameterized.expand([
         ({'amount': 0.7, 'list_of_inn': LIST_OF_INN[:8]}, 0.7, Decimal('0.06'), Decimal('0.08')),
         ({'amount': 0.7, 'list_of_inn': LIST_OF_INN[:6]}, 0.7, Decimal('0.04'), Decimal('0.11')),
@@ -123,8 +627,8 @@ class UserViewSet(APITestCase):
         self.user.save()
 
         self.auth_user_with_perm('can_money_transfer')
-        # 1: get user for auth, 2: get perm, 3: get user for action, 4: check validation count, 5: set savepoint,
-        # 6: update user bill, 7: select users by inns, 8: bulk update users bills, 9: release savepoint
+        # 1: get user for auth, 2: get perm, 3: get user for action, 4: set savepoint, 5: lock users,
+        # 6: debit user bill, 7: credit users bills by inns, 8: write ledger entries, 9: release savepoint
         with self.assertNumQueries(9):
             response = self.client.post(f'{self.url}{self.user.id}/money_transfer/', self.data_to_transfer,
                                         format='json')
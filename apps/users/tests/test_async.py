@@ -0,0 +1,82 @@
+import asyncio
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.urls import resolve
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.users.tests.mock_data import USER_INN, LIST_OF_INN, USER_BILL, generate_users
+from test_project.asgi import ASGI_URLCONF
+
+User = get_user_model()
+
+
+@override_settings(ROOT_URLCONF=ASGI_URLCONF)
+class AsyncUserViewSet(TransactionTestCase):
+    """
+    Async views are run in threads with their own connections, so data must be committed
+    """
+    # Reads outside transactions go to replicas (mirrors of default in tests) if they are configured
+    databases = '__all__'
+
+    def setUp(self) -> None:
+
+        cache.clear()
+        self.user = baker.make(User, inn=USER_INN, bill=USER_BILL * 2, is_superuser=True)
+        generate_users(LIST_OF_INN[:3])
+        self.token = f'Bearer {AccessToken.for_user(self.user)}'
+        self.async_client = AsyncClient()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+
+    def async_request(self, method: str, *args, **kwargs):
+        """
+        Help function to send a request by async client from sync test
+        """
+        async def send():
+            return await getattr(self.async_client, method)(*args, authorization=self.token, **kwargs)
+
+        return async_to_sync(send)()
+
+    def test_async_routes(self):
+        """
+        Only list, retrieve and money_transfer are coroutines, the rest of routes are the same sync views
+        """
+        self.assertTrue(asyncio.iscoroutinefunction(resolve(reverse('user-list')).func))
+        self.assertTrue(asyncio.iscoroutinefunction(resolve(reverse('user-detail', args=(1, ))).func))
+        self.assertTrue(asyncio.iscoroutinefunction(resolve(reverse('user-money-transfer', args=(1, ))).func))
+        self.assertFalse(asyncio.iscoroutinefunction(resolve(reverse('user-lookup')).func))
+        self.assertTrue(resolve(reverse('user-list')).func.csrf_exempt)
+
+    def test_same_responses(self):
+        for url in (
+            reverse('user-list'),
+            f'{reverse("user-list")}?pagination=cursor',
+            reverse('user-detail', args=(self.user.pk, )),
+            reverse('user-detail', args=(0, )),
+        ):
+            # Query string is in the url, AsyncClient of Django 3.2 does not pass data of GET requests
+            response = self.async_request('get', url)
+            sync_response = self.client.get(url)
+
+            self.assertEqual(response.status_code, sync_response.status_code)
+            self.assertEqual(response.json(), sync_response.json())
+
+    def test_money_transfer(self):
+        url = reverse('user-money-transfer', args=(self.user.pk, ))
+        data = {'amount': USER_BILL, 'list_of_inn': LIST_OF_INN[:3]}
+
+        response = self.async_request('post', url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK, response.content)
+        self.assertEqual(response.json(), self.client.post(url, data, format='json').json())
+        self.assertEqual(User.objects.get(pk=self.user.pk).bill, Decimal('0.00'))
+
+        response = self.async_request('post', url, data, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -1,10 +1,25 @@
-from django.test import TestCase
+import os
+import csv
+import json
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.db.models import Sum
+from django.db import connection, models
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.core.validators import ValidationError
 from model_bakery import baker
 from parameterized import parameterized
 
-from apps.users.tests.mock_data import LIST_OF_INN
+from apps.users.models import MoneyTransfer, LedgerEntry, BillSlot
+from apps.users.serializers import UserSerializer
+from apps.users.exceptions import NotEnoughMoneyError, RecipientsNotFoundError
+from apps.users.tests.mock_data import USER_INN, LIST_OF_INN, generate_users
+from utils.validators import INNValidator
 
 User = get_user_model()
 
@@ -28,6 +43,40 @@ class UserTestCase(TestCase):
         user = baker.prepare(User, inn=inn)
         user.full_clean()
 
+    def test_validate_many_inn(self):
+        values = [
+            *LIST_OF_INN, '', '1', '009931674169', '42317441116711', '423174411168', '12345678901+', '８９９３１６７４１６９'
+        ]
+        expected = [True] * len(LIST_OF_INN) + [False] * 7
+
+        self.assertListEqual(INNValidator().validate_many(values), expected)
+        with mock.patch('utils.validators.numpy', None):
+            self.assertListEqual(INNValidator().validate_many(values), expected)
+
+    @override_settings(USER_INN_COMPACT=True)
+    def test_compact_inn_field(self):
+        field = User._meta.get_field('inn')
+
+        self.assertEqual(field.db_type(connection), models.BigIntegerField().db_type(connection))
+        self.assertEqual(field.get_prep_value(LIST_OF_INN[0]), 89931674169)
+        self.assertIsNone(field.get_prep_value('not inn'))
+        self.assertEqual(field.from_db_value(89931674169, None, connection), LIST_OF_INN[0])
+
+        sql, params = User.objects.filter(inn__startswith='0899').values('pk').query.sql_with_params()
+        self.assertIn('BETWEEN', sql)
+        self.assertEqual(params, (89900000000, 89999999999))
+
+    @parameterized.expand([(False, ), (True, )])
+    def test_inn_lookup_exact_length(self, compact: bool):
+        baker.make(User, inn='000000000001')
+
+        with override_settings(USER_INN_COMPACT=compact):
+            self.assertFalse(User.objects.filter(inn='1').exists())
+            self.assertFalse(User.objects.filter(inn__in=['1', '00000000001']).exists())
+            self.assertIsNone(User._meta.get_field('inn').get_prep_value('1') if compact else None)
+
+        self.assertTrue(User.objects.filter(inn__in=['1', '000000000001']).exists())
+
     @parameterized.expand([
         (-1, ),
         (1.999, ),
@@ -37,3 +86,257 @@ class UserTestCase(TestCase):
         user = baker.prepare(User, bill=bill)
         with self.assertRaises(ValidationError):
             user.full_clean()
+
+    def test_transfer_money_batch_fallback(self):
+        generate_users(LIST_OF_INN[:3])
+        sender = baker.make(User, inn=USER_INN, bill=Decimal('4.00'))
+
+        transfers = [
+            (sender, LIST_OF_INN[:3], Decimal('3.00')),
+            (sender, LIST_OF_INN[:3], Decimal('3.00')),
+            (sender, LIST_OF_INN[3:5], Decimal('1.00')),
+        ]
+        # Recipient deleted between check and credit makes the fast path fail for the whole chunk
+        with mock.patch.object(User, '_transfer_money_chunk', side_effect=RecipientsNotFoundError()):
+            errors = User.transfer_money_batch(transfers)
+
+        self.assertIsNone(errors[0])
+        self.assertIsInstance(errors[1], NotEnoughMoneyError)
+        self.assertIsInstance(errors[2], RecipientsNotFoundError)
+        self.assertEqual(User.objects.get(pk=sender.pk).bill, Decimal('1.00'))
+
+    def test_process_pending_money_transfers(self):
+        generate_users(LIST_OF_INN[:3])
+        sender = baker.make(User, inn=USER_INN, bill=Decimal('6.00'))
+        recipient = User.objects.get(inn=LIST_OF_INN[0])
+
+        transfers = [
+            baker.make(MoneyTransfer, sender=sender, list_of_inn=LIST_OF_INN[:3], amount=Decimal('3.00')),
+            baker.make(MoneyTransfer, sender=sender, list_of_inn=LIST_OF_INN[:2], amount=Decimal('2.00')),
+            baker.make(MoneyTransfer, sender=sender, list_of_inn=LIST_OF_INN[3:4], amount=Decimal('1.00')),
+            baker.make(MoneyTransfer, sender=sender, list_of_inn=LIST_OF_INN[:3], amount=Decimal('3.00')),
+            # Recipient is credited by the first transfer of the same batch
+            baker.make(MoneyTransfer, sender=recipient, list_of_inn=[USER_INN], amount=Decimal('2.00')),
+        ]
+
+        # 1: set savepoint, 2: select pending, 3: lock users, 4: check recipients,
+        # 5-8: debits and ledger entries of 2 transfers, 9-10: failed debit and check of hot account slots,
+        # 11-12: credits by amount, 13-14: failed debit after credits, 15: debit, 16: ledger entries, 17: credit,
+        # 18-19: set failed by error, 20: set done, 21: release savepoint
+        with self.assertNumQueries(21):
+            self.assertEqual(MoneyTransfer.process_pending(), len(transfers))
+
+        self.assertListEqual(
+            ['done', 'done', 'failed', 'failed', 'done'],
+            [transfer.status for transfer in MoneyTransfer.objects.order_by('id')]
+        )
+        self.assertEqual(MoneyTransfer.objects.get(pk=transfers[2].pk).error, RecipientsNotFoundError.message)
+        self.assertEqual(MoneyTransfer.objects.get(pk=transfers[3].pk).error, NotEnoughMoneyError.message)
+
+        self.assertEqual(User.objects.get(pk=sender.pk).bill, Decimal('3.00'))
+        self.assertListEqual(
+            [Decimal('0.00'), Decimal('2.00'), Decimal('1.00')],
+            [User.objects.get(inn=inn).bill for inn in LIST_OF_INN[:3]]
+        )
+        self.assertEqual(MoneyTransfer.process_pending(), 0)
+
+    def test_rebuild_bills(self):
+        generate_users(LIST_OF_INN[:3])
+        sender = baker.make(User, inn=USER_INN, bill=Decimal('4.00'))
+        sender.transfer_money(LIST_OF_INN[:3], Decimal('3.00'))
+        sender.adjust_bill(Decimal('-0.50'))
+
+        for user in User.objects.all():
+            self.assertEqual(user.bill, user.ledger_entries.aggregate(total=Sum('amount'))['total'] or 0)
+
+        User.objects.filter(inn=LIST_OF_INN[0]).update(bill=Decimal('100.00'))
+        self.assertEqual(User.rebuild_bills(0, sender.pk, dry_run=True), 1)
+
+        call_command('rebuild_balances', workers=1, chunk_size=2, stdout=StringIO())
+
+        self.assertEqual(User.objects.get(inn=LIST_OF_INN[0]).bill, Decimal('1.00'))
+        self.assertEqual(User.objects.get(pk=sender.pk).bill, Decimal('0.50'))
+        self.assertEqual(User.rebuild_bills(0, sender.pk, dry_run=True), 0)
+
+        with self.assertRaises(TypeError):
+            LedgerEntry.objects.first().save()
+
+    def test_save_bill(self):
+        generate_users(LIST_OF_INN[:1])
+        user = baker.make(User, inn=USER_INN, bill=Decimal('4.00'))
+        loaded = User.objects.get(pk=user.pk)
+
+        # Transfer committed after the user was loaded is kept, the change of bill is recorded to the ledger
+        user.transfer_money(LIST_OF_INN[:1], Decimal('1.00'))
+        loaded.bill = Decimal('10.00')
+        loaded.first_name = 'Name'
+        loaded.save()
+        user.refresh_from_db()
+        self.assertEqual(user.bill, Decimal('9.00'))
+        self.assertEqual(user.first_name, 'Name')
+        self.assertEqual(user.ledger_entries.get(kind=LedgerEntry.Kind.ADJUSTMENT).amount, Decimal('6.00'))
+
+        # Saved again without changes, nothing is recorded
+        loaded.save()
+        loaded.save(update_fields=['bill'])
+        self.assertEqual(user.ledger_entries.filter(kind=LedgerEntry.Kind.ADJUSTMENT).count(), 1)
+
+        deferred = User.objects.only('pk').get(pk=user.pk)
+        deferred.bill -= Decimal('20.00')
+        with self.assertRaises(NotEnoughMoneyError):
+            deferred.save()
+
+        deferred.bill = Decimal('0.00')
+        deferred.save(update_fields=['bill'])
+        self.assertEqual(User.objects.get(pk=user.pk).bill, Decimal('0.00'))
+        self.assertEqual(User.rebuild_bills(0, user.pk, dry_run=True), 0)
+
+    def test_audit_balances(self):
+        generate_users(LIST_OF_INN[:3])
+        sender = baker.make(User, inn=USER_INN)
+        sender.adjust_bill(Decimal('4.00'))
+        sender.transfer_money(LIST_OF_INN[:3], Decimal('3.00'))
+        User.objects.get(inn=LIST_OF_INN[2]).set_bill_slots(2)
+        sender.transfer_money(LIST_OF_INN[:3], Decimal('0.30'))
+
+        stdout = StringIO()
+        call_command('audit_balances', workers=1, chunk_size=2, stdout=stdout, stderr=StringIO())
+        self.assertIn('Bills: 4.00, ledger: 4.00, opening balances and adjustments: 4.00', stdout.getvalue())
+
+        User.objects.filter(inn=LIST_OF_INN[0]).update(bill=Decimal('-1.00'))
+        LedgerEntry.objects.filter(kind=LedgerEntry.Kind.DEBIT).update(amount=Decimal('-2.00'))
+
+        stderr = StringIO()
+        with self.assertRaisesMessage(CommandError, '7 violations found'):
+            call_command('audit_balances', workers=1, chunk_size=2, stdout=StringIO(), stderr=stderr)
+
+        recipient = User.objects.get(inn=LIST_OF_INN[0])
+        self.assertIn(f'user {recipient.pk}: Bill -1.00 is below zero', stderr.getvalue())
+        self.assertIn(f'user {recipient.pk}: Bill -1.00 differs from ledger 1.10', stderr.getvalue())
+        self.assertIn(f'user {sender.pk}: Bill 0.70 differs from ledger 0.00', stderr.getvalue())
+        self.assertEqual(stderr.getvalue().count('does not net to zero'), 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'audit.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'chunks': {'users': [[0, 0], [1, sender.pk]], 'ledger': []},
+                    'max_ids': {'users': sender.pk, 'ledger': 0},
+                    'results': {'users': {'0': {
+                        'bills': '0', 'ledger': '0', 'external': '0', 'violations': [['user 0', 'Checked before']],
+                    }}, 'ledger': {}},
+                }, file)
+
+            stderr = StringIO()
+            with self.assertRaises(CommandError):
+                call_command('audit_balances', workers=1, checkpoint=path, stdout=StringIO(), stderr=stderr)
+
+            self.assertIn('user 0: Checked before', stderr.getvalue())
+            self.assertIn(f'user {recipient.pk}: Bill -1.00 is below zero', stderr.getvalue())
+            self.assertNotIn('does not net to zero', stderr.getvalue())
+            self.assertNotIn('total bills', stderr.getvalue())
+            self.assertFalse(os.path.exists(path))
+
+        # Ranges resumed from a new snapshot do not add up, so only users violations are reported
+        User.objects.filter(inn=LIST_OF_INN[0]).update(bill=Decimal('1.10'))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'audit.json')
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'chunks': {'users': [[0, 0], [1, sender.pk]], 'ledger': []},
+                    'max_ids': {'users': sender.pk, 'ledger': 0},
+                    'results': {'users': {'0': {
+                        'bills': '5.00', 'ledger': '5.00', 'external': '0', 'violations': [],
+                    }}, 'ledger': {}},
+                }, file)
+
+            stdout, stderr = StringIO(), StringIO()
+            with self.assertRaisesMessage(CommandError, '1 violations found'):
+                call_command('audit_balances', workers=1, checkpoint=path, stdout=stdout, stderr=stderr)
+            self.assertIn(f'user {sender.pk}: Bill 0.70 differs from ledger 0.00', stderr.getvalue())
+            self.assertIn('totals and transfers are not compared', stdout.getvalue())
+
+    @parameterized.expand([
+        ('csv', ),
+        ('ndjson', ),
+    ])
+    def test_import_users(self, import_format: str):
+        baker.make(User, inn=LIST_OF_INN[0], username='existing')
+        rows = [
+            {'inn': LIST_OF_INN[1], 'username': 'first', 'first_name': 'Иван', 'last_name': '', 'bill': '10.50'},
+            {'inn': LIST_OF_INN[2], 'username': 'second', 'first_name': '', 'last_name': '', 'bill': ''},
+            {'inn': LIST_OF_INN[0], 'username': 'third', 'first_name': '', 'last_name': '', 'bill': '1'},
+            {'inn': LIST_OF_INN[3], 'username': 'existing', 'first_name': '', 'last_name': '', 'bill': '1'},
+            {'inn': LIST_OF_INN[1], 'username': 'fourth', 'first_name': '', 'last_name': '', 'bill': '1'},
+            {'inn': '123', 'username': 'fifth', 'first_name': '', 'last_name': '', 'bill': '1'},
+            {'inn': LIST_OF_INN[4], 'username': 'sixth', 'first_name': '', 'last_name': '', 'bill': '-1'},
+        ]
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, f'users.{import_format}')
+            with open(path, 'w', encoding='utf-8', newline='') as file:
+                if import_format == 'csv':
+                    writer = csv.DictWriter(file, fieldnames=rows[0].keys())
+                    writer.writeheader()
+                    writer.writerows(rows)
+                else:
+                    file.writelines(json.dumps(row) + '\n' for row in rows)
+
+            report = os.path.join(directory, 'report.csv')
+            call_command('import_users', path, report=report, batch_size=2, stdout=StringIO())
+            with open(report, encoding='utf-8') as file:
+                rejected = list(csv.DictReader(file))
+
+        # Line numbers of CSV count the header
+        first_line = 2 if import_format == 'csv' else 1
+        self.assertListEqual(
+            [(first_line + index, reason) for index, reason in (
+                (2, 'INN or username already exists'),
+                (3, 'INN or username already exists'),
+                (4, 'Duplicate inn in file'),
+                (5, 'Incorrect INN'),
+                (6, 'Incorrect bill'),
+            )],
+            [(int(row['line']), row['reason']) for row in rejected]
+        )
+
+        first = User.objects.get(inn=LIST_OF_INN[1])
+        self.assertEqual((first.username, first.first_name, first.bill), ('first', 'Иван', Decimal('10.50')))
+        self.assertFalse(first.has_usable_password())
+        self.assertEqual(User.objects.get(inn=LIST_OF_INN[2]).bill, Decimal('0.00'))
+        self.assertEqual(User.rebuild_bills(0, first.pk, dry_run=True), 0)
+
+    def test_hot_account(self):
+        generate_users(LIST_OF_INN[:3])
+        sender = baker.make(User, inn=USER_INN, bill=Decimal('10.00'))
+        call_command('hot_account', LIST_OF_INN[0], 4, stdout=StringIO())
+        hot_user = User.objects.get(inn=LIST_OF_INN[0])
+
+        sender.transfer_money(LIST_OF_INN[:3], Decimal('3.00'))
+        sender.transfer_money(LIST_OF_INN[:1], Decimal('2.00'))
+
+        # Credits go to slots, bill row is untouched
+        self.assertEqual(User.objects.get(pk=hot_user.pk).bill, Decimal('0.00'))
+        self.assertEqual(BillSlot.objects.filter(user=hot_user).aggregate(total=Sum('amount'))['total'], Decimal('3.00'))
+        self.assertEqual(User.objects.get(pk=hot_user.pk).total_bill, Decimal('3.00'))
+        users = User.objects.filter(inn__in=LIST_OF_INN[:2]).order_by('inn')
+        self.assertListEqual(
+            ['3.00', '1.00'],
+            [user['bill'] for user in UserSerializer(users, many=True).data]
+        )
+
+        # Debit folds slots into bill when bill alone is not enough
+        hot_user.transfer_money([USER_INN], Decimal('2.50'))
+        self.assertEqual(User.objects.get(pk=hot_user.pk).bill, Decimal('0.50'))
+        self.assertFalse(BillSlot.objects.filter(user=hot_user).exclude(amount=0).exists())
+        with self.assertRaises(NotEnoughMoneyError):
+            hot_user.transfer_money([USER_INN], Decimal('1.00'))
+
+        sender.transfer_money(LIST_OF_INN[:1], Decimal('1.00'))
+        call_command('compact_bill_slots', once=True, stdout=StringIO())
+        self.assertEqual(User.objects.get(pk=hot_user.pk).bill, Decimal('1.50'))
+        self.assertEqual(User.rebuild_bills(0, sender.pk, dry_run=True), 0)
+
+        call_command('hot_account', LIST_OF_INN[0], 0, stdout=StringIO())
+        self.assertFalse(BillSlot.objects.filter(user=hot_user).exists())
+        self.assertEqual(User.objects.get(pk=hot_user.pk).bill_slots, 0)
@@ -0,0 +1,110 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import Group, Permission
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, connection
+from django.test import TransactionTestCase, override_settings
+from model_bakery import baker
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APITestCase
+
+from apps.metrics.registry import registry, render
+from apps.users.models import RateLimitBucket
+from apps.users.throttling import parse_rate, take_token
+from apps.users.tests.mock_data import USER_INN, LIST_OF_INN
+from utils.db.retry import is_retryable
+
+User = get_user_model()
+
+
+@override_settings(MONEY_TRANSFER_RATE='2/min', MONEY_TRANSFER_GROUP_RATES={'vip': '3/min'})
+class MoneyTransferThrottle(APITestCase):
+
+    def setUp(self) -> None:
+
+        cache.clear()
+        registry.clear()
+        self.users = [baker.make(User, inn=inn) for inn in (USER_INN, *LIST_OF_INN[:2])]
+        permission = Permission.objects.get(codename='can_money_transfer')
+        for user in self.users:
+            user.user_permissions.add(permission)
+
+    def transfer(self, user: User):
+        self.client.force_authenticate(user=user)
+        return self.client.post(
+            reverse('user-money-transfer', args=(user.pk, )),
+            {'amount': 100, 'list_of_inn': [LIST_OF_INN[2]]},
+            format='json',
+        )
+
+    def test_user_rate(self):
+        user, vip, _ = self.users
+        vip.groups.add(Group.objects.create(name='vip'))
+
+        self.assertListEqual(
+            [status.HTTP_400_BAD_REQUEST] * 2 + [status.HTTP_429_TOO_MANY_REQUESTS] * 2,
+            [self.transfer(user).status_code for _ in range(4)],
+        )
+        response = self.transfer(user)
+        self.assertIn(int(response['Retry-After']), range(29, 31))
+
+        # Other actions are not limited
+        response = self.client.get(reverse('user-money-transfer-status', args=(0, )))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.assertListEqual(
+            [status.HTTP_400_BAD_REQUEST] * 3 + [status.HTTP_429_TOO_MANY_REQUESTS],
+            [self.transfer(vip).status_code for _ in range(4)],
+        )
+
+        content = render(registry.collect())
+        self.assertIn('money_transfer_shed_total{action="money_transfer",bucket="user"} 4', content)
+        self.assertIn('money_transfer_admitted_total{action="money_transfer"} 5', content)
+
+    @override_settings(MONEY_TRANSFER_GLOBAL_RATE='3/hour')
+    def test_global_rate(self):
+        first, second, third = self.users
+
+        self.assertListEqual(
+            [status.HTTP_400_BAD_REQUEST, status.HTTP_400_BAD_REQUEST, status.HTTP_400_BAD_REQUEST,
+             status.HTTP_429_TOO_MANY_REQUESTS],
+            [self.transfer(user).status_code for user in (first, first, second, third)],
+        )
+        self.assertIn(int(self.transfer(second)['Retry-After']), range(1199, 1201))
+        # Token of the user bucket is returned when the global one rejects the request
+        self.assertEqual(RateLimitBucket.objects.get(key=f'money_transfer:user:{third.pk}').tokens, 2)
+        self.assertIn('money_transfer_shed_total{action="money_transfer",bucket="global"} 2',
+                      render(registry.collect()))
+
+
+class TokenBucket(TransactionTestCase):
+    """
+    Workers take tokens by their own connections, so the bucket must be committed
+    """
+
+    def test_concurrent_workers(self):
+        rate = parse_rate('10/day')
+
+        def take() -> float:
+            # SQLite test database is shared in-memory, where a concurrent write fails at once instead of waiting
+            while True:
+                try:
+                    return take_token('test', rate)
+                except OperationalError as e:
+                    if not is_retryable(e):
+                        raise
+
+        def worker(_) -> int:
+            try:
+                return sum(not take() for _ in range(5))
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(8) as executor:
+            admitted = sum(executor.map(worker, range(8)))
+
+        self.assertEqual(admitted, 10)
+        self.assertLess(RateLimitBucket.objects.get(key='test').tokens, 1)
+        self.assertGreater(take_token('test', rate), 8000)
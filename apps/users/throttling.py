@@ -0,0 +1,153 @@
+"""
+Admission control of money transfers by token buckets shared by all gunicorn workers.
+
+Transfers wait for row locks in the database, so a flood of them would block every sync worker and starve reads.
+Each user has a bucket (rate by MONEY_TRANSFER_RATE or MONEY_TRANSFER_GROUP_RATES of user groups) and all users
+share the global one (MONEY_TRANSFER_GLOBAL_RATE). Buckets are rows of RateLimitBucket, a token is taken
+by one upsert in autocommit, so a rejected request costs one short statement and fails with 429 and Retry-After.
+Time of buckets is the clock of the database, clocks of app hosts may differ.
+"""
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db import connections, router
+from rest_framework.throttling import BaseThrottle
+
+from apps.metrics.registry import registry
+from apps.users.models import RateLimitBucket
+from apps.users.permissions import get_cached_groups
+
+# Seconds in period of rate, same format as DRF throttle rates: "10/s", "100/min", "1000/hour", "10000/day"
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+
+# (capacity, tokens per second)
+Rate = Tuple[int, float]
+
+
+def parse_rate(rate: str) -> Optional[Rate]:
+    """
+    Rate "N/period" as bucket of N tokens refilled in period, None if rate is empty
+    """
+    if not rate:
+        return None
+
+    number, period = rate.split('/')
+    capacity = int(number)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+def get_now_sql(connection) -> str:
+    """
+    Seconds since epoch by the database clock, the same for all app hosts
+    """
+    if connection.vendor == 'postgresql':
+        return 'extract(epoch from clock_timestamp())'
+
+    return "(julianday('now') - 2440587.5) * 86400.0"
+
+
+def take_token(key: str, rate: Rate) -> float:
+    """
+    Take a token from the bucket, returns 0 if it is taken or seconds until the next token otherwise.
+    Bucket is refilled by the time passed since the last taken token, up to its capacity
+    """
+    capacity, per_second = rate
+    connection = connections[router.db_for_write(RateLimitBucket)]
+    table = connection.ops.quote_name(RateLimitBucket._meta.db_table)
+    key_column = connection.ops.quote_name('key')
+    now = get_now_sql(connection)
+    refilled = f'{table}.tokens + (excluded.updated_at - {table}.updated_at) * %s'
+    tokens = f'CASE WHEN {refilled} > %s THEN %s ELSE {refilled} END'
+    tokens_params = [per_second, capacity, capacity, per_second]
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({key_column}, tokens, updated_at) VALUES (%s, %s, {now}) '
+            f'ON CONFLICT ({key_column}) DO UPDATE SET tokens = {tokens} - 1, updated_at = excluded.updated_at '
+            f'WHERE {tokens} >= 1 '
+            f'RETURNING tokens',
+            [key, capacity - 1, *tokens_params, *tokens_params],
+        )
+        if cursor.fetchone() is not None:
+            return 0
+
+        cursor.execute(
+            f'SELECT tokens + ({now} - updated_at) * %s FROM {table} WHERE {key_column} = %s', [per_second, key],
+        )
+        row = cursor.fetchone()
+
+    # Bucket may be deleted meanwhile, then the next request gets a full one
+    tokens_left = min(capacity, row[0]) if row else 1
+    return max((1 - tokens_left) / per_second, 0)
+
+
+def refund_token(key: str, rate: Rate):
+    """
+    Return a token taken for a request which was rejected by another bucket
+    """
+    capacity, _ = rate
+    connection = connections[router.db_for_write(RateLimitBucket)]
+    table = connection.ops.quote_name(RateLimitBucket._meta.db_table)
+    key_column = connection.ops.quote_name('key')
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET tokens = CASE WHEN tokens + 1 > %s THEN %s ELSE tokens + 1 END '
+            f'WHERE {key_column} = %s',
+            [capacity, capacity, key],
+        )
+
+
+def get_user_rate(user) -> Optional[Rate]:
+    """
+    The highest rate of user groups in MONEY_TRANSFER_GROUP_RATES, MONEY_TRANSFER_RATE if there are none
+    """
+    rates = [
+        parse_rate(settings.MONEY_TRANSFER_GROUP_RATES[group])
+        for group in (get_cached_groups(user) if settings.MONEY_TRANSFER_GROUP_RATES else ())
+        if group in settings.MONEY_TRANSFER_GROUP_RATES
+    ]
+    if rates:
+        return max(rates, key=lambda rate: rate[1])
+
+    return parse_rate(settings.MONEY_TRANSFER_RATE)
+
+
+class MoneyTransferThrottle(BaseThrottle):
+    """
+    Take a token of the user bucket and then of the global one for each transfer request,
+    other actions are not limited. Rejections are counted by `money_transfer_shed_total` metric
+    """
+    actions = ('money_transfer', 'money_transfer_fanout', 'money_transfer_batch')
+
+    def __init__(self):
+        self.retry_after = None
+
+    def get_buckets(self, request) -> List[Tuple[str, str, Rate]]:
+        buckets = [
+            ('user', f'money_transfer:user:{request.user.pk}', get_user_rate(request.user)),
+            ('global', 'money_transfer:global', parse_rate(settings.MONEY_TRANSFER_GLOBAL_RATE)),
+        ]
+        return [bucket for bucket in buckets if bucket[2] is not None]
+
+    def allow_request(self, request, view) -> bool:
+        if view.action not in self.actions:
+            return True
+
+        # User bucket goes first, so a flooding user does not drain tokens of the others.
+        # Tokens taken from the previous buckets are returned, so a rejected request costs the user nothing
+        taken = []
+        for name, key, rate in self.get_buckets(request):
+            self.retry_after = take_token(key, rate)
+            if self.retry_after:
+                for taken_key, taken_rate in taken:
+                    refund_token(taken_key, taken_rate)
+                registry.inc('money_transfer_shed_total', {'action': view.action, 'bucket': name})
+                return False
+            taken.append((key, rate))
+
+        registry.inc('money_transfer_admitted_total', {'action': view.action})
+        return True
+
+    def wait(self) -> Optional[float]:
+        return self.retry_after
@@ -1,11 +1,59 @@
+import hashlib
+from typing import Tuple
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from drf_spectacular.utils import extend_schema_view, extend_schema, inline_serializer
+from django.core.exceptions import ImproperlyConfigured
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.db.models.functions import Upper
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_view, extend_schema, inline_serializer, OpenApiParameter
+from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ParseError, ValidationError
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
+from apps.users.models import MoneyTransfer, LedgerEntry
+from apps.users.idempotency import idempotent, IDEMPOTENCY_KEY_HEADER
+from apps.users.encoders import (
+    EncodedJSONResponse,
+    get_user_values,
+    encode_user,
+    encode_users,
+    escape_line_separators,
+    can_encode_fast,
+)
+from apps.users.response_cache import cached_response
+from apps.users.stamps import USERS_VERSION_KEY, get_user_version_keys
+from apps.users.export import EXPORT_FORMATS, EXPORT_CONTENT_TYPES, get_export_rows, iter_export
+from apps.users.fanout import FANOUT_CONTENT_TYPES, iter_fanout_inns, transfer_money_fanout
+from apps.users.exceptions import (
+    TransferError,
+    NotEnoughMoneyError,
+    RecipientsNotFoundError,
+    DuplicateRecipientsError,
+    AmountTooSmallError,
+)
+from apps.users.pagination import UserPagination, LedgerCursorPagination
 from apps.users.permissions import UserViewSetPermission
-from apps.users.serializers import serializers, UserSerializer, MoneyTransferSerializer
+from apps.users.throttling import MoneyTransferThrottle
+from apps.users.serializers import (
+    serializers,
+    UserSerializer,
+    UserLookupSerializer,
+    MoneyTransferSerializer,
+    MoneyTransferFanoutSerializer,
+    MoneyTransferStatusSerializer,
+    LedgerEntrySerializer,
+    MoneyTransferBatchSerializer,
+    MoneyTransferBatchItemSerializer,
+)
+from utils.db.routers import primary_pinned, use_primary, pin_user_to_primary, is_user_pinned_to_primary
 
 User = get_user_model()
 
@@ -13,38 +61,312 @@ User = get_user_model()
 @extend_schema_view(
     list=extend_schema(
         summary='Get all users',
-        description='Get all users with pagination',
+        description='Get all users with pagination (pass pagination=cursor for keyset pagination without count)',
     ),
     retrieve=extend_schema(
         summary='Get user by ID',
         description='Get user by ID',
     ),
+    export=extend_schema(
+        parameters=[
+            OpenApiParameter('export_format', enum=EXPORT_FORMATS, default=EXPORT_FORMATS[0]),
+        ],
+        responses={
+            (status.HTTP_200_OK, content_type): OpenApiTypes.STR for content_type in EXPORT_CONTENT_TYPES.values()
+        },
+        summary='Export all users',
+        description='Stream all users as NDJSON (object per line) or CSV with the same fields as list, '
+                    'without pagination',
+    ),
+    lookup=extend_schema(
+        parameters=[
+            OpenApiParameter('q', required=True, description='Prefix of INN (digits) or username'),
+            OpenApiParameter('limit', int, description='Number of matches, up to 50'),
+        ],
+        responses=UserLookupSerializer(many=True),
+        summary='Find users by prefix',
+        description='Get top matches by INN prefix (if q is digits) or case-insensitive username prefix, '
+                    'for typeahead. Supports If-None-Match with ETag of the previous response',
+    ),
+    ledger=extend_schema(
+        responses=LedgerEntrySerializer(many=True),
+        summary='Get user ledger',
+        description='Get history of user bill changes, newest first, with cursor pagination',
+    ),
     money_transfer=extend_schema(
         request=MoneyTransferSerializer,
-        responses=inline_serializer('MoneyTransferSuccessResponseSerializer', {'message': serializers.CharField()}),
+        parameters=[
+            OpenApiParameter(
+                IDEMPOTENCY_KEY_HEADER,
+                location=OpenApiParameter.HEADER,
+                description='Unique key of the transfer, retries with the same key replay the first response',
+            ),
+        ],
+        responses={
+            status.HTTP_200_OK: inline_serializer(
+                'MoneyTransferSuccessResponseSerializer', {'message': serializers.CharField()}
+            ),
+            status.HTTP_202_ACCEPTED: MoneyTransferStatusSerializer,
+        },
         summary='Transfer money',
-        description='Transfer money each user by INN list (each INN must be uniq and belong to user in DB)',
-    )
+        description='Transfer money each user by INN list (each INN must be uniq and belong to user in DB). '
+                    'With `Prefer: respond-async` header (or MONEY_TRANSFER_ASYNC setting) transfer is queued '
+                    'and 202 is returned, see money_transfer_status. '
+                    'Retries with the same Idempotency-Key header are not applied again',
+    ),
+    money_transfer_fanout=extend_schema(
+        request={content_type: OpenApiTypes.STR for content_type in FANOUT_CONTENT_TYPES},
+        parameters=[
+            OpenApiParameter('amount', OpenApiTypes.DECIMAL, required=True, description='Total amount'),
+        ],
+        responses=inline_serializer('MoneyTransferFanoutResponseSerializer', {
+            'message': serializers.CharField(),
+            'recipients': serializers.IntegerField(),
+        }),
+        summary='Transfer money to many users',
+        description='Transfer money to thousands of users in equal parts, body is INN per line. '
+                    'INNs are streamed to DB without parsing the whole body, all missing (`missing`) '
+                    'or repeated (`duplicates`) INNs are returned on error',
+    ),
+    money_transfer_status=extend_schema(
+        responses=MoneyTransferStatusSerializer,
+        summary='Get queued money transfer',
+        description='Get status of money transfer queued in async mode',
+    ),
+    money_transfer_batch=extend_schema(
+        request=inline_serializer('MoneyTransferBatchRequestSerializer', {
+            'transfers': MoneyTransferBatchItemSerializer(many=True),
+        }),
+        responses=inline_serializer('MoneyTransferBatchResponseSerializer', {
+            'results': inline_serializer('MoneyTransferBatchResultSerializer', {
+                'status': serializers.ChoiceField(choices=['ok', 'error']),
+                'errors': serializers.DictField(required=False),
+            }, many=True),
+        }),
+        summary='Transfer money in batch',
+        description='Apply many transfers at once. Each transfer is validated and applied on its own, '
+                    'results are returned in the same order',
+    ),
 )
 class UserViewSet(ReadOnlyModelViewSet):
 
-    queryset = User.objects.only('id', 'inn', 'first_name', 'last_name', 'username', 'bill').order_by('-id')
+    queryset = User.objects.only(
+        'id', 'inn', 'first_name', 'last_name', 'username', 'bill', 'bill_slots'
+    ).order_by('-id')
     serializer_class = UserSerializer
+    pagination_class = UserPagination
     permission_classes = (UserViewSetPermission, )
+    throttle_classes = (MoneyTransferThrottle, )
+    # list and retrieve encode values() rows to JSON directly, output is the same as of UserSerializer
+    fast_serialization = True
+    lookup_limit = 10
+    lookup_max_limit = 50
+
+    def dispatch(self, request, *args, **kwargs):
+        # Pin set by initial() must not leak to the next request of the thread
+        with use_primary(False):
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.user.is_authenticated and is_user_pinned_to_primary(request.user.pk):
+            primary_pinned.set(True)
+
+    def list(self, request, *args, **kwargs):
+        if not self.can_serialize_fast(request):
+            return super().list(request, *args, **kwargs)
+
+        if settings.RESPONSE_CACHE_TIMEOUT:
+            return cached_response(request, 'list', (USERS_VERSION_KEY, ), lambda: (self.encode_list(request), None))
+
+        return EncodedJSONResponse(self.encode_list(request))
+
+    def encode_list(self, request) -> bytes:
+        rows = get_user_values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return escape_line_separators(encode_users(rows))
+
+        # Envelope is rendered with empty results which are the last key, then encoded page is put in their place
+        envelope = request.accepted_renderer.render(
+            self.get_paginated_response([]).data,
+            request.accepted_media_type,
+            self.get_renderer_context(),
+        )
+        if not envelope.endswith(b'[]}'):
+            raise ImproperlyConfigured('Results must be the last key of paginated response for fast serialization')
+
+        return envelope[:-3] + escape_line_separators(encode_users(page)) + b'}'
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.can_serialize_fast(request):
+            return super().retrieve(request, *args, **kwargs)
+
+        if settings.RESPONSE_CACHE_TIMEOUT:
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            version_keys = get_user_version_keys(user_id=self.kwargs[lookup_url_kwarg])
+            return cached_response(request, 'retrieve', version_keys, lambda: self.encode_retrieve(request))
+
+        return EncodedJSONResponse(self.encode_retrieve(request)[0])
+
+    def encode_retrieve(self, request) -> Tuple[bytes, str]:
+        """
+        Encoded user and its INN
+        """
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            get_user_values(self.filter_queryset(self.get_queryset())),
+            **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        self.check_object_permissions(request, row)
+        return escape_line_separators(encode_user(row)), row['inn']
+
+    def can_serialize_fast(self, request) -> bool:
+        return self.fast_serialization and can_encode_fast(
+            request.accepted_renderer,
+            request.accepted_media_type,
+            self.get_renderer_context(),
+        )
+
+    @action(detail=False)
+    def export(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', EXPORT_FORMATS[0])
+        if export_format not in EXPORT_FORMATS:
+            raise ParseError(f'export_format must be one of: {", ".join(EXPORT_FORMATS)}')
+
+        rows = get_export_rows(self.filter_queryset(self.get_queryset()))
+        response = StreamingHttpResponse(
+            iter_export(rows, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+        )
+        response['Content-Disposition'] = f'attachment; filename="users.{export_format}"'
+        return response
+
+    @action(detail=False, pagination_class=None)
+    def lookup(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            raise ParseError('q is required')
+
+        try:
+            limit = min(int(request.query_params.get('limit', self.lookup_limit)), self.lookup_max_limit)
+        except ValueError:
+            raise ParseError('limit must be integer')
+
+        # Prefix filter with ordering by the same expression is a range scan of prefix index stopped after limit rows
+        if query.isdigit():
+            users = User.objects.filter(inn__startswith=query).order_by('inn')
+        else:
+            users = User.objects.filter(username__istartswith=query).order_by(Upper('username'))
+
+        data = UserLookupSerializer(instance=users.only('id', 'username', 'inn')[:max(limit, 1)], many=True).data
+        etag = quote_etag(hashlib.md5(repr(data).encode()).hexdigest())
+
+        response = get_conditional_response(request, etag=etag) or Response(data)
+        response['ETag'] = etag
+        return response
+
+    @action(detail=True, pagination_class=LedgerCursorPagination)
+    def ledger(self, request, *args, **kwargs):
+        user = self.get_object()
+
+        page = self.paginate_queryset(LedgerEntry.objects.filter(user_id=user.pk))
+        return self.get_paginated_response(LedgerEntrySerializer(instance=page, many=True).data)
 
     @action(detail=True, methods=['POST'])
+    @idempotent
     def money_transfer(self, request, *args, **kwargs):
         user = self.get_object()
 
-        serializer = MoneyTransferSerializer(
-            data=request.data,
-            context={'user': request.user},
-        )
+        serializer = MoneyTransferSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
 
-        user.transfer_money(
-            serializer.validated_data['list_of_inn'],
-            serializer.validated_data['amount'],
-        )
+        if self.is_async_request(request):
+            money_transfer = MoneyTransfer.objects.create(sender=user, **serializer.validated_data)
+            pin_user_to_primary(request.user.pk)
+            return Response(
+                MoneyTransferStatusSerializer(instance=money_transfer).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={
+                    'Location': reverse('user-money-transfer-status', args=(money_transfer.pk, ), request=request),
+                },
+            )
 
+        try:
+            user.transfer_money(
+                serializer.validated_data['list_of_inn'],
+                serializer.validated_data['amount'],
+                getattr(request, 'idempotency_operation', None),
+            )
+        except NotEnoughMoneyError as e:
+            raise ParseError(e.message)
+        except RecipientsNotFoundError as e:
+            raise ValidationError({'list_of_inn': [e.message]})
+
+        pin_user_to_primary(request.user.pk)
         return Response({'message': 'All done'})
+
+    @action(detail=True, methods=['POST'])
+    def money_transfer_fanout(self, request, *args, **kwargs):
+        user = self.get_object()
+
+        serializer = MoneyTransferFanoutSerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+
+        # Body is read line by line, request.data would load and parse it at once
+        try:
+            recipients = transfer_money_fanout(
+                user,
+                iter_fanout_inns(request.stream or ()),
+                serializer.validated_data['amount'],
+            )
+        except (NotEnoughMoneyError, AmountTooSmallError) as e:
+            raise ParseError(e.message)
+        except RecipientsNotFoundError as e:
+            raise ValidationError({'list_of_inn': [e.message], 'missing': e.missing})
+        except DuplicateRecipientsError as e:
+            raise ValidationError({'list_of_inn': [e.message], 'duplicates': e.duplicates})
+
+        pin_user_to_primary(request.user.pk)
+        return Response({'message': 'All done', 'recipients': recipients})
+
+    @action(detail=False, url_path=r'money_transfer/(?P<transfer_id>\d+)')
+    def money_transfer_status(self, request, transfer_id, *args, **kwargs):
+        money_transfer = get_object_or_404(MoneyTransfer, pk=transfer_id)
+        return Response(MoneyTransferStatusSerializer(instance=money_transfer).data)
+
+    @staticmethod
+    def is_async_request(request) -> bool:
+        return settings.MONEY_TRANSFER_ASYNC or 'respond-async' in request.headers.get('Prefer', '')
+
+    @action(detail=False, methods=['POST'])
+    def money_transfer_batch(self, request, *args, **kwargs):
+        serializer = MoneyTransferBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        items = serializer.get_items()
+        transfer_errors = iter(User.transfer_money_batch([
+            (item.validated_data['user'], item.validated_data['list_of_inn'], item.validated_data['amount'])
+            for item in items if not item.errors
+        ]))
+
+        results = []
+        for item in items:
+            errors = item.errors or get_transfer_error_detail(next(transfer_errors))
+            results.append({'status': 'error', 'errors': errors} if errors else {'status': 'ok'})
+
+        pin_user_to_primary(request.user.pk)
+        return Response({'results': results})
+
+
+def get_transfer_error_detail(error: TransferError = None) -> dict:
+    """
+    Help function to represent transfer error the same way as money_transfer responds
+    """
+    if error is None:
+        return {}
+
+    if isinstance(error, RecipientsNotFoundError):
+        return {'list_of_inn': [error.message]}
+
+    return {'detail': error.message}
@@ -0,0 +1,144 @@
+"""
+Compare sync and async user views under ASGI when requests are lock-bound.
+
+    python -m benchmarks.asgi --blocked 4 --requests 200 --hold 2
+
+A transaction holds the row lock of a sender for `--hold` seconds while `--blocked` money transfers
+from that sender wait for it and `--requests` list requests are sent concurrently, all to one ASGI application.
+Sync views run in the single thread of the handler, so list requests queue behind the blocked transfers;
+async views run in the ASYNC_DB_THREADS pool and keep serving them.
+
+Needs PostgreSQL: SQLite ignores select_for_update, so transfers are not blocked.
+"""
+import json
+import time
+import asyncio
+import argparse
+import threading
+from decimal import Decimal
+
+from benchmarks.utils import setup_django, benchmark_database, summarize
+from benchmarks.data import create_users, make_inn
+
+
+async def send_request(application, method: str, path: str, token: str, body: bytes = b'') -> int:
+    """
+    Call ASGI application in-process, returns response status
+    """
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': b'',
+        'root_path': '',
+        'server': ('testserver', 80),
+        'client': ('127.0.0.1', 0),
+        'headers': [
+            (b'host', b'testserver'),
+            (b'authorization', f'Bearer {token}'.encode()),
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+        ],
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status = None
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        nonlocal status
+        if message['type'] == 'http.response.start':
+            status = message['status']
+
+    await application(scope, receive, send)
+    return status
+
+
+def hold_lock(user_id: int, hold: float, locked: threading.Event):
+    from django.db import connection, transaction
+    from django.contrib.auth import get_user_model
+
+    try:
+        with transaction.atomic():
+            get_user_model().objects.select_for_update().get(pk=user_id)
+            locked.set()
+            time.sleep(hold)
+    finally:
+        connection.close()
+
+
+async def run_mode(application, sender_id: int, token: str, blocked: int, requests: int, hold: float) -> dict:
+    from rest_framework.reverse import reverse
+
+    list_url = reverse('user-list')
+    transfer_url = reverse('user-money-transfer', args=(sender_id, ))
+    transfer_body = json.dumps({'amount': '0.01', 'list_of_inn': [make_inn(0)]}).encode()
+
+    locked = threading.Event()
+    locker = threading.Thread(target=hold_lock, args=(sender_id, hold, locked))
+    locker.start()
+    locked.wait()
+
+    async def timed_list() -> float:
+        started = time.perf_counter()
+        await send_request(application, 'GET', list_url, token)
+        return (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    transfers = [
+        asyncio.ensure_future(send_request(application, 'POST', transfer_url, token, transfer_body))
+        for _ in range(blocked)
+    ]
+    # Let transfers reach the lock first
+    await asyncio.sleep(0.1)
+    latencies = await asyncio.gather(*(timed_list() for _ in range(requests)))
+    lists_elapsed = time.perf_counter() - started
+    statuses = await asyncio.gather(*transfers)
+    locker.join()
+
+    return {
+        'list_latency_ms': summarize(latencies),
+        'list_requests_per_sec': requests / lists_elapsed,
+        'transfer_statuses': statuses,
+    }
+
+
+def run(blocked: int, requests: int, hold: float, users: int) -> dict:
+    from django.core.handlers.asgi import ASGIHandler
+    from django.contrib.auth import get_user_model
+    from rest_framework_simplejwt.tokens import AccessToken
+    from test_project.asgi import AsyncURLConfASGIHandler
+
+    create_users(users)
+    sender = get_user_model().objects.create_superuser(
+        username='benchmark', inn=make_inn(users), bill=Decimal('99999999.00')
+    )
+    token = str(AccessToken.for_user(sender))
+
+    results = {}
+    for mode, application in (('sync', ASGIHandler()), ('async', AsyncURLConfASGIHandler())):
+        results[mode] = asyncio.run(run_mode(application, sender.pk, token, blocked, requests, hold))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--blocked', type=int, default=4, help='Transfers waiting for the lock')
+    parser.add_argument('--requests', type=int, default=200, help='List requests sent meanwhile')
+    parser.add_argument('--hold', type=float, default=2.0, help='Seconds the lock is held')
+    parser.add_argument('--users', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(json.dumps(run(args.blocked, args.requests, args.hold, args.users), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare requests per second of UserViewSet.retrieve with stock JWTAuthentication and CachedJWTAuthentication.
+
+    python -m benchmarks.authentication --requests 2000
+
+Requests carry a real JWT access token of a user with view_user permission.
+"""
+import json
+import time
+import argparse
+
+from benchmarks.utils import setup_django, benchmark_database
+from benchmarks.data import make_inn
+
+
+def run(requests: int) -> dict:
+    from django.core.cache import cache
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Permission
+    from rest_framework.reverse import reverse
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    from apps.users.authentication import CachedJWTAuthentication
+    from apps.users.views import UserViewSet
+
+    User = get_user_model()
+
+    user = User.objects.create_user(username='benchmark', inn=make_inn(0))
+    user.user_permissions.add(Permission.objects.get(codename='view_user'))
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}')
+    url = reverse('user-detail', args=(user.pk, ))
+
+    results = {}
+    for authentication_class in (JWTAuthentication, CachedJWTAuthentication):
+        cache.clear()
+        UserViewSet.authentication_classes = (authentication_class, )
+
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(url)
+            assert response.status_code == 200, response.content
+        results[authentication_class.__name__] = requests / (time.perf_counter() - started)
+
+    results['speedup'] = results['CachedJWTAuthentication'] / results['JWTAuthentication']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(json.dumps(run(args.requests), indent=2))
+
+
+if __name__ == '__main__':
+    main()
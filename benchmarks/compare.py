@@ -0,0 +1,59 @@
+"""
+Compare two results of benchmarks.suite, e.g. of the base commit and of a branch.
+
+    python -m benchmarks.compare base.json results.json --threshold 10
+
+Prints change of p50/p95 latency, query count and throughput, exits with 1 if something is slower than threshold %.
+"""
+import sys
+import json
+import argparse
+
+
+def compare(base: dict, new: dict, threshold: float) -> bool:
+    regressed = False
+    for size, endpoints in new['results'].items():
+        for name, result in endpoints.items():
+            old = base['results'].get(size, {}).get(name)
+            if old is None:
+                continue
+
+            changes = []
+            for percentile in ('p50', 'p95'):
+                before, after = old['latency_ms'][percentile], result['latency_ms'][percentile]
+                change = (after - before) / before * 100
+                regressed |= change > threshold
+                changes.append(f'{percentile} {before:.2f} -> {after:.2f} ms ({change:+.0f}%)')
+
+            if result['queries'] != old['queries']:
+                regressed |= result['queries'] > old['queries']
+                changes.append(f'queries {old["queries"]} -> {result["queries"]}')
+
+            old_throughput = {item['concurrency']: item['requests_per_sec'] for item in old['throughput']}
+            for item in result['throughput']:
+                before = old_throughput.get(item['concurrency'])
+                if before:
+                    change = (item['requests_per_sec'] - before) / before * 100
+                    regressed |= change < -threshold
+                    changes.append(f'x{item["concurrency"]} {before:.0f} -> {item["requests_per_sec"]:.0f} rps ({change:+.0f}%)')
+
+            print(f'{size:>9} {name:<15} ' + ', '.join(changes))
+
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('base')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Allowed slowdown in %')
+    args = parser.parse_args()
+
+    with open(args.base) as base_file, open(args.new) as new_file:
+        regressed = compare(json.load(base_file), json.load(new_file), args.threshold)
+
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+import io
+import csv
+from decimal import Decimal
+from typing import Iterator
+
+from utils.validators import INNValidator
+
+inn_validator = INNValidator()
+
+
+def make_inn(number: int) -> str:
+    """
+    Build a valid INN: number is used as the first 10 digits, control digits are calculated
+    """
+    inn = f'{number:010d}'
+    inn += inn_validator.check_control_sum(inn)
+    return inn + inn_validator.check_control_sum(inn)
+
+
+def iter_inns(count: int, start: int = 0) -> Iterator[str]:
+    for number in range(start, start + count):
+        yield make_inn(number)
+
+
+def create_users(count: int, bill: Decimal = Decimal('100.00'), batch_size: int = 10000, start: int = 0) -> None:
+    """
+    Help function to fill users table quickly: users are user{number} with INN make_inn(number),
+    number from start to start + count, so the dataset is the same on every run.
+    PostgreSQL is filled by COPY, other databases by bulk_create
+    """
+    from django.db import connection
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+
+    if connection.vendor == 'postgresql':
+        copy_users(count, bill, batch_size, start)
+        return
+
+    batch = []
+    for number, inn in enumerate(iter_inns(count, start), start=start):
+        batch.append(User(username=f'user{number}', inn=inn, bill=bill, password='!'))
+        if len(batch) == batch_size:
+            User.objects.bulk_create(batch)
+            batch = []
+
+    User.objects.bulk_create(batch)
+
+
+def copy_users(count: int, bill: Decimal, batch_size: int, start: int) -> None:
+    from django.db import connection
+    from django.contrib.auth import get_user_model
+    from django.utils import timezone
+
+    User = get_user_model()
+    now = timezone.now().isoformat()
+    inn_field = User._meta.get_field('inn')
+
+    with connection.cursor() as cursor:
+        for batch_start in range(start, start + count, batch_size):
+            batch_count = min(batch_size, start + count - batch_start)
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(
+                ('!', 'f', f'user{number}', '', '', '', 'f', 't', now, inn_field.get_prep_value(inn), bill, 0)
+                for number, inn in enumerate(iter_inns(batch_count, batch_start), start=batch_start)
+            )
+            buffer.seek(0)
+            cursor.copy_expert(
+                f'COPY {User._meta.db_table} (password, is_superuser, username, first_name, last_name, email, '
+                f'is_staff, is_active, date_joined, inn, bill, bill_slots) '
+                f'FROM STDIN WITH (FORMAT csv, FORCE_NOT_NULL (first_name, last_name, email))',
+                buffer,
+            )
+
+        cursor.execute(f'ANALYZE {User._meta.db_table}')
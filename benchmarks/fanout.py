@@ -0,0 +1,86 @@
+"""
+Compare money_transfer (JSON list of INN) with money_transfer_fanout (INN per line streamed to a temporary table)
+by number of recipients.
+
+    python -m benchmarks.fanout --recipients 10 1000 100000
+
+money_transfer is skipped above --max-list recipients, where IN lists get too slow to wait for.
+Requests are authenticated with a real JWT access token, so auth cost is included.
+"""
+import json
+import argparse
+from decimal import Decimal
+from typing import List
+
+from benchmarks.utils import setup_django, benchmark_database, measure, count_queries
+from benchmarks.data import create_users, iter_inns, make_inn
+
+
+def run(recipients: List[int], repeat: int, max_list: int) -> dict:
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Permission
+    from rest_framework.reverse import reverse
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    User = get_user_model()
+
+    results = {}
+    created = 0
+    for count in sorted(recipients):
+        create_users(count - created, bill=Decimal('0.00'), start=created)
+        created = count
+
+        sender = User.objects.create_user(username=f'benchmark{count}', inn=make_inn(10 ** 9 + count),
+                                          bill=Decimal('99999999.00'))
+        sender.user_permissions.add(Permission.objects.get(codename='can_money_transfer'))
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(sender)}')
+
+        list_of_inn = list(iter_inns(count))
+        amount = str(Decimal('0.01') * count)
+        body = '\n'.join(list_of_inn)
+
+        fanout_url = reverse('user-money-transfer-fanout', args=(sender.pk, )) + f'?amount={amount}'
+
+        def fanout():
+            response = client.post(fanout_url, body, content_type='text/plain')
+            assert response.status_code == 200, response.content
+
+        results[count] = {
+            'fanout': {'queries': count_queries(fanout), 'latency_ms': measure(fanout, repeat, warmup=1)},
+        }
+
+        if count > max_list:
+            continue
+
+        url = reverse('user-money-transfer', args=(sender.pk, ))
+        transfer = {'amount': amount, 'list_of_inn': list_of_inn}
+
+        def money_transfer():
+            response = client.post(url, transfer, format='json')
+            assert response.status_code == 200, response.content
+
+        results[count]['money_transfer'] = {
+            'queries': count_queries(money_transfer),
+            'latency_ms': measure(money_transfer, repeat, warmup=1),
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipients', type=int, nargs='+', default=[10, 1000, 100000])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--max-list', type=int, default=100000)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(json.dumps(run(args.recipients, args.repeat, args.max_list), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Measure transfers per second to one hot INN depending on the number of workers,
+with plain bill and with bill split into slots.
+
+    python -m benchmarks.hot_account --workers 1 2 4 8 --slots 16 --duration 5
+
+Needs PostgreSQL: SQLite locks the whole database on write, so workers never run in parallel.
+Each worker transfers from its own sender, so only the recipient row (or its slots) is contended.
+"""
+import json
+import time
+import argparse
+import multiprocessing
+from decimal import Decimal
+from typing import List
+
+from benchmarks.utils import setup_django, benchmark_database
+from benchmarks.data import create_users, make_inn
+
+
+def transfer_worker(args) -> int:
+    sender_id, hot_inn, duration = args
+    from django.contrib.auth import get_user_model
+
+    sender = get_user_model().objects.get(pk=sender_id)
+    transfers = 0
+    finish = time.perf_counter() + duration
+    while time.perf_counter() < finish:
+        sender.transfer_money([hot_inn], Decimal('0.01'))
+        transfers += 1
+
+    return transfers
+
+
+def run(workers: List[int], slots: int, duration: float) -> dict:
+    from django.db import connections
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+
+    create_users(max(workers), bill=Decimal('99999999.00'))
+    senders = list(User.objects.order_by('pk').values_list('pk', flat=True))
+    hot_inn = make_inn(len(senders))
+    hot_user = User.objects.create_user(username='hot', inn=hot_inn)
+
+    results = {}
+    context = multiprocessing.get_context('fork')
+    for bill_slots in (0, slots):
+        hot_user.set_bill_slots(bill_slots)
+        mode = f'{bill_slots}_slots'
+        results[mode] = {}
+        for count in workers:
+            # Forked processes must not share connections of the parent
+            connections.close_all()
+            with context.Pool(count) as pool:
+                transfers = sum(pool.map(
+                    transfer_worker, [(sender_id, hot_inn, duration) for sender_id in senders[:count]]
+                ))
+            results[mode][count] = transfers / duration
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--slots', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=5.0, help='Seconds per run')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(json.dumps(run(args.workers, args.slots, args.duration), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Measure rows per second of `manage.py import_users` on a generated file.
+
+    python -m benchmarks.import_users --users 1000000 --format csv
+
+Run on PostgreSQL to measure the COPY path, other databases use bulk_create. Target is over 100k rows/sec.
+"""
+import os
+import csv
+import json
+import time
+import argparse
+import tempfile
+
+from benchmarks.utils import setup_django, benchmark_database
+from benchmarks.data import iter_inns
+
+
+def write_file(path: str, users: int, import_format: str):
+    rows = (
+        {'inn': inn, 'username': f'user{number}', 'first_name': 'Name', 'last_name': 'Surname', 'bill': '100.00'}
+        for number, inn in enumerate(iter_inns(users))
+    )
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        if import_format == 'csv':
+            writer = csv.DictWriter(file, fieldnames=('inn', 'username', 'first_name', 'last_name', 'bill'))
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            file.writelines(json.dumps(row) + '\n' for row in rows)
+
+
+def run(users: int, import_format: str, batch_size: int) -> dict:
+    from io import StringIO
+    from django.core.management import call_command
+    from django.contrib.auth import get_user_model
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f'users.{import_format}')
+        write_file(path, users, import_format)
+
+        started = time.perf_counter()
+        call_command('import_users', path, batch_size=batch_size, stdout=StringIO())
+        elapsed = time.perf_counter() - started
+
+    assert get_user_model().objects.count() == users
+    return {'users': users, 'seconds': elapsed, 'rows_per_sec': users / elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--format', choices=('csv', 'ndjson'), default='csv')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(json.dumps(run(args.users, args.format, args.batch_size), indent=2))
+
+
+if __name__ == '__main__':
+    main()
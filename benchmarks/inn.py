@@ -0,0 +1,94 @@
+"""
+Compare INN validation one by one with INNValidator.validate_many, and index sizes of varchar(12) and bigint INN.
+
+    python -m benchmarks.inn --inns 1000000
+
+Index sizes are measured on PostgreSQL only: unique and inn_index are built on a copy of INNs of both types.
+"""
+import json
+import time
+import argparse
+from typing import List
+
+from benchmarks.utils import setup_django, benchmark_database
+from benchmarks.data import iter_inns
+
+
+def measure_validator(inns: List[str]) -> dict:
+    from django.core.validators import ValidationError
+    from utils import validators
+
+    validator = validators.INNValidator()
+    results = {}
+
+    started = time.perf_counter()
+    for inn in inns:
+        try:
+            validator(inn)
+        except ValidationError:
+            pass
+    results['one_by_one_per_sec'] = len(inns) / (time.perf_counter() - started)
+
+    numpy = validators.numpy
+    variants = {'validate_many_python_per_sec': None}
+    if numpy is not None:
+        variants['validate_many_numpy_per_sec'] = numpy
+
+    for name, module in variants.items():
+        validators.numpy = module
+        started = time.perf_counter()
+        assert all(validator.validate_many(inns))
+        results[name] = len(inns) / (time.perf_counter() - started)
+    validators.numpy = numpy
+
+    return results
+
+
+def measure_index_sizes(inns: List[str], batch_size: int = 10000) -> dict:
+    from django.db import connection
+
+    if connection.vendor != 'postgresql':
+        return {}
+
+    results = {}
+    with connection.cursor() as cursor:
+        for name, db_type in (('varchar', 'varchar(12)'), ('bigint', 'bigint')):
+            table = f'benchmark_inn_{name}'
+            cursor.execute(f'CREATE TABLE {table} (inn {db_type} NOT NULL)')
+            for start in range(0, len(inns), batch_size):
+                batch = inns[start:start + batch_size]
+                values = batch if name == 'varchar' else [int(inn) for inn in batch]
+                cursor.execute(f'INSERT INTO {table} (inn) SELECT unnest(%s)', [values])
+
+            cursor.execute(f'CREATE UNIQUE INDEX {table}_unique ON {table} (inn)')
+            cursor.execute(f'CREATE INDEX {table}_index ON {table} (inn)')
+            cursor.execute(
+                'SELECT pg_relation_size(%s), pg_relation_size(%s), pg_relation_size(%s)',
+                [table, f'{table}_unique', f'{table}_index'],
+            )
+            table_size, unique_size, index_size = cursor.fetchone()
+            results[name] = {
+                'table_bytes': table_size,
+                'unique_index_bytes': unique_size,
+                'inn_index_bytes': index_size,
+            }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--inns', type=int, default=1000000)
+    args = parser.parse_args()
+
+    setup_django()
+    inns = list(iter_inns(args.inns))
+    with benchmark_database():
+        print(json.dumps({
+            'validator': measure_validator(inns),
+            'index_sizes': measure_index_sizes(inns),
+        }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+Measure latency of UserViewSet.lookup by INN prefix and username prefix.
+
+    python -m benchmarks.lookup --users 10000000 --repeat 200
+
+Run on PostgreSQL: prefix indexes are created there only. Target is p99 under 10 ms.
+"""
+import json
+import random
+import argparse
+
+from benchmarks.utils import setup_django, benchmark_database, measure
+from benchmarks.data import create_users, make_inn
+
+
+def run(users: int, repeat: int) -> dict:
+    from django.contrib.auth import get_user_model
+    from rest_framework.reverse import reverse
+    from rest_framework.test import APIClient
+
+    User = get_user_model()
+
+    create_users(users)
+    client = APIClient()
+    client.force_authenticate(User.objects.create_superuser(username='benchmark', inn=make_inn(users)))
+
+    url = reverse('user-lookup')
+    inn_prefixes = [make_inn(random.randrange(users))[:6] for _ in range(repeat)]
+    # Usernames are user0 ... userN
+    username_prefixes = [f'USER{random.randrange(users)}'[:7] for _ in range(repeat)]
+
+    def lookup(prefixes):
+        prefixes = iter(prefixes * 2)
+        return lambda: client.get(url, {'q': next(prefixes)})
+
+    return {
+        'inn_prefix': measure(lookup(inn_prefixes), repeat=repeat),
+        'username_prefix': measure(lookup(username_prefixes), repeat=repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(json.dumps(run(args.users, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare page latency of page number pagination and cursor pagination of UserViewSet.list.
+
+    python -m benchmarks.pagination --users 1000000 --pages 1 10 100 1000 10000
+
+Page number pagination gets slower with depth (COUNT(*) + OFFSET scan), cursor pagination stays flat.
+"""
+import json
+import argparse
+from base64 import b64encode
+from urllib.parse import urlencode
+
+from benchmarks.utils import setup_django, benchmark_database, measure
+from benchmarks.data import create_users, make_inn
+
+
+def make_cursor(position: int) -> str:
+    return b64encode(urlencode({'p': position}).encode('ascii')).decode('ascii')
+
+
+def run(users: int, pages, repeat: int) -> dict:
+    from django.contrib.auth import get_user_model
+    from rest_framework.reverse import reverse
+    from rest_framework.settings import api_settings
+    from rest_framework.test import APIClient
+
+    User = get_user_model()
+
+    create_users(users)
+    client = APIClient()
+    client.force_authenticate(User.objects.create_superuser(username='benchmark', inn=make_inn(users)))
+
+    url = reverse('user-list')
+    ordered_ids = User.objects.order_by('-id').values_list('id', flat=True)
+    page_size = api_settings.PAGE_SIZE
+
+    results = {}
+    for page in pages:
+        offset = (page - 1) * page_size
+        if offset >= users:
+            continue
+
+        position = ordered_ids[offset - 1] if offset else None
+        cursor_params = {'pagination': 'cursor'}
+        if position is not None:
+            cursor_params['cursor'] = make_cursor(position)
+
+        results[page] = {
+            'page_number': measure(lambda: client.get(url, {'page': page}), repeat=repeat),
+            'cursor': measure(lambda: client.get(url, cursor_params), repeat=repeat),
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--pages', type=int, nargs='+', default=[1, 10, 100, 1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        results = run(args.users, args.pages, args.repeat)
+
+    for page, result in results.items():
+        print(
+            f'page {page:>7}: page_number p50 {result["page_number"]["p50"]:8.2f} ms, '
+            f'cursor p50 {result["cursor"]["p50"]:8.2f} ms'
+        )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare rows per second of UserSerializer + JSONRenderer with the values() fast path of UserViewSet.
+
+    python -m benchmarks.serialization --rows 100 --repeat 200
+
+Both include the query, so the difference is what a list page saves.
+"""
+import json
+import argparse
+
+from benchmarks.utils import setup_django, benchmark_database, measure
+from benchmarks.data import create_users
+
+
+def run(rows: int, repeat: int) -> dict:
+    from rest_framework.renderers import JSONRenderer
+
+    from apps.users.encoders import get_user_values, encode_users, escape_line_separators
+    from apps.users.serializers import UserSerializer
+    from apps.users.views import UserViewSet
+
+    create_users(rows)
+    queryset = UserViewSet.queryset.all()
+    renderer = JSONRenderer()
+
+    def serializer():
+        return renderer.render(UserSerializer(instance=queryset.all(), many=True).data)
+
+    def fast_path():
+        return escape_line_separators(encode_users(get_user_values(queryset.all())))
+
+    assert serializer() == fast_path()
+
+    results = {
+        'serializer': measure(serializer, repeat=repeat),
+        'fast_path': measure(fast_path, repeat=repeat),
+    }
+    for result in results.values():
+        result['rows_per_sec'] = rows / result['mean'] * 1000
+    results['speedup'] = results['fast_path']['rows_per_sec'] / results['serializer']['rows_per_sec']
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(json.dumps(run(args.rows, args.repeat), indent=2))
+
+
+if __name__ == '__main__':
+    main()
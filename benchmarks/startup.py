@@ -0,0 +1,161 @@
+"""
+Measure startup of gunicorn workers without and with preload (GUNICORN_PRELOAD):
+import time of the application and memory per worker after serving requests.
+
+    python -m benchmarks.startup --workers 4 --requests 200
+
+RSS counts pages shared with the master, PSS splits them between processes and private memory is what
+a worker does not share, so preload shows up as lower PSS and private memory. Linux only (/proc).
+Requests go to --path (the schema by default, it does not need a database), build it first to serve it
+prebuilt: `python manage.py build_schema --output /tmp/schema` and OPENAPI_SCHEMA_DIR=/tmp/schema.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import statistics
+import subprocess
+import urllib.error
+import urllib.request
+from typing import Dict, List
+
+IMPORT_CODE = '''
+import os, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+get_wsgi_application()
+get_resolver().url_patterns
+print(time.perf_counter() - started)
+'''
+
+
+def measure_import(repeat: int) -> Dict[str, float]:
+    """
+    Seconds to set up Django and import URLconf with views in a new interpreter, which every worker spends
+    without preload. With preload it is spent once by the master
+    """
+    timings = [
+        float(subprocess.run([sys.executable, '-c', IMPORT_CODE], capture_output=True, check=True, text=True).stdout)
+        for _ in range(repeat)
+    ]
+    return {'median': statistics.median(timings), 'min': min(timings)}
+
+
+def get_children(pid: int) -> List[int]:
+    children = []
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as file:
+                # Command in parentheses may contain spaces, parent pid is the second field after it
+                ppid = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == pid:
+            children.append(int(name))
+
+    return children
+
+
+def get_memory(pid: int) -> Dict[str, float]:
+    """
+    RSS, PSS and private memory of a process in MB
+    """
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as file:
+        for line in file:
+            key, _, rest = line.partition(':')
+            if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                values[key] = int(rest.split()[0]) / 1024
+
+    return {
+        'rss_mb': values['Rss'],
+        'pss_mb': values['Pss'],
+        'private_mb': values['Private_Clean'] + values['Private_Dirty'],
+    }
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def request(url: str, host: str) -> bool:
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers={'Host': host}), timeout=10) as response:
+            response.read()
+    except urllib.error.HTTPError:
+        # Application answered, e.g. with 401 or 404
+        return True
+    except OSError:
+        return False
+
+    return True
+
+
+def run_gunicorn(preload: bool, workers: int, requests: int, path: str, timeout: float) -> dict:
+    port = get_free_port()
+    host = os.environ.get('SERVER_HOST', 'localhost')
+    url = f'http://127.0.0.1:{port}{path}'
+    env = dict(os.environ, GUNICORN_PRELOAD=str(preload), METRICS_DIR='')
+
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        ['gunicorn', '-c', 'gunicorn.conf.py', '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+         'test_project.wsgi'],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        while len(get_children(server.pid)) < workers or not request(url, host):
+            if server.poll() is not None or time.perf_counter() - started > timeout:
+                raise RuntimeError('gunicorn did not start')
+            time.sleep(0.05)
+        ready = time.perf_counter() - started
+
+        for _ in range(requests):
+            request(url, host)
+
+        memory = [get_memory(pid) for pid in get_children(server.pid)]
+        return {
+            'ready_seconds': ready,
+            'workers': len(memory),
+            **{key: statistics.mean(worker[key] for worker in memory) for key in memory[0]},
+            'master': get_memory(server.pid),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def run(workers: int, requests: int, path: str, repeat: int, timeout: float) -> dict:
+    return {
+        'import_seconds': measure_import(repeat),
+        'gunicorn': {
+            'default': run_gunicorn(False, workers, requests, path, timeout),
+            'preload': run_gunicorn(True, workers, requests, path, timeout),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--requests', type=int, default=200, help='Requests made before memory is measured')
+    parser.add_argument('--path', default='/api/schema/')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs of import time measure')
+    parser.add_argument('--timeout', type=float, default=60.0, help='Seconds to wait for gunicorn to start')
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.workers, args.requests, args.path, args.repeat, args.timeout), indent=2))
+
+
+if __name__ == '__main__':
+    main()
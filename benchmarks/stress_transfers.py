@@ -0,0 +1,146 @@
+"""
+Stress test of concurrent transfers: processes make random transfers between a few users,
+so transfers collide on the same rows all the time, then money conservation is audited.
+
+    python -m benchmarks.stress_transfers --processes 8 --transfers 2000 --users 50 --hot 2
+
+Exits with code 1 if money is not conserved: the total of bills and slots differs from the opening one,
+a bill differs from its ledger or is below zero, or a transfer does not net to zero.
+Throughput counts transfers made and declined for lack of money, retries are transactions repeated after
+a deadlock or a serialization failure (`db_transaction_retries_total`), aborted ones failed after all attempts.
+Needs PostgreSQL (or another database shared by processes, not an in-memory SQLite).
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import multiprocessing
+from decimal import Decimal
+from typing import Dict, List
+
+from benchmarks.utils import setup_django, benchmark_database
+from benchmarks.data import create_users, make_inn
+
+
+def transfer_worker(args) -> Dict[str, int]:
+    seed, users, transfers, max_recipients = args
+    from django.db import OperationalError
+    from django.contrib.auth import get_user_model
+    from apps.metrics.registry import registry
+    from apps.users.exceptions import NotEnoughMoneyError
+
+    User = get_user_model()
+    # Counters forked from the parent are not of this worker
+    registry.clear()
+    rnd = random.Random(seed)
+
+    counts = {'done': 0, 'declined': 0, 'aborted': 0}
+    for _ in range(transfers):
+        sender_id, _ = rnd.choice(users)
+        list_of_inn = [inn for pk, inn in rnd.sample(users, rnd.randint(1, max_recipients)) if pk != sender_id]
+        if not list_of_inn:
+            continue
+
+        try:
+            User(pk=sender_id).transfer_money(list_of_inn, Decimal(rnd.randint(1, 1000)) / 100)
+        except NotEnoughMoneyError:
+            counts['declined'] += 1
+        except OperationalError:
+            counts['aborted'] += 1
+        else:
+            counts['done'] += 1
+
+    counts['retries'] = int(sum(registry.counters['db_transaction_retries_total'].values()))
+    return counts
+
+
+def create_ledger(users: List[int], bill: Decimal) -> None:
+    """
+    Opening balances of users created by create_users, so bills can be audited against the ledger
+    """
+    from apps.users.models import LedgerEntry
+
+    LedgerEntry.objects.bulk_create(
+        (LedgerEntry(user_id=pk, kind=LedgerEntry.Kind.OPENING, amount=bill) for pk in users), batch_size=10000,
+    )
+
+
+def audit() -> dict:
+    from django.contrib.auth import get_user_model
+    from apps.users.audit import audit_operations, audit_users, get_chunks, merge_operations, merge_users
+    from apps.users.models import LedgerEntry
+
+    User = get_user_model()
+
+    totals, violations = merge_users([audit_users(*chunk) for chunk in get_chunks(User, 10000)])
+    violations += merge_operations([audit_operations(*chunk) for chunk in get_chunks(LedgerEntry, 100000)])
+    return {'totals': {key: str(value) for key, value in totals.items()}, 'violations': violations}
+
+
+def run(processes: int, transfers: int, users: int, hot: int, slots: int, max_recipients: int, seed: int) -> dict:
+    from django.db import connection, connections
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        raise RuntimeError('Processes do not share an in-memory SQLite database, use PostgreSQL')
+
+    bill = Decimal('100.00')
+    create_users(users, bill=bill)
+    users_list = list(User.objects.order_by('pk').values_list('pk', 'inn'))
+    create_ledger([pk for pk, _ in users_list], bill)
+    for number in range(hot):
+        User.objects.get(inn=make_inn(number)).set_bill_slots(slots)
+    opening = bill * len(users_list)
+
+    # Forked processes must not share connections of the parent
+    connections.close_all()
+    started = time.perf_counter()
+    with multiprocessing.get_context('fork').Pool(processes) as pool:
+        results = pool.map(transfer_worker, [
+            (seed + number, users_list, transfers, max_recipients) for number in range(processes)
+        ])
+    duration = time.perf_counter() - started
+
+    counts = {key: sum(result[key] for result in results) for key in results[0]}
+    attempted = counts['done'] + counts['declined'] + counts['aborted']
+    result = audit()
+    if Decimal(result['totals']['bills']) != opening:
+        result['violations'].append(('total bills', f'{result["totals"]["bills"]} differs from opening {opening}'))
+
+    return {
+        'seconds': duration,
+        'transfers_per_second': attempted / duration,
+        'retry_rate': counts['retries'] / attempted if attempted else 0,
+        **counts,
+        'opening': str(opening),
+        **result,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=8)
+    parser.add_argument('--transfers', type=int, default=2000, help='Transfers per process')
+    parser.add_argument('--users', type=int, default=50, help='Fewer users - more conflicts')
+    parser.add_argument('--hot', type=int, default=1, help='Users with bill split into slots')
+    parser.add_argument('--slots', type=int, default=4)
+    parser.add_argument('--max-recipients', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        result = run(
+            args.processes, args.transfers, args.users, args.hot, args.slots, args.max_recipients, args.seed,
+        )
+
+    print(json.dumps(result, indent=2))
+    if result['violations']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""
+Benchmark suite of UserViewSet endpoints: latency percentiles, query count and throughput
+at several table sizes and concurrency levels. Runs on a throwaway database (PostgreSQL or SQLite),
+users are generated by benchmarks.data, so every run gets the same dataset.
+
+    python -m benchmarks.suite --sizes 1000 10000 100000 --concurrency 1 4 8 --output results.json
+    python -m benchmarks.compare base.json results.json
+
+Requests are authenticated with a real JWT access token.
+"""
+import sys
+import json
+import random
+import argparse
+import platform
+import subprocess
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+from benchmarks.utils import setup_django, benchmark_database, measure, count_queries, measure_throughput
+from benchmarks.data import create_users, make_inn
+
+ENDPOINTS = ('list', 'list_cursor', 'retrieve', 'lookup', 'money_transfer')
+
+
+def make_endpoints(size: int, seed: int) -> Dict[str, Callable]:
+    """
+    Request functions by endpoint name, each takes a client and returns a response
+    """
+    from rest_framework.reverse import reverse
+
+    rng = random.Random(seed)
+    list_url = reverse('user-list')
+    lookup_url = reverse('user-lookup')
+    recipients = [make_inn(number) for number in range(3)]
+
+    def retrieve(client):
+        return client.get(reverse('user-detail', args=(rng.randrange(size) + 1, )))
+
+    def lookup(client):
+        return client.get(lookup_url, {'q': make_inn(rng.randrange(size))[:6]})
+
+    def money_transfer(client):
+        return client.post(
+            reverse('user-money-transfer', args=(client.sender_id, )),
+            {'amount': '0.03', 'list_of_inn': recipients},
+            format='json',
+        )
+
+    return {
+        'list': lambda client: client.get(list_url),
+        'list_cursor': lambda client: client.get(list_url, {'pagination': 'cursor'}),
+        'retrieve': retrieve,
+        'lookup': lookup,
+        'money_transfer': money_transfer,
+    }
+
+
+def run(sizes: List[int], concurrency: List[int], requests: int, endpoints: List[str], seed: int) -> dict:
+    from django.contrib.auth import get_user_model
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    User = get_user_model()
+
+    created = 0
+    results = {}
+    for size in sorted(sizes):
+        # Users are numbered from 1 in a fresh database, so ids of generated users are 1..size
+        create_users(size - created, start=created)
+        created = size
+
+        sender = User.objects.filter(username='benchmark').first() or User.objects.create_superuser(
+            username='benchmark', inn=make_inn(10 ** 9), bill=Decimal('99999999.00')
+        )
+        token = str(AccessToken.for_user(sender))
+
+        def make_client() -> APIClient:
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            client.sender_id = sender.pk
+            return client
+
+        results[size] = {}
+        for name, request in make_endpoints(size, seed).items():
+            if name not in endpoints:
+                continue
+
+            client = make_client()
+
+            def make_worker(request=request):
+                worker_client = make_client()
+                return lambda: request(worker_client).status_code < 400
+
+            response = request(client)
+            assert response.status_code < 400, response.content
+            results[size][name] = {
+                'queries': count_queries(lambda: request(client)),
+                'latency_ms': measure(lambda: request(client), repeat=requests),
+                'throughput': [measure_throughput(make_worker, requests, level) for level in concurrency],
+            }
+            print(f'{size:>9} {name:<15} p50 {results[size][name]["latency_ms"]["p50"]:8.2f} ms', file=sys.stderr)
+
+    return results
+
+
+def get_environment() -> dict:
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {
+        'commit': commit,
+        'date': datetime.now(timezone.utc).isoformat(),
+        'database': connection.vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'machine': platform.machine(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--requests', type=int, default=100, help='Requests per measurement')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='JSON file to save results, stdout by default')
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        report = {
+            'environment': get_environment(),
+            'parameters': vars(args),
+            'results': run(args.sizes, args.concurrency, args.requests, args.endpoints, args.seed),
+        }
+
+    content = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(content)
+    else:
+        print(content)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Compare throughput of looping over money_transfer with money_transfer_batch.
+
+    python -m benchmarks.transfer_batch --transfers 5000 --batch-size 1000
+
+Requests are authenticated with a real JWT access token, so auth cost is included.
+"""
+import json
+import time
+import argparse
+from decimal import Decimal
+
+from benchmarks.utils import setup_django, benchmark_database
+from benchmarks.data import create_users, iter_inns, make_inn
+
+
+def run(transfers: int, batch_size: int, recipients: int) -> dict:
+    from django.contrib.auth import get_user_model
+    from django.contrib.auth.models import Permission
+    from rest_framework.reverse import reverse
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    User = get_user_model()
+
+    create_users(recipients, bill=Decimal('0.00'))
+    sender = User.objects.create_user(username='benchmark', inn=make_inn(recipients), bill=Decimal('99999999.00'))
+    sender.user_permissions.add(Permission.objects.get(codename='can_money_transfer'))
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(sender)}')
+
+    list_of_inn = list(iter_inns(recipients))
+    transfer = {'amount': '1.00', 'list_of_inn': list_of_inn}
+
+    url = reverse('user-money-transfer', args=(sender.pk, ))
+    started = time.perf_counter()
+    for _ in range(transfers):
+        response = client.post(url, transfer, format='json')
+        assert response.status_code == 200, response.content
+    single = transfers / (time.perf_counter() - started)
+
+    url = reverse('user-money-transfer-batch')
+    batch = [dict(transfer, user=sender.pk) for _ in range(batch_size)]
+    started = time.perf_counter()
+    for _ in range(0, transfers, batch_size):
+        response = client.post(url, {'transfers': batch}, format='json')
+        assert response.status_code == 200, response.content
+    batched = transfers / (time.perf_counter() - started)
+
+    return {
+        'single_transfers_per_sec': single,
+        'batch_transfers_per_sec': batched,
+        'speedup': batched / single,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--transfers', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--recipients', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    with benchmark_database():
+        print(json.dumps(run(args.transfers, args.batch_size, args.recipients), indent=2))
+
+
+if __name__ == '__main__':
+    main()
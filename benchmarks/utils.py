@@ -0,0 +1,108 @@
+import os
+import time
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List
+
+import django
+
+
+def setup_django() -> None:
+    """
+    Help function to configure Django for standalone benchmark scripts
+    """
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
+    django.setup()
+
+
+@contextmanager
+def benchmark_database(keepdb: bool = False):
+    """
+    Create a throwaway test database (same as `manage.py test` does) so benchmarks never touch real data
+    """
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment()
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def measure(func: Callable[[], object], repeat: int = 20, warmup: int = 2) -> Dict[str, float]:
+    """
+    Run func several times and return latency percentiles in milliseconds
+    """
+    for _ in range(warmup):
+        func()
+
+    timings: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return summarize(timings)
+
+
+def count_queries(func: Callable[[], object]) -> int:
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    with CaptureQueriesContext(connection) as context:
+        func()
+
+    return len(context)
+
+
+def measure_throughput(make_worker: Callable[[], Callable[[], bool]], requests: int,
+                       concurrency: int) -> Dict[str, float]:
+    """
+    Run requests calls split between concurrency threads, returns calls per second and number of failed calls.
+    make_worker is called in each thread to build its own request function (client), which returns success flag.
+    Database errors (e.g. "database table is locked" of SQLite under concurrent writes) are counted as failures
+    """
+    from django.db import DatabaseError, connections
+
+    def call(func: Callable[[], bool]) -> bool:
+        try:
+            return func()
+        except DatabaseError:
+            return False
+
+    def worker(count: int) -> int:
+        try:
+            func = make_worker()
+            return sum(not call(func) for _ in range(count))
+        finally:
+            connections.close_all()
+
+    counts = [requests // concurrency + (index < requests % concurrency) for index in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        errors = sum(executor.map(worker, counts))
+    elapsed = time.perf_counter() - started
+
+    return {'concurrency': concurrency, 'requests_per_sec': requests / elapsed, 'errors': errors}
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        'count': len(timings),
+        'mean': statistics.mean(timings),
+        'p50': percentile(timings, 50),
+        'p95': percentile(timings, 95),
+        'p99': percentile(timings, 99),
+        'max': timings[-1],
+    }
+
+
+def percentile(sorted_timings: List[float], percent: float) -> float:
+    index = min(len(sorted_timings) - 1, max(0, round(percent / 100 * len(sorted_timings)) - 1))
+    return sorted_timings[index]
@@ -1,3 +1,4 @@
+import gc
 import os
 import multiprocessing
 
@@ -10,3 +11,39 @@ bind = '0.0.0.0:8000'
 workers = multiprocessing.cpu_count() * 2 + 1
 accesslog = settings.GUNICORN_ACCESS_LOG
 errorlog = settings.GUNICORN_ERROR_LOG
+worker_class = settings.GUNICORN_WORKER_CLASS
+preload_app = settings.GUNICORN_PRELOAD
+
+
+def on_starting(server):
+    """
+    Remove metrics dumped by workers of the previous run
+    """
+    if settings.METRICS_DIR:
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        for name in os.listdir(settings.METRICS_DIR):
+            os.remove(os.path.join(settings.METRICS_DIR, name))
+
+
+def when_ready(server):
+    """
+    With preload_app import URLconf with all views and read the prebuilt schema in the master,
+    so workers fork with them instead of loading them on the first request, and share the memory copy-on-write
+    """
+    if not preload_app:
+        return
+
+    from django.db import connections
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+    if settings.OPENAPI_SCHEMA_DIR:
+        from apps.schema.files import SCHEMA_RENDERERS, load_schema
+
+        for schema_format in SCHEMA_RENDERERS:
+            load_schema(settings.OPENAPI_SCHEMA_DIR, schema_format)
+
+    # Connections must not be shared by forked workers
+    connections.close_all()
+    # Objects loaded so far are never collected, so garbage collection of workers does not write to their pages
+    gc.freeze()
@@ -2,6 +2,7 @@
 ASGI config for test_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests are routed by test_project.asgi_urls, where the hot user endpoints are async views.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -9,8 +10,27 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'test_project.settings')
 
+ASGI_URLCONF = 'test_project.asgi_urls'
+
+
+class AsyncURLConfASGIHandler(ASGIHandler):
+
+    async def get_response_async(self, request):
+        request.urlconf = ASGI_URLCONF
+        return await super().get_response_async(request)
+
+
+def get_asgi_application():
+    """
+    Same as django.core.asgi.get_asgi_application, but with ASGI_URLCONF
+    """
+    django.setup(set_prefix=False)
+    return AsyncURLConfASGIHandler()
+
+
 application = get_asgi_application()
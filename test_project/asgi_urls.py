@@ -0,0 +1,16 @@
+"""
+URL configuration of the ASGI application, the same as test_project.urls with async user views
+"""
+from django.urls import path, include
+
+from test_project import urls
+
+api_urlpatterns = [
+    path('users/', include('apps.users.async_urls')),
+    *(pattern for pattern in urls.api_urlpatterns if getattr(pattern, 'urlconf_name', None) != 'apps.users.urls'),
+]
+
+urlpatterns = [
+    *(pattern for pattern in urls.urlpatterns if getattr(pattern, 'urlconf_name', None) is not urls.api_urlpatterns),
+    path('api/', include(api_urlpatterns)),
+]
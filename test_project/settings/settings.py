@@ -14,6 +14,7 @@ from pathlib import Path
 from datetime import timedelta
 
 import environ
+from django.core.exceptions import ImproperlyConfigured
 
 env = environ.Env(
     # set casting, default value
@@ -22,6 +23,39 @@ env = environ.Env(
     REFRESH_TOKEN_LIFETIME_DAYS=(int, 1),
     GUNICORN_ACCESS_LOG=(str, '-'),
     GUNICORN_ERROR_LOG=(str, '-'),
+    GUNICORN_WORKER_CLASS=(str, 'sync'),
+    GUNICORN_PRELOAD=(bool, False),
+    ASYNC_DB_THREADS=(int, 10),
+    DATABASE_REPLICA_URLS=(list, []),
+    DATABASE_PRIMARY_PIN_SECONDS=(int, 5),
+    DB_POOL=(bool, False),
+    DB_POOL_MIN_SIZE=(int, 1),
+    DB_POOL_MAX_SIZE=(int, 10),
+    DB_POOL_TIMEOUT=(float, 10.0),
+    DB_POOL_MAX_LIFETIME=(float, 60 * 60.0),
+    DB_POOL_MAX_IDLE=(float, 10 * 60.0),
+    DB_POOL_CHECK_INTERVAL=(float, 30.0),
+    MONEY_TRANSFER_ASYNC=(bool, False),
+    IDEMPOTENCY_KEY_TTL=(int, 24 * 60 * 60),
+    IDEMPOTENCY_KEY_LEASE=(int, 60),
+    MONEY_TRANSFER_RATE=(str, ''),
+    MONEY_TRANSFER_GROUP_RATES=(dict, {}),
+    MONEY_TRANSFER_GLOBAL_RATE=(str, ''),
+    TRANSACTION_RETRY_ATTEMPTS=(int, 3),
+    TRANSACTION_RETRY_BASE_DELAY=(float, 0.01),
+    TRANSACTION_RETRY_MAX_DELAY=(float, 0.2),
+    CACHE_URL=(str, 'locmemcache://'),
+    RESPONSE_CACHE_URL=(str, 'locmemcache://responses?max_entries=10000'),
+    RESPONSE_CACHE_TIMEOUT=(int, 5 * 60),
+    PERMISSIONS_CACHE_TIMEOUT=(int, 60 * 60),
+    AUTH_USER_CACHE_TIMEOUT=(int, 60),
+    USER_INN_COMPACT=(bool, False),
+    METRICS_DIR=(str, ''),
+    METRICS_FLUSH_INTERVAL=(int, 5),
+    METRICS_TOKEN=(str, ''),
+    SLOW_QUERY_THRESHOLD_MS=(int, 200),
+    SLOW_QUERY_SAMPLE_RATE=(float, 0.1),
+    OPENAPI_SCHEMA_DIR=(str, ''),
 )
 
 environ.Env.read_env('.environment')
@@ -53,9 +87,12 @@ INSTALLED_APPS = [
     'rest_framework_simplejwt',
     'drf_spectacular',
     'apps.users.apps.UsersConfig',
+    'apps.metrics.apps.MetricsConfig',
+    'apps.schema.apps.SchemaConfig',
 ]
 
 MIDDLEWARE = [
+    'apps.metrics.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -89,12 +126,55 @@ DATABASES = {
     'default': env.db(),
 }
 
+# Read replicas of default, in tests they are mirrors of the test database
+for index, url in enumerate(env('DATABASE_REPLICA_URLS')):
+    DATABASES[f'replica_{index}'] = {**env.db_url_config(url), 'TEST': {'MIRROR': 'default'}}
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['utils.db.routers.PrimaryReplicaRouter']
+
+# Seconds reads of a user are pinned to the primary after a money transfer, should exceed replication lag
+DATABASE_PRIMARY_PIN_SECONDS = env('DATABASE_PRIMARY_PIN_SECONDS')
+
+# Per-process pool of PostgreSQL connections instead of a connection per request
+if env('DB_POOL'):
+    for database in DATABASES.values():
+        database['ENGINE'] = 'utils.db.backends.postgresql'
+        database['POOL'] = {
+            'min_size': env('DB_POOL_MIN_SIZE'),
+            # Per worker: total is max_size * gunicorn workers, keep it below max_connections of PostgreSQL
+            'max_size': env('DB_POOL_MAX_SIZE'),
+            # Seconds to wait for a free connection
+            'timeout': env('DB_POOL_TIMEOUT'),
+            'max_lifetime': env('DB_POOL_MAX_LIFETIME'),
+            'max_idle': env('DB_POOL_MAX_IDLE'),
+            # Connections idle longer than this are checked by `SELECT 1` before reuse
+            'check_interval': env('DB_POOL_CHECK_INTERVAL'),
+        }
+
+# Local memory cache is per process, set CACHE_URL to memcached (or filecache) to share it between workers
+CACHES = {
+    'default': env.cache(),
+    # Cached list and retrieve responses, LRU: memcached or local memory with max_entries
+    'responses': env.cache('RESPONSE_CACHE_URL'),
+}
+# Caches of these backends are not shared by workers (and management commands)
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Pin of a user to the primary after a write must be seen by the worker serving the next request of the user
+if DATABASE_REPLICAS and CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS:
+    raise ImproperlyConfigured('DATABASE_REPLICA_URLS needs CACHE_URL shared by workers (memcached or filecache)')
+
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 100,
@@ -124,9 +204,9 @@ LOGGING = {
         }
     },
     'loggers': {
-        'django.db.backends': {
+        'apps.metrics.slow_queries': {
             'propagate': False,
-            'level': 'DEBUG',
+            'level': 'WARNING',
             'handlers': ['console'],
         }
     },
@@ -163,6 +243,10 @@ SPECTACULAR_SETTINGS = {
     'SCHEMA_PATH_PREFIX_TRIM': True,
 }
 
+# Directory with schema built by `manage.py build_schema`, served by `/api/schema/` as is.
+# Empty to generate schema on every request
+OPENAPI_SCHEMA_DIR = env('OPENAPI_SCHEMA_DIR')
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -192,7 +276,78 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Money transfer
+
+# Queue all money transfers to be applied by `manage.py process_money_transfers`
+MONEY_TRANSFER_ASYNC = env('MONEY_TRANSFER_ASYNC')
+
+# Seconds to replay responses of money_transfer requests with the same Idempotency-Key
+IDEMPOTENCY_KEY_TTL = env('IDEMPOTENCY_KEY_TTL')
+# Seconds a request holds its Idempotency-Key in progress, then a retry takes it over (the worker was killed).
+# Must be longer than the worker timeout of gunicorn (30 seconds by default)
+IDEMPOTENCY_KEY_LEASE = env('IDEMPOTENCY_KEY_LEASE')
+
+# Token bucket limits of transfer requests as "N/period" (s, min, hour, day), empty for no limit.
+# Buckets are shared by workers in the database, rejected requests get 429 with Retry-After
+MONEY_TRANSFER_RATE = env('MONEY_TRANSFER_RATE')
+# Rates by group name ("group=N/period,..."), the highest rate of user groups replaces MONEY_TRANSFER_RATE
+MONEY_TRANSFER_GROUP_RATES = env('MONEY_TRANSFER_GROUP_RATES')
+# Limit of all users together
+MONEY_TRANSFER_GLOBAL_RATE = env('MONEY_TRANSFER_GLOBAL_RATE')
+
+# Attempts of a transfer transaction aborted by a deadlock or a serialization failure (1 - no retry)
+# and its backoff in seconds: doubled from the base delay up to the max one, with jitter
+TRANSACTION_RETRY_ATTEMPTS = env('TRANSACTION_RETRY_ATTEMPTS')
+TRANSACTION_RETRY_BASE_DELAY = env('TRANSACTION_RETRY_BASE_DELAY')
+TRANSACTION_RETRY_MAX_DELAY = env('TRANSACTION_RETRY_MAX_DELAY')
+
+# Users
+
+# Seconds to keep cached list and retrieve responses, 0 to disable. They are invalidated by changes of users anyway,
+# but a worker sees stamps replaced by the others only in a shared cache, so it is disabled with local memory one
+RESPONSE_CACHE_TIMEOUT = (
+    env('RESPONSE_CACHE_TIMEOUT') if CACHES['responses']['BACKEND'] not in LOCAL_CACHE_BACKENDS else 0
+)
+
+# Store INN as bigint instead of varchar(12), convert existing table by `manage.py convert_inn_storage`
+USER_INN_COMPACT = env('USER_INN_COMPACT')
+
+# Authentication and permissions
+
+# Signals invalidate only the cache of the process which made the change, so with local memory CACHE_URL
+# revoked permissions and deactivated users stay in force on other workers up to this many seconds
+LOCAL_CACHE_MAX_TIMEOUT = 5 if CACHES['default']['BACKEND'] in LOCAL_CACHE_BACKENDS else None
+
+# Seconds to cache user permissions, cache is invalidated by signals on permissions and groups changes
+PERMISSIONS_CACHE_TIMEOUT = min(env('PERMISSIONS_CACHE_TIMEOUT'), LOCAL_CACHE_MAX_TIMEOUT or float('inf'))
+
+# Seconds a user snapshot is used by CachedJWTAuthentication, so deactivation made bypassing signals
+# (queryset update) takes effect within this time
+AUTH_USER_CACHE_TIMEOUT = min(env('AUTH_USER_CACHE_TIMEOUT'), LOCAL_CACHE_MAX_TIMEOUT or float('inf'))
+
+# Metrics
+
+# Directory where gunicorn workers dump metrics for `/metrics`, must be shared by workers and cleared on start
+METRICS_DIR = env('METRICS_DIR')
+# Seconds between dumps of worker metrics
+METRICS_FLUSH_INTERVAL = env('METRICS_FLUSH_INTERVAL')
+# Bearer token required by `/metrics`, if empty they are served only in DEBUG
+METRICS_TOKEN = env('METRICS_TOKEN')
+# Queries slower than threshold are counted and a sample of them is logged by `apps.metrics.slow_queries`
+SLOW_QUERY_THRESHOLD_MS = env('SLOW_QUERY_THRESHOLD_MS')
+SLOW_QUERY_SAMPLE_RATE = env('SLOW_QUERY_SAMPLE_RATE')
+
 # Gunicorn
 
 GUNICORN_ACCESS_LOG = env('GUNICORN_ACCESS_LOG')
 GUNICORN_ERROR_LOG = env('GUNICORN_ERROR_LOG')
+# `uvicorn.workers.UvicornWorker` to run test_project.asgi
+GUNICORN_WORKER_CLASS = env('GUNICORN_WORKER_CLASS')
+# Load the application in the master before forking workers, so they share its memory copy-on-write.
+# Code changes need a restart of the master, not only of workers (HUP)
+GUNICORN_PRELOAD = env('GUNICORN_PRELOAD')
+
+# ASGI
+
+# Threads of an ASGI worker running async user views, each of them may hold a database connection
+ASYNC_DB_THREADS = env('ASYNC_DB_THREADS')
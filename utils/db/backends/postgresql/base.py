@@ -0,0 +1,115 @@
+"""
+PostgreSQL backend keeping connections in a per-process pool (utils.db.pool.ConnectionPool).
+
+Django closes the connection at the end of every request (CONN_MAX_AGE=0), here close returns it to the pool,
+so a request pays a TCP and auth handshake only when the pool grows. Pool options are taken from
+DATABASES[alias]['POOL'] (see DB_POOL_* settings). Session state is kept between checkouts, the same as
+persistent connections of Django, only an open transaction is rolled back.
+"""
+import os
+import threading
+from typing import Dict, Tuple
+
+from django.db.backends.postgresql import base, creation
+from psycopg2 import extensions
+
+from apps.metrics.registry import registry
+from utils.db.pool import ConnectionPool, PoolTimeout
+
+Database = base.Database
+
+# (pid, alias, database, connection parameters) -> pool
+pools: Dict[Tuple[int, str, str, str], ConnectionPool] = {}
+pools_lock = threading.Lock()
+
+
+def check_connection(connection) -> bool:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except Database.Error:
+        return False
+
+    return True
+
+
+def reset_connection(connection) -> bool:
+    if connection.closed:
+        return False
+
+    try:
+        if connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            connection.rollback()
+    except Database.Error:
+        return False
+
+    return connection.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+
+
+def close_connection(connection):
+    connection.close()
+
+
+def close_pools(database_name: str):
+    """
+    Close idle connections to the database, e.g. before it is dropped
+    """
+    with pools_lock:
+        for (_, _, name, _), pool in list(pools.items()):
+            if name == database_name:
+                pool.close()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_pools(test_database_name)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params: dict) -> ConnectionPool:
+        """
+        Pool of the process: forked workers must not share connections opened by gunicorn master with preload.
+        Connections to another database of the same alias (e.g. to `postgres` by test runner) are in their own pool
+        """
+        key = (os.getpid(), self.alias, conn_params.get('database', ''), repr(sorted(conn_params.items())))
+        pool = pools.get(key)
+        if pool is not None:
+            return pool
+
+        with pools_lock:
+            pool = pools.get(key)
+            if pool is None:
+                pool = pools[key] = ConnectionPool(
+                    connect=lambda: super(DatabaseWrapper, self).get_new_connection(conn_params),
+                    check=check_connection,
+                    reset=reset_connection,
+                    close=close_connection,
+                    **self.settings_dict.get('POOL', {}),
+                )
+                labels = {'alias': self.alias, 'database': key[2]}
+                registry.add_collector(lambda: pool.collect(labels))
+
+        return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool(conn_params)
+        try:
+            pool.fill()
+            connection = pool.getconn()
+        except PoolTimeout as error:
+            # Wrapped into django.db.OperationalError as any other connection error
+            raise Database.OperationalError(str(error)) from error
+
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # After errors Django closes only unusable connections (close_if_unusable_or_obsolete),
+                # e.g. broken by a restart of the server, transaction status of such a connection may look fine
+                self.get_pool(self.get_connection_params()).putconn(self.connection, broken=self.errors_occurred)
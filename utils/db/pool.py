@@ -0,0 +1,216 @@
+"""
+Thread-safe pool of DB-API connections, used by the pooled PostgreSQL backend (utils.db.backends.postgresql)
+"""
+import time
+import threading
+from collections import Counter, deque
+from typing import Callable, Deque, Dict, Iterable, Optional, Tuple
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    Keeps between min_size and max_size open connections of one process.
+
+    Checkout takes the most recently returned connection (its server process is the warmest),
+    waits up to `timeout` seconds when all max_size connections are in use, checks connections idle longer than
+    `check_interval` by `check` and replaces those failed the check or older than `max_lifetime`.
+    Idle connections above min_size are closed after `max_idle` seconds.
+    """
+
+    def __init__(
+            self,
+            connect: Callable[[], object],
+            check: Callable[[object], bool],
+            reset: Callable[[object], bool],
+            close: Callable[[object], None],
+            min_size: int = 0,
+            max_size: int = 10,
+            timeout: float = 10.0,
+            max_lifetime: float = 3600.0,
+            max_idle: float = 600.0,
+            check_interval: float = 30.0,
+    ):
+        """
+        :param connect: open a new connection
+        :param check: return False if connection is not usable
+        :param reset: return connection to initial state (e.g. rollback) before reuse, False if it is broken
+        :param close: close connection, errors are ignored
+        """
+        self.connect = connect
+        self.check = check
+        self.reset = reset
+        self.close_connection = close
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.check_interval = check_interval
+
+        self.condition = threading.Condition()
+        # (connection, returned at), the right end is the most recently returned
+        self.idle: Deque[Tuple[object, float]] = deque()
+        self.created_at: Dict[int, float] = {}
+        # Open connections, in use and idle, including being opened
+        self.size = 0
+        self.closed = False
+        self.stats = Counter()
+
+    def getconn(self):
+        connection, returned_at = self.acquire()
+
+        if connection is not None:
+            now = time.monotonic()
+            if self.is_expired(connection, now):
+                self.count('recycled')
+            elif now - returned_at < self.check_interval or self.check(connection):
+                return connection
+            else:
+                self.count('failed_checks')
+            # Connection is replaced by a new one in the same slot
+            self.discard(connection, release_slot=False)
+
+        try:
+            return self.open()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+
+    def acquire(self) -> Tuple[Optional[object], float]:
+        """
+        Idle connection with time it was returned or (None, 0) if a slot for a new connection is reserved
+        """
+        started = time.monotonic()
+        with self.condition:
+            self.stats['checkouts'] += 1
+            waited = False
+            while True:
+                if self.idle:
+                    result = self.idle.pop()
+                    break
+
+                if self.size < self.max_size:
+                    self.size += 1
+                    result = None, 0.0
+                    break
+
+                remaining = started + self.timeout - time.monotonic()
+                if remaining <= 0:
+                    self.stats['timeouts'] += 1
+                    raise PoolTimeout(f'No connection is returned to the pool in {self.timeout} seconds')
+
+                if not waited:
+                    self.stats['waits'] += 1
+                    waited = True
+                self.condition.wait(remaining)
+
+            if waited:
+                self.stats['wait_seconds'] += time.monotonic() - started
+
+        return result
+
+    def putconn(self, connection, broken: bool = False):
+        """
+        Return connection to the pool, broken one (e.g. failed by errors of the server) is closed instead
+        """
+        now = time.monotonic()
+        if broken or self.closed or self.is_expired(connection, now) or not self.reset(connection):
+            self.count('recycled')
+            self.discard(connection)
+            return
+
+        with self.condition:
+            self.idle.append((connection, now))
+            self.condition.notify()
+            stale = self.pop_stale(now)
+
+        for connection in stale:
+            self.count('recycled')
+            self.discard(connection, release_slot=False)
+
+    def pop_stale(self, now: float) -> Iterable[object]:
+        """
+        Remove connections idle longer than max_idle above min_size, must be called with the lock acquired
+        """
+        stale = []
+        while self.idle and self.size > self.min_size and now - self.idle[0][1] >= self.max_idle:
+            stale.append(self.idle.popleft()[0])
+            self.size -= 1
+
+        return stale
+
+    def fill(self):
+        """
+        Open connections up to min_size, e.g. when worker starts
+        """
+        while True:
+            with self.condition:
+                if self.size >= self.min_size:
+                    return
+                self.size += 1
+
+            try:
+                connection = self.open()
+            except Exception:
+                with self.condition:
+                    self.size -= 1
+                raise
+
+            with self.condition:
+                self.idle.appendleft((connection, time.monotonic()))
+                self.condition.notify()
+
+    def open(self):
+        connection = self.connect()
+        with self.condition:
+            self.created_at[id(connection)] = time.monotonic()
+            self.stats['created'] += 1
+        return connection
+
+    def count(self, name: str):
+        with self.condition:
+            self.stats[name] += 1
+
+    def discard(self, connection, release_slot: bool = True):
+        with self.condition:
+            self.created_at.pop(id(connection), None)
+            if release_slot:
+                self.size -= 1
+                self.condition.notify()
+
+        try:
+            self.close_connection(connection)
+        except Exception:
+            pass
+
+    def is_expired(self, connection, now: float) -> bool:
+        return now - self.created_at.get(id(connection), now) >= self.max_lifetime
+
+    def close(self):
+        """
+        Close idle connections, connections in use are closed when returned
+        """
+        with self.condition:
+            idle = [connection for connection, _ in self.idle]
+            self.idle.clear()
+            self.size -= len(idle)
+            self.closed = True
+
+        for connection in idle:
+            self.discard(connection, release_slot=False)
+
+    def collect(self, labels: dict) -> Iterable[Tuple[str, str, dict, float]]:
+        """
+        Stats for apps.metrics registry collector
+        """
+        for name in ('checkouts', 'waits', 'timeouts', 'created', 'recycled', 'failed_checks'):
+            yield 'counter', f'db_pool_{name}_total', labels, self.stats[name]
+        yield 'counter', 'db_pool_wait_seconds_total', labels, self.stats['wait_seconds']
+        yield 'gauge', 'db_pool_connections', labels, self.size
+        yield 'gauge', 'db_pool_idle_connections', labels, len(self.idle)
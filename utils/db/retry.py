@@ -0,0 +1,70 @@
+"""
+Retry of transactions aborted by lock conflicts.
+
+Transfers lock rows in the order of id, so they do not deadlock with each other, but hot account slots,
+SERIALIZABLE transactions and other writers can still abort a transaction with a deadlock (40P01) or
+a serialization failure (40001). Such a transaction did nothing and can be run again as a whole,
+after a jittered backoff so that the conflicting transactions do not collide again at once.
+"""
+import time
+import random
+from functools import wraps
+from typing import Callable
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+from apps.metrics.registry import registry
+
+# deadlock_detected, serialization_failure
+RETRYABLE_PGCODES = ('40P01', '40001')
+# SQLite reports a busy database by message only
+RETRYABLE_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_retryable(error: OperationalError) -> bool:
+    pgcode = getattr(error.__cause__, 'pgcode', None)
+    if pgcode is not None:
+        return pgcode in RETRYABLE_PGCODES
+
+    return any(message in str(error) for message in RETRYABLE_MESSAGES)
+
+
+def get_retry_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """
+    Exponential backoff capped by max_delay, with a random part of up to a half of it
+    """
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    return delay * random.uniform(0.5, 1)
+
+
+def retry_on_conflict(using: str = DEFAULT_DB_ALIAS) -> Callable:
+    """
+    Run the decorated function again on deadlock or serialization failure, up to TRANSACTION_RETRY_ATTEMPTS times.
+    Must wrap `transaction.atomic`: the whole transaction is repeated, so it must not have side effects outside
+    the database. Inside an outer transaction the error is raised as is, only the outermost one can be repeated.
+    Retries are counted by `db_transaction_retries_total` metric
+    """
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if connections[using].in_atomic_block:
+                return func(*args, **kwargs)
+
+            attempt = 0
+            while True:
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as e:
+                    if attempt + 1 >= settings.TRANSACTION_RETRY_ATTEMPTS or not is_retryable(e):
+                        raise
+
+                registry.inc('db_transaction_retries_total', {'function': func.__qualname__})
+                time.sleep(get_retry_delay(
+                    attempt, settings.TRANSACTION_RETRY_BASE_DELAY, settings.TRANSACTION_RETRY_MAX_DELAY,
+                ))
+                attempt += 1
+
+        return wrapper
+
+    return decorator
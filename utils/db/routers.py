@@ -0,0 +1,65 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Reads of the current request (or block) go to the primary
+primary_pinned: ContextVar[bool] = ContextVar('primary_pinned', default=False)
+
+
+@contextmanager
+def use_primary(pinned: bool = True):
+    token = primary_pinned.set(pinned)
+    try:
+        yield
+    finally:
+        primary_pinned.reset(token)
+
+
+def get_pin_cache_key(user_id: int) -> str:
+    return f'db:primary:{user_id}'
+
+
+def pin_user_to_primary(user_id: int):
+    """
+    Read-your-writes: requests of the user read from the primary for DATABASE_PRIMARY_PIN_SECONDS,
+    until replicas have caught up with the writes made by the current request.
+    Pin is kept in the default cache, which settings require to be shared by workers when there are replicas
+    """
+    if settings.DATABASE_REPLICAS:
+        cache.set(get_pin_cache_key(user_id), True, settings.DATABASE_PRIMARY_PIN_SECONDS)
+        primary_pinned.set(True)
+
+
+def is_user_pinned_to_primary(user_id: int) -> bool:
+    return bool(settings.DATABASE_REPLICAS) and cache.get(get_pin_cache_key(user_id), False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Writes go to the primary (default), reads to a random replica of DATABASE_REPLICAS.
+    Reads stay on the primary inside transactions (e.g. transfer_money) and when pinned by `use_primary`
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            not settings.DATABASE_REPLICAS or
+            primary_pinned.get() or
+            connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return DEFAULT_DB_ALIAS
+
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas have the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,61 @@
+from django.conf import settings
+from django.db import models
+from django.db.models.lookups import StartsWith
+
+
+class INNField(models.CharField):
+    """
+    INN as 12 characters string. With USER_INN_COMPACT setting it is stored as bigint (8 bytes instead of 13),
+    leading zeros are restored on load. Switch storage of existing table by `manage.py convert_inn_storage`
+    """
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 12)
+        super().__init__(*args, **kwargs)
+
+    @staticmethod
+    def is_compact() -> bool:
+        return settings.USER_INN_COMPACT
+
+    def db_type(self, connection):
+        if self.is_compact():
+            return models.BigIntegerField().db_type(connection)
+
+        return super().db_type(connection)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value is None or not self.is_compact():
+            return value
+
+        # Not an INN can't be stored, so it matches nothing. Shorter strings are not padded with zeros,
+        # '1' matches nothing the same as in varchar storage
+        return int(value) if len(value) == self.max_length and value.isascii() and value.isdigit() else None
+
+    def from_db_value(self, value, expression, connection):
+        if isinstance(value, int):
+            return f'{value:0{self.max_length}d}'
+
+        return value
+
+
+@INNField.register_lookup
+class INNStartsWith(StartsWith):
+    """
+    Prefix of compact INN is a range of numbers, so it is searched by the unique index as well
+    """
+
+    def as_sql(self, compiler, connection):
+        if not self.lhs.output_field.is_compact():
+            return super().as_sql(compiler, connection)
+
+        lhs_sql, params = self.process_lhs(compiler, connection)
+        prefix = str(self.rhs)
+        max_length = self.lhs.output_field.max_length
+        if not (len(prefix) <= max_length and prefix.isascii() and prefix.isdigit()):
+            return '1 = 0', []
+
+        return (
+            f'{lhs_sql} BETWEEN %s AND %s',
+            [*params, int(prefix.ljust(max_length, '0')), int(prefix.ljust(max_length, '9'))],
+        )
@@ -0,0 +1,110 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from apps.metrics.registry import Registry, render
+from utils.db.pool import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+
+    def __init__(self):
+        self.usable = True
+        self.closed = False
+
+
+class ConnectionPoolTestCase(SimpleTestCase):
+
+    def make_pool(self, **kwargs) -> ConnectionPool:
+        """
+        Help function to create pool of fake connections
+        """
+        options = {'min_size': 0, 'max_size': 2, 'timeout': 0.05, 'check_interval': 0}
+        options.update(kwargs)
+        return ConnectionPool(
+            connect=FakeConnection,
+            check=lambda connection: connection.usable,
+            reset=lambda connection: not connection.closed,
+            close=lambda connection: setattr(connection, 'closed', True),
+            **options,
+        )
+
+    def test_reuse(self):
+        pool = self.make_pool()
+
+        connection = pool.getconn()
+        pool.putconn(connection)
+
+        self.assertIs(pool.getconn(), connection)
+        self.assertEqual(pool.stats['created'], 1)
+        self.assertEqual(pool.stats['checkouts'], 2)
+
+    def test_timeout(self):
+        pool = self.make_pool()
+        connections = [pool.getconn(), pool.getconn()]
+
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats['timeouts'], 1)
+
+        # Waiting checkout gets the returned connection
+        threading.Timer(0.01, pool.putconn, args=(connections[0], )).start()
+        self.assertIs(pool.getconn(), connections[0])
+        self.assertEqual(pool.stats['waits'], 2)
+        self.assertEqual(pool.size, 2)
+
+    def test_recycle(self):
+        pool = self.make_pool(max_lifetime=60)
+
+        connection = pool.getconn()
+        connection.usable = False
+        pool.putconn(connection)
+        replacement = pool.getconn()
+        self.assertIsNot(replacement, connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats['failed_checks'], 1)
+
+        # Broken connection is not returned to the pool
+        replacement.closed = True
+        pool.putconn(replacement)
+        self.assertEqual((pool.size, len(pool.idle)), (0, 0))
+
+        # Connection with errors is closed even if it can be reset
+        connection = pool.getconn()
+        pool.putconn(connection, broken=True)
+        self.assertTrue(connection.closed)
+        self.assertEqual((pool.size, len(pool.idle)), (0, 0))
+
+        connection = pool.getconn()
+        with mock.patch('utils.db.pool.time.monotonic', return_value=pool.created_at[id(connection)] + 60):
+            pool.putconn(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.stats['recycled'], 3)
+        self.assertEqual(pool.stats['created'], 4)
+
+    def test_min_size(self):
+        pool = self.make_pool(min_size=1, max_idle=10)
+        pool.fill()
+        self.assertEqual((pool.size, len(pool.idle)), (1, 1))
+
+        first, second = pool.getconn(), pool.getconn()
+        pool.putconn(first)
+        with mock.patch('utils.db.pool.time.monotonic', return_value=pool.idle[0][1] + 10):
+            pool.putconn(second)
+
+        # Connection idle longer than max_idle is closed down to min_size
+        self.assertTrue(first.closed)
+        self.assertEqual((pool.size, len(pool.idle)), (1, 1))
+
+    def test_metrics(self):
+        pool = self.make_pool()
+        pool.putconn(pool.getconn())
+        registry = Registry()
+        registry.add_collector(lambda: pool.collect({'alias': 'default'}))
+
+        content = render([registry.dump()])
+
+        self.assertIn('db_pool_checkouts_total{alias="default"} 1', content)
+        self.assertIn('# TYPE db_pool_connections gauge\ndb_pool_connections{alias="default"} 1', content)
+        self.assertIn('db_pool_idle_connections{alias="default"} 1', content)
@@ -0,0 +1,108 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import OperationalError, transaction
+from django.test import TransactionTestCase, override_settings
+from model_bakery import baker
+
+from apps.metrics.registry import registry, render
+from apps.users.models import LedgerEntry
+from apps.users.tests.mock_data import USER_INN, LIST_OF_INN
+from utils.db.retry import get_retry_delay, retry_on_conflict
+
+User = get_user_model()
+
+
+class DriverError(Exception):
+
+    def __init__(self, pgcode: str):
+        super().__init__()
+        self.pgcode = pgcode
+
+
+def make_error(pgcode: str = None, message: str = 'error') -> OperationalError:
+    """
+    Help function to create error wrapped by Django as it is raised by the driver
+    """
+    error = OperationalError(message)
+    error.__cause__ = DriverError(pgcode) if pgcode else None
+    return error
+
+
+@override_settings(TRANSACTION_RETRY_ATTEMPTS=3)
+@mock.patch('utils.db.retry.time.sleep')
+class RetryOnConflictTestCase(TransactionTestCase):
+    """
+    Not a TestCase: its transaction is an outer one, so nothing would be retried
+    """
+
+    def setUp(self) -> None:
+
+        registry.clear()
+
+    def test_retry(self, sleep):
+        func = mock.Mock(side_effect=[make_error('40P01'), make_error('40001'), 'done'], __qualname__='func')
+
+        self.assertEqual(retry_on_conflict()(func)(), 'done')
+        self.assertEqual(func.call_count, 3)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertIn('db_transaction_retries_total{function="func"} 2', render(registry.collect()))
+
+        func = mock.Mock(side_effect=[make_error(message='database is locked'), 'done'], __qualname__='func')
+        self.assertEqual(retry_on_conflict()(func)(), 'done')
+
+    def test_not_retried(self, sleep):
+        for error in (make_error('23505'), make_error(message='no such table')):
+            func = mock.Mock(side_effect=error, __qualname__='func')
+            with self.assertRaises(OperationalError):
+                retry_on_conflict()(func)()
+            self.assertEqual(func.call_count, 1)
+
+        # Attempts are bounded
+        func = mock.Mock(side_effect=make_error('40P01'), __qualname__='func')
+        with self.assertRaises(OperationalError):
+            retry_on_conflict()(func)()
+        self.assertEqual(func.call_count, 3)
+
+        # Only the outermost transaction is repeated
+        sleep.reset_mock()
+        func = mock.Mock(side_effect=make_error('40P01'), __qualname__='func')
+        with self.assertRaises(OperationalError), transaction.atomic():
+            retry_on_conflict()(func)()
+        self.assertEqual(func.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_delay(self, sleep):
+        for attempt in range(10):
+            delay = get_retry_delay(attempt, 0.01, 0.2)
+            self.assertGreaterEqual(delay, min(0.2, 0.01 * 2 ** attempt) / 2)
+            self.assertLessEqual(delay, 0.2)
+
+    def test_transfer_money(self, sleep):
+        sender = baker.make(User, inn=USER_INN, bill=Decimal('10.00'))
+        hot_recipient = baker.make(User, inn=LIST_OF_INN[0])
+        hot_recipient.set_bill_slots(2)
+        recipient = baker.make(User, inn=LIST_OF_INN[1])
+
+        # Hot account is credited to a slot, so it is not locked
+        with transaction.atomic():
+            self.assertEqual(User.lock_users([sender.pk], LIST_OF_INN[:2]), 2)
+
+        # Deadlock after debit and credits of the first attempt, they are rolled back and made again
+        record_transfer = LedgerEntry.record_transfer
+        errors = [make_error('40P01')]
+
+        def record_transfer_with_deadlock(*args, **kwargs):
+            if errors:
+                raise errors.pop()
+            return record_transfer(*args, **kwargs)
+
+        with mock.patch.object(LedgerEntry, 'record_transfer', side_effect=record_transfer_with_deadlock):
+            sender.transfer_money(LIST_OF_INN[:2], Decimal('4.00'))
+
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(User.objects.get(pk=sender.pk).bill, Decimal('6.00'))
+        self.assertEqual(User.objects.get(pk=recipient.pk).bill, Decimal('2.00'))
+        self.assertEqual(User.objects.get(pk=hot_recipient.pk).total_bill, Decimal('2.00'))
+        self.assertEqual(LedgerEntry.objects.exclude(kind=LedgerEntry.Kind.OPENING).count(), 3)
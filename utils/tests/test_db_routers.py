@@ -0,0 +1,125 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from model_bakery import baker
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
+
+from apps.users.models import BillSlot
+from apps.users.tests.mock_data import USER_INN, LIST_OF_INN, USER_BILL, generate_users
+from utils.db.routers import PrimaryReplicaRouter, primary_pinned, use_primary, is_user_pinned_to_primary
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+class PrimaryReplicaRouterTestCase(SimpleTestCase):
+    """
+    Not a TestCase: reads inside its transaction always go to the primary
+    """
+
+    def setUp(self) -> None:
+
+        self.router = PrimaryReplicaRouter()
+
+    def test_routing(self):
+        self.assertIn(self.router.db_for_read(User), ('replica_0', 'replica_1'))
+        self.assertEqual(self.router.db_for_write(User), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_0', 'users'))
+
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+        connection = connections['default']
+        with mock.patch.object(connection, 'in_atomic_block', True):
+            self.assertEqual(self.router.db_for_read(User), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class PrimaryPinTestCase(TestCase):
+
+    def setUp(self) -> None:
+
+        cache.clear()
+
+    def test_pin_after_transfer(self):
+        """
+        After a transfer reads of the user go to the primary for DATABASE_PRIMARY_PIN_SECONDS, other users are not pinned
+        """
+        user = baker.make(User, inn=USER_INN, bill=USER_BILL, is_superuser=True)
+        other = baker.make(User, is_superuser=True)
+        generate_users(LIST_OF_INN[:2])
+        client = APIClient()
+        client.force_authenticate(user=user)
+
+        response = client.post(
+            reverse('user-money-transfer', args=(user.pk, )),
+            {'amount': USER_BILL, 'list_of_inn': LIST_OF_INN[:2]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        self.assertTrue(is_user_pinned_to_primary(user.pk))
+        self.assertFalse(is_user_pinned_to_primary(other.pk))
+        # Pin of the request is reset after it
+        self.assertFalse(primary_pinned.get())
+
+        with override_settings(DATABASE_PRIMARY_PIN_SECONDS=0):
+            cache.clear()
+            self.assertFalse(is_user_pinned_to_primary(user.pk))
+
+
+@override_settings(DATABASE_REPLICAS=['lagging_replica'])
+class LaggingReplicaTestCase(TransactionTestCase):
+    """
+    Replica is a separate database which has users, but not the writes made after they were copied.
+    Not a TestCase: reads inside its transaction always go to the primary
+    """
+
+    def setUp(self) -> None:
+
+        cache.clear()
+        connections.settings['lagging_replica'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+        with connections['lagging_replica'].schema_editor() as editor:
+            for model in (User, BillSlot):
+                editor.create_model(model)
+
+    def tearDown(self) -> None:
+
+        connections['lagging_replica'].close()
+        del connections['lagging_replica']
+        del connections.settings['lagging_replica']
+
+    def test_read_your_writes(self):
+        user = baker.make(User, inn=USER_INN, bill=USER_BILL, is_superuser=True)
+        other = baker.make(User, is_superuser=True)
+        generate_users(LIST_OF_INN[:2])
+        User.objects.using('lagging_replica').bulk_create(User.objects.using('default').all())
+
+        client = APIClient()
+        client.force_authenticate(user=user)
+        response = client.post(
+            reverse('user-money-transfer', args=(user.pk, )),
+            {'amount': USER_BILL, 'list_of_inn': LIST_OF_INN[:2]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+
+        url = reverse('user-detail', args=(user.pk, ))
+        self.assertEqual(client.get(url).data['bill'], '0.01')
+
+        # Other users read the replica, which lacks the transfer
+        other_client = APIClient()
+        other_client.force_authenticate(user=other)
+        self.assertEqual(other_client.get(url).data['bill'], str(USER_BILL))
+
+        # So does the user after the pin is expired
+        cache.clear()
+        self.assertEqual(client.get(url).data['bill'], str(USER_BILL))